@@ -1,40 +1,238 @@
-from sqlalchemy.orm import Session
-from models import HealthRecord, MealPlan, Meal, Recipe, User
-from schemas import HealthRecordCreate, MealPlanCreate, MealCreate, UserCreate
+import json
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import case, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import HealthRecord, MealNutritionTag, MealPlan, MealPlanItem, MealPlanJob, Meal, Recipe, RecipeNutritionTag, User
+from schemas import HealthRecordCreate, HealthRecordUpdate, MealPlanCreate, MealCreate, UserCreate
+from utils.rule_engine import get_rule_set
+from utils.health_series import invalidate_user_series
+from utils.cohort_rollup import HistogramDelta, apply_delta
+from utils.password_hashing import hash_password
+from utils import recipe_search
+from utils.pagination import paginate
+from utils.plan_projection import insert_plan_items
 from uuid import UUID
 import uuid
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
 
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     db_user = User(
         id=uuid.uuid4(),
         email=user.email,
         name=user.name,
-        password_hash=user.password  # 実際のアプリではハッシュ化が必要
+        password_hash=await hash_password(user.password)
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def create_health_record(db: Session, record: HealthRecordCreate):
+def apply_nutrition_flags(db_record: HealthRecord):
+    """
+    現在のルールで栄養タイプを判定し、ビットフラグと判定ルールのバージョンをレコードに書き込む
+    """
+    rule_set = get_rule_set()
+    db_record.nutrition_flags = rule_set.evaluate_record(db_record)
+    db_record.rules_version = rule_set.version
+    return db_record
+
+
+async def create_health_record(db: AsyncSession, record: HealthRecordCreate):
     db_record = HealthRecord(id=uuid.uuid4(), **record.dict())
+    apply_nutrition_flags(db_record)
     db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
+    delta = HistogramDelta()
+    delta.add(db_record)
+    await apply_delta(db, delta)
+    await db.commit()
+    await db.refresh(db_record)
+    invalidate_user_series(db_record.user_id)
     return db_record
 
 
-def get_health_records(db: Session, user_id: str):
-    return db.query(HealthRecord).filter(HealthRecord.user_id == user_id).all()
+# キーセットページングの並び順（複合インデックスと同じ列順）
+HEALTH_RECORD_KEYS = (HealthRecord.date, HealthRecord.id)
+RECIPE_KEYS = (Recipe.created_at, Recipe.id)
+MEAL_PLAN_KEYS = (MealPlan.start_date, MealPlan.id)
+
+
+def query_health_records(user_id: str = None):
+    query = select(HealthRecord)
+    if user_id is not None:
+        query = query.where(HealthRecord.user_id == user_id)
+    return query
+
+
+async def get_existing_user_ids(db: AsyncSession, user_ids: set) -> set:
+    if not user_ids:
+        return set()
+    result = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+    return set(result.scalars())
+
+
+async def bulk_create_health_records(db: AsyncSession, records: list[HealthRecordCreate]) -> int:
+    """
+    複数の健診データを1回の COPY（PostgreSQL）または executemany でまとめて登録する
+    nutrition_flags も行ごとに判定して一緒に書き込む
+    """
+    if not records:
+        return 0
+
+    rule_set = get_rule_set()
+    now = datetime.utcnow()
+    rows = []
+    for record in records:
+        row = record.dict()
+        row["id"] = uuid.uuid4()
+        row["nutrition_flags"] = rule_set.evaluate_dict(row)
+        row["rules_version"] = rule_set.version
+        row["created_at"] = now
+        rows.append(row)
+
+    if db.bind.dialect.name == "postgresql":
+        await _copy_health_records(db, rows)
+    else:
+        await db.execute(insert(HealthRecord), rows)
+    delta = HistogramDelta()
+    for row in rows:
+        delta.add(row)
+    await apply_delta(db, delta)
+    await db.commit()
+    invalidate_user_series(*{row["user_id"] for row in rows})
+    return len(rows)
 
 
-def create_meal_plan(db: Session, meal_plan: MealPlanCreate):
+async def _copy_health_records(db: AsyncSession, rows: list[dict]):
+    # asyncpg の COPY（バイナリ形式）で送る。json 型の列は文字列で渡す
+    columns = list(rows[0].keys())
+    records = [
+        tuple(
+            json.dumps(row[c], ensure_ascii=False) if c == "anomalies" and row[c] is not None else row[c]
+            for c in columns
+        )
+        for row in rows
+    ]
+
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        HealthRecord.__tablename__, records=records, columns=columns
+    )
+
+
+async def update_health_record(db: AsyncSession, record_id: str, record_update: HealthRecordUpdate):
+    db_record = await db.get(HealthRecord, record_id)
+    if not db_record:
+        return None
+
+    # 変更前の値をヒストグラムから取り除き、変更後の値を加える
+    delta = HistogramDelta()
+    delta.add(db_record, -1)
+    for key, value in record_update.dict(exclude_unset=True).items():
+        setattr(db_record, key, value)
+    apply_nutrition_flags(db_record)
+    delta.add(db_record)
+
+    await apply_delta(db, delta)
+    await db.commit()
+    await db.refresh(db_record)
+    invalidate_user_series(db_record.user_id)
+    return db_record
+
+
+async def delete_health_record(db: AsyncSession, record_id: str) -> bool:
+    db_record = await db.get(HealthRecord, record_id)
+    if not db_record:
+        return False
+
+    delta = HistogramDelta()
+    delta.add(db_record, -1)
+    await db.delete(db_record)
+    await apply_delta(db, delta)
+    await db.commit()
+    invalidate_user_series(db_record.user_id)
+    return True
+
+
+async def get_latest_nutrition_types(db: AsyncSession, user_id: str):
+    """
+    最新の健診データに保存済みの栄養タイプを返す（(栄養タイプのリスト, ルールのバージョン)、データがなければ None）
+    保存時とルールのバージョンが異なる・未判定の場合のみ、その1件を読み直して判定し直す
+    """
+    result = await db.execute(
+        select(HealthRecord.id, HealthRecord.nutrition_flags, HealthRecord.rules_version)
+        .where(HealthRecord.user_id == user_id)
+        .order_by(HealthRecord.date.desc())
+        .limit(1)
+    )
+    latest = result.first()
+    if latest is None:
+        return None
+
+    rule_set = get_rule_set()
+    if latest.nutrition_flags is not None and latest.rules_version == rule_set.version:
+        return rule_set.decode(latest.nutrition_flags), rule_set.version
+
+    db_record = await db.get(HealthRecord, latest.id)
+    return rule_set.decode(rule_set.evaluate_record(db_record)), rule_set.version
+
+
+async def get_latest_health_record(db: AsyncSession, user_id: UUID):
+    result = await db.execute(
+        select(HealthRecord)
+        .where(HealthRecord.user_id == user_id)
+        .order_by(HealthRecord.date.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def get_latest_health_columns(db: AsyncSession, user_ids: list, fields: list[str]) -> dict:
+    """
+    各ユーザーの最新の健診データから指定列だけを取り出し、列ごとのリストで返す
+    （ORM オブジェクトを作らず、row_number() で1ユーザー1行に絞る。PostgreSQL 以外でも動くよう DISTINCT ON は使わない）
+    """
+    ranked = (
+        select(
+            HealthRecord.user_id,
+            *[getattr(HealthRecord, f) for f in fields],
+            func.row_number().over(partition_by=HealthRecord.user_id, order_by=HealthRecord.date.desc()).label("rank"),
+        )
+        .where(HealthRecord.user_id.in_(user_ids))
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.user_id, *[ranked.c[f] for f in fields])
+        .where(ranked.c.rank == 1)
+        .order_by(ranked.c.user_id)
+    )
+    rows = result.all()
+    names = ["user_id", *fields]
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+async def get_health_series_columns(db: AsyncSession, user_id: str, fields: tuple) -> tuple[list, dict]:
+    """
+    ユーザーの健診データから日付と指定列だけを日付順に取り出す（(日付のリスト, 列ごとのリスト)）
+    """
+    result = await db.execute(
+        select(HealthRecord.date, *[getattr(HealthRecord, f) for f in fields])
+        .where(HealthRecord.user_id == user_id)
+        .order_by(HealthRecord.date)
+    )
+    rows = result.all()
+    return [row[0] for row in rows], {name: [row[i + 1] for row in rows] for i, name in enumerate(fields)}
+
+
+async def create_meal_plan(db: AsyncSession, meal_plan: MealPlanCreate):
     db_meal_plan = MealPlan(
         id=uuid.uuid4(),
         user_id=meal_plan.user_id,
@@ -43,28 +241,40 @@ def create_meal_plan(db: Session, meal_plan: MealPlanCreate):
         plan_json=meal_plan.plan_json
     )
     db.add(db_meal_plan)
-    db.commit()
-    db.refresh(db_meal_plan)
+    await db.flush()
+    # week_plan の1日・1食ごとの行（meal_plan_items）も同じトランザクションで登録
+    await insert_plan_items(db, db_meal_plan)
+    await db.commit()
+    await db.refresh(db_meal_plan)
     return db_meal_plan
 
 
-def delete_meal_plan_in_same_week(db: Session, user_id: UUID, start_date, end_date):
+async def delete_meal_plan_in_same_week(db: AsyncSession, user_id: UUID, start_date, end_date):
     """
     同一ユーザーで同週のMealPlanがあれば削除（重複登録防止）
+    コミットは続く create_meal_plan で行う（削除と登録の間にプランがない状態を見せない）
     """
-    plans = db.query(MealPlan).filter(
-        MealPlan.user_id == user_id,
-        MealPlan.start_date <= end_date,
-        MealPlan.end_date >= start_date
-    ).all()
+    await db.execute(
+        delete(MealPlan).where(
+            MealPlan.user_id == user_id,
+            MealPlan.start_date <= end_date,
+            MealPlan.end_date >= start_date
+        )
+    )
 
-    for plan in plans:
-        db.delete(plan)
 
-    db.commit()
+async def get_week_meal_plan_id(db: AsyncSession, user_id: UUID, start_date):
+    """start_date から始まる最新の MealPlan の ID（なければ None）"""
+    result = await db.execute(
+        select(MealPlan.id)
+        .where(MealPlan.user_id == user_id, MealPlan.start_date == start_date)
+        .order_by(MealPlan.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
 
 
-def create_meal(db: Session, meal: MealCreate):
+async def create_meal(db: AsyncSession, meal: MealCreate):
     db_meal = Meal(
         id=uuid.uuid4(),
         user_id=meal.user_id,
@@ -73,34 +283,280 @@ def create_meal(db: Session, meal: MealCreate):
         recipe_id=meal.recipe_id
     )
     db.add(db_meal)
-    db.commit()
-    db.refresh(db_meal)
+    await db.commit()
+    await db.refresh(db_meal)
     return db_meal
 
 
-def get_meal_plan(db: Session, meal_plan_id: str):
-    return db.query(MealPlan).filter(MealPlan.id == meal_plan_id).first()
+async def create_meal_plans_with_meals(db: AsyncSession, plans: list[dict], meals: list[dict]):
+    """
+    複数の MealPlan とその食事（Meal）を1トランザクションで登録する（テーブルごとに一括 INSERT）
+    """
+    if plans:
+        await db.execute(insert(MealPlan), plans)
+    if meals:
+        await db.execute(insert(Meal), meals)
+    await db.commit()
+
+
+# 同じ日の食事の並び順
+MEAL_TYPE_ORDER = case({"breakfast": 0, "lunch": 1, "dinner": 2}, value=Meal.meal_type, else_=3)
+
+
+async def get_meals_in_range(db: AsyncSession, user_id: UUID, start_date, end_date):
+    result = await db.execute(
+        select(Meal)
+        .where(Meal.user_id == user_id, Meal.date >= start_date, Meal.date <= end_date)
+        .order_by(Meal.date, MEAL_TYPE_ORDER)
+    )
+    return result.scalars().all()
+
+
+async def get_meal_plan(db: AsyncSession, meal_plan_id: str):
+    return await db.get(MealPlan, meal_plan_id)
 
 
-def get_meal(db: Session, meal_id: str):
-    return db.query(Meal).filter(Meal.id == meal_id).first()
+async def get_meal(db: AsyncSession, meal_id: str):
+    return await db.get(Meal, meal_id)
 
 
-def get_recipes(db: Session):
-    return db.query(Recipe).all()
+def query_recipes():
+    return select(Recipe)
 
 
-def get_meal_plans_by_user(db: Session, user_id: UUID):
-    return (
-        db.query(MealPlan)
-        .filter(MealPlan.user_id == user_id)
-        .order_by(MealPlan.start_date.desc())
-        .all()
+async def get_recipe_catalog(db: AsyncSession) -> list[tuple]:
+    """
+    ローカルの食事プラン生成用に、全レシピの (id, name, cooking_time, タグ名のリスト) を返す
+    """
+    tags = defaultdict(list)
+    result = await db.execute(
+        select(RecipeNutritionTag.recipe_id, MealNutritionTag.name)
+        .join(MealNutritionTag, MealNutritionTag.id == RecipeNutritionTag.tag_id)
     )
+    for recipe_id, name in result:
+        tags[recipe_id].append(name)
+
+    result = await db.execute(select(Recipe.id, Recipe.name, Recipe.cooking_time))
+    return [(recipe_id, name, cooking_time, tags.get(recipe_id, [])) for recipe_id, name, cooking_time in result]
+
+
+def query_meal_plans_by_user(user_id: UUID):
+    return select(MealPlan).where(MealPlan.user_id == user_id)
+
 
+# 食事プランの展開行の一覧のソートキー（主キーの順）
+MEAL_PLAN_ITEM_KEYS = (MealPlanItem.meal_plan_id, MealPlanItem.day_index, MealPlanItem.meal_type)
 
-def search_recipes(db: Session, query: str):
+
+async def search_meal_plan_items(
+    db: AsyncSession,
+    limit: int,
+    cursor: str = None,
+    meal_type: str = None,
+    nutrition_type: str = None,
+    max_cooking_time: int = None,
+    is_quick: bool = None,
+    user_id: UUID = None,
+):
     """
-    レシピの名前（name）に部分一致する検索結果を返す
+    食事プランの1日・1食（meal_plan_items）を条件で絞り込み、(行のリスト, 次ページの cursor) を返す
     """
-    return db.query(Recipe).filter(Recipe.name.ilike(f"%{query}%")).all()
+    query = select(MealPlanItem)
+    if meal_type is not None:
+        query = query.where(MealPlanItem.meal_type == meal_type)
+    if max_cooking_time is not None:
+        query = query.where(MealPlanItem.cooking_time <= max_cooking_time)
+    if is_quick is not None:
+        query = query.where(MealPlanItem.is_quick.is_(is_quick))
+    if user_id is not None:
+        query = query.where(MealPlanItem.user_id == user_id)
+    if nutrition_type is not None:
+        if db.bind.dialect.name == "postgresql":
+            # jsonb @> を GIN インデックス（ix_meal_plan_items_nutrition_types）で処理する
+            query = query.where(MealPlanItem.nutrition_types.contains([nutrition_type]))
+        else:
+            values = func.json_each(MealPlanItem.nutrition_types).table_valued("value")
+            query = query.where(select(values.c.value).where(values.c.value == nutrition_type).exists())
+    return await paginate(db, query, MEAL_PLAN_ITEM_KEYS, limit, cursor)
+
+
+async def get_top_meal_plan_titles(db: AsyncSession, limit: int, meal_type: str = None) -> list[dict]:
+    """GPT が提案したメニュー名の出現回数の多い順"""
+    count = func.count().label("count")
+    query = select(MealPlanItem.title, count).where(MealPlanItem.title.is_not(None))
+    if meal_type is not None:
+        query = query.where(MealPlanItem.meal_type == meal_type)
+    result = await db.execute(query.group_by(MealPlanItem.title).order_by(count.desc(), MealPlanItem.title).limit(limit))
+    return [{"title": title, "count": n} for title, n in result.all()]
+
+
+# 条件付き GET（ETag）用の版。行の追加・削除で変わる値（件数と created_at の最大値）を1クエリで取る
+async def get_recipes_version(db: AsyncSession) -> tuple:
+    return tuple((await db.execute(select(func.count(Recipe.id), func.max(Recipe.created_at)))).one())
+
+
+async def get_meal_plans_version(db: AsyncSession, user_id: UUID) -> tuple:
+    result = await db.execute(
+        select(func.count(MealPlan.id), func.max(MealPlan.created_at)).where(MealPlan.user_id == user_id)
+    )
+    return tuple(result.one())
+
+
+async def get_meal_plan_version(db: AsyncSession, meal_plan_id: UUID) -> Optional[tuple]:
+    """食事プランと、詳細に含める期間内の食事の版（プランがなければ None）"""
+    in_range = (Meal.user_id == MealPlan.user_id, Meal.date >= MealPlan.start_date, Meal.date <= MealPlan.end_date)
+    result = await db.execute(
+        select(
+            MealPlan.created_at,
+            select(func.count(Meal.id)).where(*in_range).correlate(MealPlan).scalar_subquery(),
+            select(func.max(Meal.created_at)).where(*in_range).correlate(MealPlan).scalar_subquery(),
+        ).where(MealPlan.id == meal_plan_id)
+    )
+    row = result.one_or_none()
+    return tuple(row) if row is not None else None
+
+
+async def search_recipes(db: AsyncSession, query: str, limit: int, cursor: str = None):
+    """
+    レシピの名前（name）・説明（description）を類似度順に検索し、(レシピのリスト, 次ページの cursor) を返す
+    """
+    return await recipe_search.search_recipes(db, query, limit, cursor)
+
+
+async def create_meal_plan_job(db: AsyncSession, user_id: UUID, planner: str = "gpt", worker_id: str = None):
+    db_job = MealPlanJob(id=uuid.uuid4(), user_id=user_id, status="pending", planner=planner, worker_id=worker_id)
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+
+async def get_meal_plan_job(db: AsyncSession, job_id: UUID):
+    return await db.get(MealPlanJob, job_id)
+
+
+def _lease_expired(db: AsyncSession, lease_seconds: int):
+    """更新から lease_seconds 秒以上たったジョブ（時刻は DB 側の now() で比べる）"""
+    if db.bind.dialect.name == "postgresql":
+        return MealPlanJob.updated_at < func.now() - timedelta(seconds=lease_seconds)
+    return MealPlanJob.updated_at < func.datetime("now", f"-{int(lease_seconds)} seconds")
+
+
+def _claimable(db: AsyncSession, worker_id: str, lease_seconds: int):
+    """worker_id が受け持てるジョブ（持ち主がいない・自分・持ち主のリースが切れた）"""
+    return or_(
+        MealPlanJob.worker_id.is_(None),
+        MealPlanJob.worker_id == worker_id,
+        _lease_expired(db, lease_seconds),
+    )
+
+
+async def claim_unfinished_meal_plan_jobs(db: AsyncSession, worker_id: str, lease_seconds: int):
+    """
+    pending / running のまま残り、他のワーカーが受け持っていない（またはリースが切れた）ジョブを
+    worker_id の受け持ちにして作成順に返す（再投入用）
+    FOR UPDATE SKIP LOCKED で、同時に起動したワーカー同士が同じジョブを取らないようにする
+    """
+    # 一括生成のジョブ（batch_id あり）は scripts/pregenerate_meal_plans.py が再開する
+    result = await db.execute(
+        select(MealPlanJob)
+        .where(
+            MealPlanJob.status.in_(["pending", "running"]),
+            MealPlanJob.batch_id.is_(None),
+            MealPlanJob.worker_id.is_distinct_from(worker_id),
+            _claimable(db, worker_id, lease_seconds),
+        )
+        .order_by(MealPlanJob.created_at)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = result.scalars().all()
+    for job in jobs:
+        job.status = "pending"
+        job.worker_id = worker_id
+        job.updated_at = func.now()
+    await db.commit()
+    return jobs
+
+
+async def start_meal_plan_job(db: AsyncSession, job_id: UUID, worker_id: str, lease_seconds: int) -> bool:
+    """
+    ジョブを worker_id で running にする。完了済み・別のワーカーが実行中なら False
+    """
+    result = await db.execute(
+        update(MealPlanJob)
+        .where(
+            MealPlanJob.id == job_id,
+            MealPlanJob.status.in_(["pending", "running"]),
+            _claimable(db, worker_id, lease_seconds),
+        )
+        .values(status="running", worker_id=worker_id, error=None, updated_at=func.now())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def get_unfinished_batch_meal_plan_jobs(db: AsyncSession):
+    """中断した一括生成のジョブ（pending / running）を作成順に返す"""
+    result = await db.execute(
+        select(MealPlanJob)
+        .where(MealPlanJob.status.in_(["pending", "running"]), MealPlanJob.batch_id.is_not(None))
+        .order_by(MealPlanJob.created_at)
+    )
+    return result.scalars().all()
+
+
+async def create_batch_meal_plan_jobs(db: AsyncSession, batch_id: UUID, targets: list[tuple]) -> list[UUID]:
+    """
+    一括生成の対象 [(user_id, start_date)] をジョブとして登録する（GPT を呼ぶ前の進捗の記録）
+    """
+    jobs = [
+        {"id": uuid.uuid4(), "user_id": user_id, "status": "pending", "batch_id": batch_id, "start_date": start_date}
+        for user_id, start_date in targets
+    ]
+    for i in range(0, len(jobs), 1000):
+        await db.execute(insert(MealPlanJob), jobs[i:i + 1000])
+    await db.commit()
+    return [job["id"] for job in jobs]
+
+
+async def get_pregeneration_targets(db: AsyncSession, today: date, lead_days: int) -> list[tuple]:
+    """
+    夜間の一括生成の対象 [(user_id, プランの開始日)] を返す
+    GPT のプラン（plan_json があり、ローカル生成でないもの）がない・lead_days 日以内に終わる・最新の健診データより古いユーザーが対象
+    """
+    def latest(column, *where):
+        return select(func.max(column)).where(*where).correlate(User).scalar_subquery()
+
+    gpt_plans = (
+        MealPlan.user_id == User.id,
+        MealPlan.plan_json.is_not(None),
+        func.coalesce(MealPlan.plan_json["generator"].as_string(), "gpt") != "local",
+    )
+    status = select(
+        User.id.label("user_id"),
+        latest(HealthRecord.created_at, HealthRecord.user_id == User.id).label("record_at"),
+        latest(MealPlan.created_at, *gpt_plans).label("plan_at"),
+        latest(MealPlan.end_date, *gpt_plans).label("plan_end"),
+    ).subquery()
+    result = await db.stream(
+        select(status)
+        .where(
+            status.c.record_at.is_not(None),
+            or_(
+                status.c.plan_at.is_(None),
+                status.c.record_at > status.c.plan_at,
+                status.c.plan_end < today + timedelta(days=lead_days),
+            ),
+        )
+        .execution_options(yield_per=1000)
+    )
+
+    targets = []
+    async for user_id, record_at, plan_at, plan_end in result:
+        if plan_at is None or record_at > plan_at or plan_end < today:
+            # 健診データが変わった・プランが切れている場合は今日から作り直す
+            targets.append((user_id, today))
+        else:
+            # 今のプランが終わる前に、翌日からのプランを用意しておく
+            targets.append((user_id, plan_end + timedelta(days=1)))
+    return targets
@@ -1,5 +1,7 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -14,20 +16,58 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL が設定されていません！.env ファイルを確認してください。")
 
+# 非同期ドライバ用の接続先（未設定なら DATABASE_URL のドライバを asyncpg / aiosqlite に置き換える）
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# コネクションプールの設定（ワーカー1つあたり。DB の max_connections を超えないように調整する）
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 秒。-1 で無効
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def pool_options(url: str) -> dict:
+    # SQLite はプールの大きさを指定できない
+    if make_url(url).get_backend_name() == "sqlite":
+        return {"pool_pre_ping": POOL_PRE_PING}
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+
+
 # SQLAlchemy のエンジンを作成
+# 同期エンジンはテーブル作成・マイグレーション・バッチスクリプト用
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 
-engine = create_engine(DATABASE_URL)
+# API（ルーター）からはこちらの非同期エンジンを使う
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
 
 # データベースセッションを作成
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# commit 後に属性を読み直さない（非同期セッションでは暗黙の再読み込みができないため）
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # モデルの基底クラス
 Base = declarative_base()
 
-# データベースセッションを取得
-def get_db():
-    db = SessionLocal()
-    try:
+# データベースセッションを取得（FastAPI の依存性）
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,6 +1,9 @@
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from logging_config import logger
@@ -11,7 +14,7 @@ load_dotenv()
 # パス設定（このファイルが backend/main.py にある場合）
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import Base, engine
+from database import Base, async_engine, engine
 from routers import (
     health_records,
     meal_plans,
@@ -21,38 +24,93 @@ from routers import (
     auth,
     health_analysis
 )
+from utils.compression import CompressionMiddleware
+from utils.instrumentation import MetricsMiddleware, instrument_engine
+from utils.meal_plan_generator import close_openai_client
+from utils.meal_plan_jobs import resume_jobs_periodically, resume_pending_jobs
+from utils.metrics import render_metrics
+from utils.rule_engine import reload_rule_set
 
-# データベーステーブルの作成（初回のみ）
-Base.metadata.create_all(bind=engine)
+# 起動時にテーブルを作成するか（マイグレーションで管理する環境では 0 にする）
+CREATE_TABLES_ON_STARTUP = os.getenv("DB_CREATE_ALL", "1") == "1"
 
-# FastAPI アプリの作成
-app = FastAPI()
 
-logger.info("アプリ起動: FastAPI initialized")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    DB・外部サービスに触れる初期化はここで行う（import 時には何も接続しない）
+    Firebase・OpenAI のクライアントは初回の利用時に作る
+    """
+    if CREATE_TABLES_ON_STARTUP:
+        # データベーステーブルの作成（初回のみ）
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    # 健診ルールは起動時に1度だけコンパイルし、以降は更新時のみ読み直す
+    reload_rule_set()
+
+    # 再起動前に完了しなかった食事プラン生成ジョブを再開（落ちたワーカーのジョブも定期的に引き取る）
+    await resume_pending_jobs()
+    resumer = asyncio.create_task(resume_jobs_periodically())
+    logger.info("アプリ起動: FastAPI initialized")
+
+    yield
+
+    resumer.cancel()
+    await close_openai_client()
+    # 非同期エンジンのコネクションプールを閉じる
+    await async_engine.dispose()
+
+
+def create_app() -> FastAPI:
+    # response_model で変換した後の JSON 化は orjson で行う
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+    # SQL の実行回数・時間を計測（同期・非同期の両エンジン）
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
+    # CORS の設定
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Health-Rules-Version", "ETag"],
+    )
+
+    # 大きなレスポンス（一覧・plan_json）を Brotli / gzip で圧縮
+    app.add_middleware(CompressionMiddleware)
+
+    # ルートごとのレイテンシ・SQL の計測（CORS を含めて計測するよう最後に追加して一番外側にする）
+    app.add_middleware(MetricsMiddleware)
+
+    # ルーター登録（順不同でOKだが整理すると見やすい）
+    app.include_router(health_records.router)
+    app.include_router(meal_plans.router)
+    app.include_router(meals.router)
+    app.include_router(recipes.router)
+    app.include_router(users.router)
+    app.include_router(health_analysis.router)
+    app.include_router(auth.router)  # 認証系（保護エンドポイント含む）
+
+    # Prometheus のテキスト形式でメトリクスを出力（ワーカープロセスごとの値）
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    # シンプルなテスト用エンドポイント
+    @app.get("/")
+    def read_root():
+        return {"message": "Hello, FastAPI!"}
+
+    @app.get("/hello")
+    def say_hello():
+        return {"message": "こんにちは、FastAPI!"}
+
+    return app
 
-# CORS の設定
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# ルーター登録（順不同でOKだが整理すると見やすい）
-app.include_router(health_records.router)
-app.include_router(meal_plans.router)
-app.include_router(meals.router)
-app.include_router(recipes.router)
-app.include_router(users.router)
-app.include_router(health_analysis.router)
-app.include_router(auth.router)  # 認証系（保護エンドポイント含む）
-
-# シンプルなテスト用エンドポイント
-@app.get("/")
-def read_root():
-    return {"message": "Hello, FastAPI!"}
-
-@app.get("/hello")
-def say_hello():
-    return {"message": "こんにちは、FastAPI!"}
+# uvicorn main:app で起動する
+app = create_app()
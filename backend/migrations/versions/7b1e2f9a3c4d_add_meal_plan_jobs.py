@@ -0,0 +1,40 @@
+"""add meal_plan_jobs
+
+Revision ID: 7b1e2f9a3c4d
+Revises: 4c021dec789e
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e2f9a3c4d'
+down_revision: Union[str, None] = '4c021dec789e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('meal_plan_jobs',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('meal_plan_id', sa.UUID(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['meal_plan_id'], ['meal_plans.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # 再起動時の再投入で pending / running のジョブを引くため
+    op.create_index('ix_meal_plan_jobs_status', 'meal_plan_jobs', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meal_plan_jobs_status', table_name='meal_plan_jobs')
+    op.drop_table('meal_plan_jobs')
@@ -0,0 +1,37 @@
+"""add meal_plan_cache
+
+Revision ID: 9d4a6c2e8f10
+Revises: 7b1e2f9a3c4d
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4a6c2e8f10'
+down_revision: Union[str, None] = '7b1e2f9a3c4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('meal_plan_cache',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('prompt_version', sa.String(), nullable=False),
+        sa.Column('plan_json', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    # 期限切れ行の削除・古い順の追い出しに使う
+    op.create_index('ix_meal_plan_cache_expires_at', 'meal_plan_cache', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meal_plan_cache_expires_at', table_name='meal_plan_cache')
+    op.drop_table('meal_plan_cache')
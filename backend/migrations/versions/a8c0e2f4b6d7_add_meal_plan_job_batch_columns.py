@@ -0,0 +1,33 @@
+"""add batch columns to meal_plan_jobs
+
+Revision ID: a8c0e2f4b6d7
+Revises: f7b9d1e3a5c6
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c0e2f4b6d7'
+down_revision: Union[str, None] = 'f7b9d1e3a5c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('meal_plan_jobs', sa.Column('batch_id', sa.UUID(), nullable=True))
+    op.add_column('meal_plan_jobs', sa.Column('start_date', sa.Date(), nullable=True))
+    op.add_column('meal_plan_jobs', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    # 中断した一括生成の再開で、バッチのジョブを引くため
+    op.create_index('ix_meal_plan_jobs_batch_id', 'meal_plan_jobs', ['batch_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meal_plan_jobs_batch_id', table_name='meal_plan_jobs')
+    op.drop_column('meal_plan_jobs', 'attempts')
+    op.drop_column('meal_plan_jobs', 'start_date')
+    op.drop_column('meal_plan_jobs', 'batch_id')
@@ -0,0 +1,31 @@
+"""add nutrition_flags to health_records
+
+Revision ID: b3f5d7e9a1c2
+Revises: 9d4a6c2e8f10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f5d7e9a1c2'
+down_revision: Union[str, None] = '9d4a6c2e8f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('health_records', sa.Column('nutrition_flags', sa.Integer(), nullable=True))
+    op.add_column('health_records', sa.Column('rules_version', sa.String(), nullable=True))
+    op.create_index('ix_health_records_user_id_date', 'health_records', ['user_id', 'date'])
+    # 既存行の nutrition_flags は scripts/backfill_nutrition_flags.py で埋める
+
+
+def downgrade() -> None:
+    op.drop_index('ix_health_records_user_id_date', table_name='health_records')
+    op.drop_column('health_records', 'rules_version')
+    op.drop_column('health_records', 'nutrition_flags')
@@ -0,0 +1,36 @@
+"""add recipe_nutrition_tags
+
+Revision ID: b9d1f3a5c7e8
+Revises: a8c0e2f4b6d7
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d1f3a5c7e8'
+down_revision: Union[str, None] = 'a8c0e2f4b6d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'recipe_nutrition_tags',
+        sa.Column('recipe_id', sa.UUID(), nullable=False),
+        sa.Column('tag_id', sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['meal_nutrition_tags.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('recipe_id', 'tag_id'),
+    )
+    # タグからレシピを引く・タグの削除時の CASCADE 用
+    op.create_index('ix_recipe_nutrition_tags_tag_id', 'recipe_nutrition_tags', ['tag_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipe_nutrition_tags_tag_id', table_name='recipe_nutrition_tags')
+    op.drop_table('recipe_nutrition_tags')
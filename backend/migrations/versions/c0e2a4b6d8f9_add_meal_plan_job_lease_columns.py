@@ -0,0 +1,28 @@
+"""add planner and worker_id to meal_plan_jobs
+
+Revision ID: c0e2a4b6d8f9
+Revises: b9d1f3a5c7e8
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0e2a4b6d8f9'
+down_revision: Union[str, None] = 'b9d1f3a5c7e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('meal_plan_jobs', sa.Column('planner', sa.String(), nullable=False, server_default='gpt'))
+    op.add_column('meal_plan_jobs', sa.Column('worker_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('meal_plan_jobs', 'worker_id')
+    op.drop_column('meal_plan_jobs', 'planner')
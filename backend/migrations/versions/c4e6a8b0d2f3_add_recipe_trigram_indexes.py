@@ -0,0 +1,36 @@
+"""add pg_trgm GIN indexes on recipes
+
+Revision ID: c4e6a8b0d2f3
+Revises: b3f5d7e9a1c2
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e6a8b0d2f3'
+down_revision: Union[str, None] = 'b3f5d7e9a1c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # ILIKE '%q%' と similarity / % 演算子による検索をインデックスで処理するため
+    op.create_index(
+        'ix_recipes_name_trgm', 'recipes', ['name'],
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_recipes_description_trgm', 'recipes', ['description'],
+        postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipes_description_trgm', table_name='recipes')
+    op.drop_index('ix_recipes_name_trgm', table_name='recipes')
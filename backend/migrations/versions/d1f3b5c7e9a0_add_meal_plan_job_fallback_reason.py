@@ -0,0 +1,26 @@
+"""add fallback_reason to meal_plan_jobs
+
+Revision ID: d1f3b5c7e9a0
+Revises: c0e2a4b6d8f9
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f3b5c7e9a0'
+down_revision: Union[str, None] = 'c0e2a4b6d8f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('meal_plan_jobs', sa.Column('fallback_reason', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('meal_plan_jobs', 'fallback_reason')
@@ -0,0 +1,34 @@
+"""add composite indexes for hot filters
+
+Revision ID: d5f7b9c1e3a4
+Revises: c4e6a8b0d2f3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f7b9c1e3a4'
+down_revision: Union[str, None] = 'c4e6a8b0d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # health_records (user_id, date) は b3f5d7e9a1c2 で作成済み
+    # users.email は UNIQUE 制約のインデックスがあるため追加しない
+    op.create_index('ix_health_records_date_id', 'health_records', ['date', 'id'])
+    op.create_index('ix_meals_user_id_date', 'meals', ['user_id', 'date'])
+    op.create_index('ix_meal_plans_user_id_start_date_id', 'meal_plans', ['user_id', 'start_date', 'id'])
+    op.create_index('ix_recipes_created_at_id', 'recipes', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipes_created_at_id', table_name='recipes')
+    op.drop_index('ix_meal_plans_user_id_start_date_id', table_name='meal_plans')
+    op.drop_index('ix_meals_user_id_date', table_name='meals')
+    op.drop_index('ix_health_records_date_id', table_name='health_records')
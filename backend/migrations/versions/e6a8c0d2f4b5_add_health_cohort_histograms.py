@@ -0,0 +1,35 @@
+"""add health_cohort_histograms
+
+Revision ID: e6a8c0d2f4b5
+Revises: d5f7b9c1e3a4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a8c0d2f4b5'
+down_revision: Union[str, None] = 'd5f7b9c1e3a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'health_cohort_histograms',
+        sa.Column('age_band', sa.SmallInteger(), nullable=False),
+        sa.Column('gender', sa.String(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('bin', sa.SmallInteger(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('age_band', 'gender', 'metric', 'bin'),
+    )
+    # 既存の健診データからの集計は scripts/rebuild_cohort_histograms.py で行う
+
+
+def downgrade() -> None:
+    op.drop_table('health_cohort_histograms')
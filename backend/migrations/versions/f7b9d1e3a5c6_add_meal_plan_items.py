@@ -0,0 +1,60 @@
+"""add meal_plan_items and plan_json GIN index
+
+Revision ID: f7b9d1e3a5c6
+Revises: e6a8c0d2f4b5
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b9d1e3a5c6'
+down_revision: Union[str, None] = 'e6a8c0d2f4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'meal_plan_items',
+        sa.Column('meal_plan_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day_index', sa.SmallInteger(), nullable=False),
+        sa.Column('meal_type', sa.String(), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.String(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('nutrition_types', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('cooking_time', sa.Integer(), nullable=True),
+        sa.Column('is_quick', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['meal_plan_id'], ['meal_plans.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('meal_plan_id', 'day_index', 'meal_type'),
+    )
+    op.create_index(
+        'ix_meal_plan_items_meal_type_cooking_time', 'meal_plan_items', ['meal_type', 'cooking_time']
+    )
+    op.create_index(
+        'ix_meal_plan_items_nutrition_types', 'meal_plan_items', ['nutrition_types'],
+        postgresql_using='gin', postgresql_ops={'nutrition_types': 'jsonb_path_ops'}
+    )
+    op.create_index('ix_meal_plan_items_title', 'meal_plan_items', ['title'])
+    op.create_index('ix_meal_plan_items_user_id', 'meal_plan_items', ['user_id'])
+    # plan_json @> '{...}' の包含検索用
+    op.create_index(
+        'ix_meal_plans_plan_json', 'meal_plans', ['plan_json'],
+        postgresql_using='gin', postgresql_ops={'plan_json': 'jsonb_path_ops'}
+    )
+    # 既存のプランの展開は scripts/backfill_meal_plan_items.py で行う
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meal_plans_plan_json', table_name='meal_plans')
+    op.drop_index('ix_meal_plan_items_user_id', table_name='meal_plan_items')
+    op.drop_index('ix_meal_plan_items_title', table_name='meal_plan_items')
+    op.drop_index('ix_meal_plan_items_nutrition_types', table_name='meal_plan_items')
+    op.drop_index('ix_meal_plan_items_meal_type_cooking_time', table_name='meal_plan_items')
+    op.drop_table('meal_plan_items')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Date, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, String, Integer, SmallInteger, Float, Date, DateTime, ForeignKey, Index, Text
 from sqlalchemy.dialects.postgresql import JSON, JSONB, UUID
 from sqlalchemy.sql import func
 from database import Base
@@ -36,8 +36,17 @@ class HealthRecord(Base):
     liver_gpt = Column(Float)
     liver_r_gpt = Column(Float)
     anomalies = Column(JSON)
+    nutrition_flags = Column(Integer)  # 登録・更新時に判定した栄養タイプのビットフラグ（31種類まで）
+    rules_version = Column(String)  # nutrition_flags を判定したルールのバージョン
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        # ユーザーごとの最新の健診データを引くため
+        Index("ix_health_records_user_id_date", "user_id", "date"),
+        # 全件一覧のキーセットページング（date, id）用
+        Index("ix_health_records_date_id", "date", "id"),
+    )
+
 # レシピモデル
 class Recipe(Base):
     __tablename__ = "recipes"
@@ -49,6 +58,17 @@ class Recipe(Base):
     image_url = Column(String)
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        # 一覧のキーセットページング（created_at, id）用
+        Index("ix_recipes_created_at_id", "created_at", "id"),
+        # 部分一致・類似度検索用（pg_trgm）
+        Index("ix_recipes_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index(
+            "ix_recipes_description_trgm", "description",
+            postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"}
+        ),
+    )
+
 # 食事記録モデル
 class Meal(Base):
     __tablename__ = "meals"
@@ -59,6 +79,10 @@ class Meal(Base):
     recipe_id = Column(UUID(as_uuid=True), ForeignKey("recipes.id"))
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index("ix_meals_user_id_date", "user_id", "date"),
+    )
+
 # 食事プランモデル（GPT対応）
 class MealPlan(Base):
     __tablename__ = "meal_plans"
@@ -69,6 +93,41 @@ class MealPlan(Base):
     plan_json = Column(JSONB, nullable=True)  # GPT生成の1週間メニュー保存用
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        # ユーザー単位の一覧（start_date, id の降順）と同一週の検索用
+        Index("ix_meal_plans_user_id_start_date_id", "user_id", "start_date", "id"),
+        # plan_json @> '{...}' の包含検索用
+        Index(
+            "ix_meal_plans_plan_json", "plan_json",
+            postgresql_using="gin", postgresql_ops={"plan_json": "jsonb_path_ops"}
+        ),
+    )
+
+# plan_json の week_plan を1日・1食ごとに展開した行（プランの保存時に作成、utils/plan_projection.py）
+class MealPlanItem(Base):
+    __tablename__ = "meal_plan_items"
+    meal_plan_id = Column(UUID(as_uuid=True), ForeignKey("meal_plans.id", ondelete="CASCADE"), primary_key=True)
+    day_index = Column(SmallInteger, primary_key=True)  # week_plan 内の位置（0 始まり）
+    meal_type = Column(String, primary_key=True)  # breakfast / lunch / dinner
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    day = Column(String)  # GPT が返した曜日（"月曜日" など）
+    title = Column(String)
+    nutrition_types = Column(JSONB, nullable=False, default=list)  # ["低塩分", "高タンパク質"]
+    cooking_time = Column(Integer)  # 分
+    is_quick = Column(Boolean)
+
+    __table_args__ = (
+        # 食事の種類・調理時間での絞り込み
+        Index("ix_meal_plan_items_meal_type_cooking_time", "meal_type", "cooking_time"),
+        # nutrition_types @> '["低塩分"]' の包含検索用
+        Index(
+            "ix_meal_plan_items_nutrition_types", "nutrition_types",
+            postgresql_using="gin", postgresql_ops={"nutrition_types": "jsonb_path_ops"}
+        ),
+        Index("ix_meal_plan_items_title", "title"),
+        Index("ix_meal_plan_items_user_id", "user_id"),
+    )
+
 # 食事プランとレシピの中間テーブル
 class MealPlanRecipe(Base):
     __tablename__ = "meal_plan_recipes"
@@ -80,3 +139,45 @@ class MealNutritionTag(Base):
     __tablename__ = "meal_nutrition_tags"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
+
+# レシピと栄養情報タグの中間テーブル（タグ名は栄養タイプ判定の low_salt などに合わせる。utils/local_planner.py で使う）
+class RecipeNutritionTag(Base):
+    __tablename__ = "recipe_nutrition_tags"
+    recipe_id = Column(UUID(as_uuid=True), ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(UUID(as_uuid=True), ForeignKey("meal_nutrition_tags.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+# 食事プラン生成ジョブモデル（GPT呼び出しを非同期で実行）
+class MealPlanJob(Base):
+    __tablename__ = "meal_plan_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending / running / succeeded / failed
+    meal_plan_id = Column(UUID(as_uuid=True), ForeignKey("meal_plans.id", ondelete="SET NULL"))
+    error = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # 夜間の一括生成（utils/meal_plan_batch.py）のジョブのみ設定する
+    batch_id = Column(UUID(as_uuid=True), index=True)
+    start_date = Column(Date)  # 生成するプランの開始日（未設定なら健診日）
+    attempts = Column(Integer, nullable=False, default=0)  # 実行を始めた回数
+    planner = Column(String, nullable=False, default="gpt")  # auto / gpt / local（再開時も同じ方法で生成する）
+    worker_id = Column(String)  # 実行を受け持つワーカー（リースが切れるまで他のワーカーは再開しない）
+    fallback_reason = Column(Text)  # auto で GPT が失敗しローカル生成に切り替えたときの理由
+
+# GPT生成プランのキャッシュ（量子化した健診プロファイルのハッシュをキーに保存）
+class MealPlanCache(Base):
+    __tablename__ = "meal_plan_cache"
+    key = Column(String(64), primary_key=True)
+    prompt_version = Column(String, nullable=False)
+    plan_json = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# 年代 × 性別ごとの健診項目のヒストグラム（健診データの登録・更新・削除のたびに差分で更新）
+class HealthCohortHistogram(Base):
+    __tablename__ = "health_cohort_histograms"
+    age_band = Column(SmallInteger, primary_key=True)  # 年代の下限（0, 10, ..., 80 は 80 歳以上）
+    gender = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)
+    bin = Column(SmallInteger, primary_key=True)  # utils/cohort_rollup.METRIC_BINS の区間番号
+    count = Column(Integer, nullable=False, default=0)
@@ -1,46 +1,33 @@
-import os
-import firebase_admin
-from firebase_admin import auth, credentials
 from pydantic import BaseModel
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
-from passlib.context import CryptContext
 from logging_config import logger  # ログ追加
-
-# Firebase 初期化（TESTING=1 ならスキップ）
-if os.getenv("TESTING") != "1":
-    cred = credentials.Certificate("firebase_credentials.json")
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-        logger.info("Firebase initialized")
+from utils.firebase_auth import get_firebase_app, get_firebase_claims, verify_firebase_token
+from utils.password_hashing import hash_password
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class Token(BaseModel):
     token: str
 
 
-def verify_firebase_token(token: str):
-    try:
-        return auth.verify_id_token(token)
-    except Exception as e:
-        logger.error(f"トークン検証失敗: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
 def create_user(user_data: schemas.UserCreate):
+    from firebase_admin import auth
+
     try:
         user = auth.create_user(
             email=user_data.email,
             email_verified=False,
             password=user_data.password,
             display_name=user_data.name,
-            disabled=False
+            disabled=False,
+            app=get_firebase_app(),
         )
         logger.info(f"Firebase user created: {user.uid}")
         return user
@@ -50,16 +37,17 @@ def create_user(user_data: schemas.UserCreate):
 
 
 @router.post("/auth/signup")
-async def signup(token_request: Token, user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def signup(token_request: Token, user_data: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     logger.debug("Signup endpoint called")
     logger.debug(f"Token received: {token_request.token}")
     logger.debug(f"User data received: {user_data}")
 
-    user = create_user(user_data)
+    # Firebase の API 呼び出し・bcrypt はイベントループの外で行う
+    user = await run_in_threadpool(create_user, user_data)
     if user is None:
         raise HTTPException(status_code=500, detail="Firebase user creation failed")
 
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
 
     new_user = models.User(
         email=user_data.email,
@@ -68,8 +56,8 @@ async def signup(token_request: Token, user_data: schemas.UserCreate, db: Sessio
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     logger.info(f"User registered in DB: {new_user.email}")
 
@@ -84,18 +72,19 @@ async def signup(token_request: Token, user_data: schemas.UserCreate, db: Sessio
 
 
 @router.post("/auth/login")
-async def login(token_request: Token, db: Session = Depends(get_db)):
+async def login(token_request: Token, db: AsyncSession = Depends(get_db)):
     logger.debug("Login endpoint called")
     logger.debug(f"Token received: {token_request.token}")
 
-    decoded_token = verify_firebase_token(token_request.token)
+    decoded_token = await verify_firebase_token(token_request.token)
     user_email = decoded_token.get("email")
 
     if not user_email:
         logger.warning("Token did not contain an email")
         raise HTTPException(status_code=400, detail="Email not found in token")
 
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+    result = await db.execute(select(models.User).where(models.User.email == user_email))
+    user = result.scalars().first()
 
     if user is None:
         logger.warning(f"User not found in DB: {user_email}")
@@ -114,6 +103,6 @@ async def login(token_request: Token, db: Session = Depends(get_db)):
 
 
 @router.get("/protected")
-def protected_route(token: str = Depends(verify_firebase_token)):
+def protected_route(token: dict = Depends(get_firebase_claims)):
     logger.info("Protected route accessed")
     return {"message": "認証成功", "user": token}
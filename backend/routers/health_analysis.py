@@ -1,23 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from crud import get_health_records
-from utils.health_analysis import analyze_health_data
+from crud import get_latest_health_columns, get_latest_health_record, get_latest_nutrition_types
+from schemas import CohortResponse, NutritionRecommendationBatchRequest
+from utils.cohort_rollup import age_band, cohort_percentiles, normalize_gender
+from utils.health_series import parse_metrics
+from utils.rule_engine import get_rule_set, reload_rule_set
 
 router = APIRouter(prefix="/health", tags=["Health Analysis"])
 
 @router.get("/recommendation/{user_id}", response_model=list[str])
-def get_nutrition_recommendation(user_id: str, db: Session = Depends(get_db)):
-    records = get_health_records(db, user_id)
-    if not records:
+async def get_nutrition_recommendation(user_id: str, response: Response, db: AsyncSession = Depends(get_db)):
+    result = await get_latest_nutrition_types(db, user_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="健診データが見つかりません")
 
-    # 最新の健診データを選ぶ（降順ソート）
-    latest = sorted(records, key=lambda x: x.date, reverse=True)[0]
-    latest_dict = jsonable_encoder(latest)
+    # 登録時に判定済みの栄養タイプ（どのルールのバージョンで判定したかをヘッダーで返す）
+    nutrition_types, rules_version = result
+    response.headers["X-Health-Rules-Version"] = rules_version
+    return nutrition_types
 
-    # 栄養タイプを判定
-    nutrition_types = analyze_health_data(latest_dict)
 
-    return nutrition_types
\ No newline at end of file
+@router.post("/recommendation/batch", response_model=dict[str, list[str]])
+async def get_nutrition_recommendation_batch(
+    request: NutritionRecommendationBatchRequest, response: Response, db: AsyncSession = Depends(get_db)
+):
+    """
+    複数ユーザーの最新の健診データをまとめて判定する（健診データがないユーザーは結果に含めない）
+    """
+    rule_set = get_rule_set()
+    columns = await get_latest_health_columns(db, request.user_ids, list(rule_set.fields))
+    flags = rule_set.evaluate_columns(columns)
+    response.headers["X-Health-Rules-Version"] = rule_set.version
+
+    return {
+        str(user_id): rule_set.decode(flag)
+        for user_id, flag in zip(columns["user_id"], flags)
+    }
+
+
+# 最新の健診データが、同じ年代・性別の中で何パーセンタイルにあたるか
+# 登録・更新・削除のたびに差分で更新しているヒストグラムから求める（健診データ全体は走査しない）
+@router.get("/cohort/{user_id}", response_model=CohortResponse)
+async def get_cohort_percentiles(
+    user_id: str,
+    metrics: str = Query("cholesterol_ldl,hba1c,bmi,blood_pressure_systolic"),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        names = parse_metrics(metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    record = await get_latest_health_record(db, user_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="健診データが見つかりません")
+
+    return {
+        "user_id": record.user_id,
+        "date": record.date,
+        "age_band": age_band(record.age),
+        "gender": normalize_gender(record.gender),
+        "metrics": await cohort_percentiles(db, record, names),
+    }
+
+
+# 現在の判定ルールのバージョン
+@router.get("/rules")
+def get_health_rules():
+    rule_set = get_rule_set()
+    return {"version": rule_set.version, "nutrition_types": rule_set.nutrition_types, "rules": len(rule_set.program)}
+
+
+# 判定ルールの再読み込み（ワーカーを再起動せずに反映）
+@router.post("/rules/reload")
+def reload_health_rules():
+    rule_set = reload_rule_set()
+    return {"version": rule_set.version, "nutrition_types": rule_set.nutrition_types, "rules": len(rule_set.program)}
@@ -1,84 +1,169 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import csv
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from database import get_db
-from schemas import HealthRecordCreate, HealthRecordResponse, HealthRecordUpdate
-from crud import create_health_record, get_health_records
-from models import HealthRecord
-from fastapi.encoders import jsonable_encoder
-from utils.health_analysis import analyze_health_data
+from schemas import (
+    HealthRecordBulkResult,
+    HealthRecordCreate,
+    HealthRecordResponse,
+    HealthRecordUpdate,
+    HealthSeriesResponse,
+)
+from crud import (
+    HEALTH_RECORD_KEYS,
+    create_health_record,
+    delete_health_record as delete_record,
+    get_health_series_columns,
+    get_latest_nutrition_types,
+    query_health_records,
+    update_health_record as update_record,
+)
+from utils import health_series
+from utils.bulk_ingest import ingest
+from utils.pagination import LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, paginate, stream_ndjson
+from utils.serialization import HEALTH_RECORD_LIST, json_response
 from logging_config import logger  # ログの追加
 
 router = APIRouter()
 
 # 健診データの新規登録
 @router.post("/health-records", response_model=HealthRecordResponse)
-def create_record(record: HealthRecordCreate, db: Session = Depends(get_db)):
+async def create_record(record: HealthRecordCreate, db: AsyncSession = Depends(get_db)):
     logger.info(f"新規健診データ登録リクエスト: user_id={record.user_id}")
-    created = create_health_record(db, record)
+    created = await create_health_record(db, record)
     logger.info(f"健診データ登録成功: id={created.id}")
     return created
 
-# 健診データの取得（ユーザー単位）
+# 健診データの一括登録（CSV / NDJSON）
+# ボディはストリーミングで読み、CHUNK_SIZE 行ごとに検証して COPY / executemany で登録する
+@router.post("/health-records/bulk", response_model=HealthRecordBulkResult)
+async def bulk_create_records(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    content_type = request.headers.get("content-type", "")
+    if format is None:
+        if "csv" in content_type:
+            format = "csv"
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            format = "ndjson"
+        else:
+            raise HTTPException(status_code=415, detail="text/csv または application/x-ndjson で送信してください")
+    logger.info(f"健診データ一括登録リクエスト: format={format}")
+
+    try:
+        report = await ingest(db, format, request.stream())
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="UTF-8 で送信してください")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"CSV のヘッダー行を読めません: {e}")
+
+    logger.info(f"健診データ一括登録完了: 登録={report['inserted']} 失敗={report['failed']}")
+    return report
+
+# 健診データの取得（ユーザー単位、新しい順にキーセットページング）
+# stream=true の場合は NDJSON で全件をストリーミング
 @router.get("/health-records/{user_id}", response_model=list[HealthRecordResponse])
-def read_records(user_id: str, db: Session = Depends(get_db)):
+async def read_records(
+    user_id: str,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
     logger.debug(f"健診データ取得リクエスト: user_id={user_id}")
-    records = get_health_records(db, user_id)
-    if not records:
+    if stream:
+        return stream_ndjson(query_health_records(user_id), HEALTH_RECORD_KEYS, HealthRecordResponse, cursor)
+
+    records, next_cursor = await paginate(db, query_health_records(user_id), HEALTH_RECORD_KEYS, limit, cursor)
+    if not records and cursor is None:
         logger.warning(f"健診データが見つかりません: user_id={user_id}")
         raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     logger.info(f"健診データ取得成功: 件数={len(records)} user_id={user_id}")
-    return records
+    return json_response(HEALTH_RECORD_LIST, records, headers)
+
+# 健診データの時系列（グラフ用）
+# 期間（bucket）ごとの平均・直近 window 期間の移動平均・前期間との差分を列ごとの配列で返す
+@router.get("/health-records/{user_id}/series", response_model=HealthSeriesResponse)
+async def read_record_series(
+    user_id: str,
+    metrics: str = Query("bmi,hba1c,blood_pressure_systolic,cholesterol_ldl"),
+    bucket: str = Query("month", pattern="^(none|week|month|quarter|year)$"),
+    window: int = Query(3, ge=1, le=24),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        names = health_series.parse_metrics(metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# 健診データの全件取得（テストや管理者用）
+    key = (names, bucket, window)
+    result = health_series.get_cached_series(user_id, key)
+    if result is None:
+        generation = health_series.series_generation(user_id)
+        dates, columns = await get_health_series_columns(db, user_id, names)
+        if not dates:
+            logger.warning(f"健診データが見つかりません: user_id={user_id}")
+            raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+        result = health_series.compute_series(dates, columns, bucket, window)
+        health_series.store_series(user_id, key, result, generation)
+
+    logger.info(f"健診データ時系列取得: user_id={user_id} bucket={bucket} 期間数={len(result['dates'])}")
+    return {"user_id": user_id, **result}
+
+# 健診データの全件取得（テストや管理者用、新しい順にキーセットページング）
+# stream=true の場合は NDJSON で全件をストリーミング
 @router.get("/health-records", response_model=list[HealthRecordResponse])
-def read_all_records(db: Session = Depends(get_db)):
+async def read_all_records(
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
     logger.info("全健診データ取得リクエスト")
-    records = db.query(HealthRecord).all()
+    if stream:
+        return stream_ndjson(query_health_records(), HEALTH_RECORD_KEYS, HealthRecordResponse, cursor)
+
+    records, next_cursor = await paginate(db, query_health_records(), HEALTH_RECORD_KEYS, limit, cursor)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     logger.info(f"全健診データ取得成功: 件数={len(records)}")
-    return records
+    return json_response(HEALTH_RECORD_LIST, records, headers)
 
 # 健診データの更新
 @router.put("/health-records/{id}", response_model=HealthRecordUpdate)
-def update_health_record(id: str, record_update: HealthRecordUpdate, db: Session = Depends(get_db)):
+async def update_health_record(id: str, record_update: HealthRecordUpdate, db: AsyncSession = Depends(get_db)):
     logger.debug(f"健診データ更新リクエスト: id={id}")
-    db_record = db.query(HealthRecord).filter(HealthRecord.id == id).first()
+    db_record = await update_record(db, id, record_update)
     if not db_record:
         logger.warning(f"更新対象データが見つかりません: id={id}")
         raise HTTPException(status_code=404, detail="Record not found")
-    
-    for key, value in record_update.dict(exclude_unset=True).items():
-        setattr(db_record, key, value)
-    
-    db.commit()
-    db.refresh(db_record)
     logger.info(f"健診データ更新完了: id={id}")
     return db_record
 
 # 健診データの削除
 @router.delete("/health-records/{id}", response_model=dict)
-def delete_health_record(id: str, db: Session = Depends(get_db)):
+async def delete_health_record(id: str, db: AsyncSession = Depends(get_db)):
     logger.debug(f"健診データ削除リクエスト: id={id}")
-    db_record = db.query(HealthRecord).filter(HealthRecord.id == id).first()
-    if not db_record:
+    if not await delete_record(db, id):
         logger.warning(f"削除対象データが見つかりません: id={id}")
         raise HTTPException(status_code=404, detail="Record not found")
-    
-    db.delete(db_record)
-    db.commit()
+
     logger.info(f"健診データ削除完了: id={id}")
     return {"message": "Record deleted successfully"}
 
 # 栄養タイプ判定エンドポイント
 @router.get("/health/recommendation/{user_id}", response_model=list[str])
-def get_nutrition_recommendation(user_id: str, db: Session = Depends(get_db)):
+async def get_nutrition_recommendation(user_id: str, response: Response, db: AsyncSession = Depends(get_db)):
     logger.info(f"栄養タイプ判定リクエスト: user_id={user_id}")
-    records = get_health_records(db, user_id)
-    if not records:
+    result = await get_latest_nutrition_types(db, user_id)
+    if result is None:
         logger.warning(f"栄養タイプ判定失敗：データなし user_id={user_id}")
         raise HTTPException(status_code=404, detail="健診データが見つかりません")
 
-    latest = sorted(records, key=lambda x: x.date, reverse=True)[0]
-    latest_dict = jsonable_encoder(latest)
-    nutrition_types = analyze_health_data(latest_dict)
-    logger.info(f"栄養タイプ判定成功: user_id={user_id}, 結果={nutrition_types}")
+    nutrition_types, rules_version = result
+    response.headers["X-Health-Rules-Version"] = rules_version
+    logger.info(f"栄養タイプ判定成功: user_id={user_id}, 結果={nutrition_types}, ルール={rules_version}")
     return nutrition_types
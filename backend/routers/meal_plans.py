@@ -1,243 +1,259 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from uuid import UUID
-from typing import List
+from typing import List, Optional
+import asyncio
 import json
 import crud, schemas
-from models import HealthRecord
-from database import get_db
-import os
-from dotenv import load_dotenv
-from datetime import timedelta
-
-# OpenAI 1.x 対応
-from openai import OpenAI
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from database import AsyncSessionLocal, get_db
+from logging_config import logger
+from utils.meal_materializer import materialize_meal_plans
+from utils.meal_plan_jobs import enqueue_meal_plan_job
+from utils.plan_cache import get_cache_stats
+from utils import meal_plan_generator, plan_projection
+from utils.pagination import LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, paginate, stream_ndjson
+from utils.conditional import conditional_json_response
+from utils.serialization import MEAL_PLAN_DETAIL, MEAL_PLAN_LIST
 
 router = APIRouter(prefix="/meal_plans", tags=["Meal Plans"])
 
 
-# ▼ 曜日順整形のためのユーティリティ関数
-def sort_week_plan(plan_json: dict) -> dict:
-    """GPTが返す曜日順を正しい順（月→日）に整える"""
-    week_order = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
-
-    if "week_plan" not in plan_json or not isinstance(plan_json["week_plan"], list):
-        return plan_json
-
-    sorted_plan = sorted(
-        plan_json["week_plan"],
-        key=lambda day: week_order.index(day.get("day", "月曜日")) if day.get("day") in week_order else 999
+@router.post("/", response_model=schemas.MealPlanResponse)
+async def create_meal_plan(meal_plan: schemas.MealPlanCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_meal_plan(db, meal_plan)
+
+
+
+# 食事プランの1日・1食の検索（例: 低塩分で15分以内の夕食 → ?meal_type=dinner&nutrition_type=低塩分&max_cooking_time=15）
+# 結果の meal_plan_id でプランを引く。続きは X-Next-Cursor ヘッダーの値を cursor に指定する
+@router.get("/items", response_model=List[schemas.MealPlanItemResponse])
+async def search_meal_plan_items(
+    response: Response,
+    meal_type: Optional[str] = Query(None, pattern="^(breakfast|lunch|dinner)$"),
+    nutrition_type: Optional[str] = None,
+    max_cooking_time: Optional[int] = Query(None, ge=0),
+    is_quick: Optional[bool] = None,
+    user_id: Optional[UUID] = None,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    if nutrition_type is not None:
+        # low_salt・low-salt でも、保存時と同じ表記（低塩分）にして探す
+        nutrition_type = plan_projection.normalize_nutrition_type(nutrition_type)
+    items, next_cursor = await crud.search_meal_plan_items(
+        db, limit, cursor, meal_type=meal_type, nutrition_type=nutrition_type,
+        max_cooking_time=max_cooking_time, is_quick=is_quick, user_id=user_id,
     )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
 
-    plan_json["week_plan"] = sorted_plan
-    return plan_json
 
+# GPT が提案したメニュー名の出現回数ランキング（全プランの集計のため MEAL_PLAN_TITLE_RANKING_TTL 秒キャッシュ）
+@router.get("/items/titles", response_model=List[schemas.MealPlanTitleCount])
+async def get_top_meal_plan_titles(
+    meal_type: Optional[str] = Query(None, pattern="^(breakfast|lunch|dinner)$"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    key = (meal_type, limit)
+    ranking = plan_projection.get_cached_title_ranking(key)
+    if ranking is None:
+        ranking = await crud.get_top_meal_plan_titles(db, limit, meal_type=meal_type)
+        plan_projection.store_title_ranking(key, ranking)
+    return ranking
+
+
+# If-None-Match が前回の ETag と一致し、プラン・期間内の食事が変わっていなければ 304 を返す
+@router.get("/{meal_plan_id}", response_model=schemas.MealPlanDetailResponse)
+async def get_meal_plan(meal_plan_id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
+    version = await crud.get_meal_plan_version(db, meal_plan_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
 
-@router.post("/", response_model=schemas.MealPlanResponse)
-def create_meal_plan(meal_plan: schemas.MealPlanCreate, db: Session = Depends(get_db)):
-    return crud.create_meal_plan(db, meal_plan)
+    async def load():
+        meal_plan = await crud.get_meal_plan(db, meal_plan_id)
+        if meal_plan is None:
+            raise HTTPException(status_code=404, detail="Meal plan not found")
+
+        # プランの期間内のユーザーの食事（meals の (user_id, date) インデックスで引く）
+        meals = await crud.get_meals_in_range(db, meal_plan.user_id, meal_plan.start_date, meal_plan.end_date)
+        return {
+            "id": meal_plan.id,
+            "user_id": meal_plan.user_id,
+            "start_date": meal_plan.start_date,
+            "end_date": meal_plan.end_date,
+            "plan_json": meal_plan.plan_json,
+            "created_at": meal_plan.created_at,
+            "meals": meals,
+        }, {}
+
+    return await conditional_json_response(request, ("meal_plan", meal_plan_id), version, load, MEAL_PLAN_DETAIL)
+
+# 期間内の毎日の朝・昼・夕にレシピをランダムに割り当てた食事プランを生成
+@router.post("/generate", response_model=schemas.MealPlanResponse)
+async def generate_meal_plan(
+    meal_request: schemas.MealPlanGenerate = Body(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    MealPlan と期間内の食事（Meal）を1トランザクション・一括 INSERT で作成するAPI
+    """
+    meal_plans = await materialize_meal_plans(db, [meal_request])
+    return meal_plans[0]
 
 
+# 複数ユーザー・複数期間の食事プランをまとめて生成（全件で1トランザクション）
+@router.post("/generate/batch", response_model=List[schemas.MealPlanResponse])
+async def generate_meal_plans(
+    meal_requests: List[schemas.MealPlanGenerate] = Body(...),
+    db: AsyncSession = Depends(get_db)
+):
+    return await materialize_meal_plans(db, meal_requests)
 
-@router.get("/{meal_plan_id}", response_model=schemas.MealPlanResponse)
-def get_meal_plan(meal_plan_id: UUID, db: Session = Depends(get_db)):
-    meal_plan = crud.get_meal_plan(db, meal_plan_id)
 
-    if meal_plan is None:
-        raise HTTPException(status_code=404, detail="Meal plan not found")
+# ユーザーの食事プラン一覧（開始日の新しい順にキーセットページング、stream=true の場合は NDJSON でストリーミング）
+# If-None-Match が前回の ETag と一致し、ユーザーのプランが増減していなければ 304 を返す
+@router.get("/user/{user_id}", response_model=List[schemas.MealPlanResponse])
+async def get_meal_plans_by_user(
+    user_id: UUID,
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    if stream:
+        return stream_ndjson(
+            crud.query_meal_plans_by_user(user_id), crud.MEAL_PLAN_KEYS, schemas.MealPlanResponse, cursor
+        )
 
-    meals = db.query(models.Meal).filter(models.Meal.user_id == user_id).all()
-
-    return schemas.MealPlanDetailResponse(
-        id=meal_plan.id,
-        user_id=user_id,
-        start_date=meal_plan.start_date,
-        end_date=meal_plan.end_date,
-        created_at=meal_plan.created_at,
-        meals=[
-            schemas.MealResponse(
-                id=meal.id,
-                user_id=meal.user_id,
-                date=meal.date,
-                meal_type=meal.meal_type,
-                recipe_id=meal.recipe_id,
-                created_at=meal.created_at
-            ) for meal in meals
-        ]
+    async def load():
+        meal_plans, next_cursor = await paginate(
+            db, crud.query_meal_plans_by_user(user_id), crud.MEAL_PLAN_KEYS, limit, cursor
+        )
+        return meal_plans, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+    version = await crud.get_meal_plans_version(db, user_id)
+    return await conditional_json_response(
+        request, ("meal_plans", user_id, limit, cursor), version, load, MEAL_PLAN_LIST
     )
 
-# 健診データをもとに1週間の食事プランを生成
-@router.post("/generate", response_model=schemas.MealPlanResponse)
-def generate_meal_plan(
-    meal_request: schemas.MealPlanGenerate = Body(...),
-    db: Session = Depends(get_db)
+
+@router.post("/generate/{user_id}", response_model=schemas.MealPlanJobResponse, status_code=202)
+async def enqueue_meal_plan_generation(
+    user_id: UUID,
+    planner: str = Query("auto", pattern="^(auto|gpt|local)$"),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    健診データに基づいて1週間の食事メニューを生成するAPI
+    健診データに基づく1週間の食事プラン生成をジョブとして登録し、すぐにジョブIDを返す。
+    結果は GET /meal_plans/jobs/{job_id} で確認する。
+    planner=local のときは GPT を使わずレシピ一覧からその場で生成し、完了したジョブを返す。
+    planner=auto（既定）は GPT が失敗したらローカル生成に切り替え、ジョブの fallback_reason に理由を残す。planner=gpt は切り替えない。
     """
-    user = db.query(models.User).filter(models.User.id == meal_request.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # 既存のレシピを取得
-    recipes = db.query(models.Recipe).all()
-    if not recipes:
-        raise HTTPException(status_code=404, detail="No recipes found")
-
-    # MealPlan 作成
-    meal_plan = models.MealPlan(
-        user_id=meal_request.user_id,
-        start_date=meal_request.start_date,
-        end_date=meal_request.end_date
-    )
-    db.add(meal_plan)
-    db.commit()
-    db.refresh(meal_plan)
-
-    # 各日の食事をランダムに割り当て
-    days = (meal_request.end_date - meal_request.start_date).days + 1
-    for i in range(days):
-        for meal_type in ["breakfast", "lunch", "dinner"]:
-            meal = models.Meal(
-                user_id=meal_request.user_id,
-                date=meal_request.start_date + timedelta(days=i),
-                meal_type=meal_type,
-                recipe_id=random.choice(recipes).id
-            )
-            db.add(meal)
-
-    db.commit()
-    return meal_plan
+    if not await crud.get_latest_health_record(db, user_id):
+        raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
 
+    return await enqueue_meal_plan_job(db, user_id, planner)
 
-@router.get("/user/{user_id}", response_model=List[schemas.MealPlanResponse])
-def get_meal_plans_by_user(user_id: UUID, db: Session = Depends(get_db)):
-    meal_plans = crud.get_meal_plans_by_user(db, user_id)
-    return meal_plans
-
-
-@router.post("/generate/{user_id}", response_model=schemas.MealPlanResponse)
-def generate_meal_plan(user_id: UUID, db: Session = Depends(get_db)):
-    record = (
-        db.query(HealthRecord)
-        .filter(HealthRecord.user_id == user_id)
-        .order_by(HealthRecord.date.desc())
-        .first()
-    )
 
-    if not record:
-        raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
-    
-
-    start_date = record.date
-    end_date = start_date + timedelta(days=6)
-
-    crud.delete_meal_plan_in_same_week(db, user_id, record.date, end_date)
-
-
-
-    prompt = f"""
-あなたは日本語で返答する管理栄養士です。以下の健康診断データに基づき、1週間分の食事メニュー（朝・昼・夕）を構造化JSON形式で提案してください。
-栄養分類名も日本語で記載してください。
-
-必ずJSON形式のみで返してください。説明・補足・コメント・空行は禁止です。
-出力は必ず次のような形式でお願いします：
-
-出力形式の例：
-{{
-  "week_plan": [
-    {{
-      "day": "月曜日",
-      "breakfast": {{
-            "title": "全粒粉トーストとヨーグルト",
-            "nutritionType": [
-                "high-fiber",
-                "high-protein"
-            ],
-            "cookingTime": 5,
-            "isQuick": true
-        }},
-        "lunch": {{
-            "title": "時短！高タンパク豆腐丼",
-            "nutritionType": [
-                "high-protein",
-                "low-fat"
-            ],
-            "cookingTime": 10,
-            "isQuick": true
-        }},
-        "dinner": {{
-            "title": "減塩でも美味しい和風煮物",
-            "nutritionType": [
-                "low-salt",
-                "high-fiber"
-            ],
-            "cookingTime": 40,
-            "isQuick": false
-        }}
-    }}
-  ]
-}}
-
-健康診断データ:
-年齢: {record.age}歳
-性別: {record.gender}
-身長: {record.height}cm
-体重: {record.weight}kg
-BMI: {record.bmi}
-血圧: {record.blood_pressure_systolic}/{record.blood_pressure_diastolic}
-血糖値: {record.blood_sugar}
-HbA1c: {record.hba1c}
-コレステロール（LDL）: {record.cholesterol_ldl}
-HDL: {record.cholesterol_hdl}
-中性脂肪: {record.triglycerides}
-肝機能: GOT {record.liver_got}, GPT {record.liver_gpt}, γ-GTP: {record.liver_r_gpt}
-"""
+@router.get("/cache/stats")
+def get_plan_cache_stats():
+    """GPT生成プランキャッシュのヒット／ミス数"""
+    return get_cache_stats()
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "あなたは管理栄養士です。出力はJSONオブジェクトのみで返してください。コメント、補足、空行は禁止です。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-        content = response.choices[0].message.content
-        print("GPTの出力:\n", content)
 
-        with open("gpt_output_debug.json", "w", encoding="utf-8") as f:
-            f.write(content)
+@router.get("/jobs/{job_id}", response_model=schemas.MealPlanJobResponse)
+async def get_meal_plan_job(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    job = await crud.get_meal_plan_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = schemas.MealPlanJobResponse.model_validate(job)
+    if job.status == "succeeded" and job.meal_plan_id:
+        meal_plan = await crud.get_meal_plan(db, job.meal_plan_id)
+        if meal_plan is not None:
+            response.meal_plan = schemas.MealPlanResponse.model_validate(meal_plan)
+    return response
+
 
+def _sse(event: str, data) -> str:
+    """Server-Sent Events の1イベント分の文字列を作る"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
 
-        try:
-            plan_json = json.loads(content)
-            plan_json = sort_week_plan(plan_json)  # 曜日順整形をここで実行
 
-        except json.JSONDecodeError as e:
-            print("JSON解析エラー:", e)
-            raise HTTPException(
-                status_code=500,
-                detail=f"GPTの出力が不正なJSONです: {str(e)}\n\n出力内容:\n{content}"
-            )
+async def _stream_meal_plan_events(user_id: UUID):
+    days = asyncio.Queue()
 
+    async def request(record) -> dict:
+        # GPT の出力を1日分ずつ受け取り、完成した日からこのストリームにも流す
+        week_plan = []
+        async for day in meal_plan_generator.stream_week_plan_days(record):
+            week_plan.append(day)
+            days.put_nowait(day)
+        return meal_plan_generator.sort_week_plan({"week_plan": week_plan})
+
+    generation = None
+    try:
+        # 生成中はセッション（接続）を持たない
+        async with AsyncSessionLocal() as db:
+            record = await crud.get_latest_health_record(db, user_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+
+        # POST /generate と同じ重複排除・保存時のロックを通す（同じ週の生成が実行中なら、その結果を待つ）
+        generation = asyncio.ensure_future(meal_plan_generator.generate_week_plan(
+            user_id, record, request=request, planner=meal_plan_generator.PLANNER_AUTO
+        ))
+        streamed = 0
+        while not generation.done() or not days.empty():
+            next_day = asyncio.ensure_future(days.get())
+            await asyncio.wait({next_day, generation}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_day.done():
+                next_day.cancel()
+                continue
+            streamed += 1
+            yield _sse("day", next_day.result())
+
+        meal_plan, fallback_reason = generation.result()
+        if fallback_reason is not None:
+            # GPT が途中で失敗しローカル生成に切り替えた。それまでに送った日は捨ててもらう
+            yield _sse("fallback", {"detail": fallback_reason})
+        if not streamed or fallback_reason is not None:
+            # キャッシュヒット・実行中の生成を待った・ローカル生成の場合は、保存したプランの日をまとめて送る
+            for day in meal_plan.plan_json.get("week_plan", []):
+                yield _sse("day", day)
+        yield _sse("done", schemas.MealPlanResponse.model_validate(meal_plan))
+    except HTTPException as e:
+        logger.warning(f"食事プランのストリーミング生成に失敗: user_id={user_id} detail={e.detail}")
+        yield _sse("error", {"detail": e.detail})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"GPT全体の処理中にエラーが発生しました: {str(e)}")
+        # ストリームの途中では HTTP のステータスを変えられないため、予期しないエラーもイベントで知らせる
+        logger.error(f"食事プランのストリーミング生成で予期しないエラー: user_id={user_id} error={e}")
+        yield _sse("error", {"detail": "食事プランの生成中にエラーが発生しました"})
+    finally:
+        # クライアントが切断しても生成自体は続く（SingleFlight）。ここでは待つのをやめるだけ
+        if generation is not None and not generation.done():
+            generation.cancel()
 
-    end_date = record.date + timedelta(days=6)
 
-    # 同一週のMealPlanがあれば削除（重複防止）
-    crud.delete_meal_plan_in_same_week(db, user_id, record.date, end_date)
+@router.get("/generate/{user_id}/stream")
+async def stream_meal_plan_generation(user_id: UUID, db: AsyncSession = Depends(get_db)):
+    """
+    1週間の食事プランを生成しながら、1日分が完成するたびに SSE（event: day）で送る。
+    最後に保存した MealPlan を event: done で送る。失敗したときは event: error を送る。
+    GPT が失敗しローカル生成に切り替えたときは event: fallback のあとにローカル生成の日を送り直す。
+    """
+    if not await crud.get_latest_health_record(db, user_id):
+        raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
 
-    meal_plan_create = schemas.MealPlanCreate(
-        user_id=user_id,
-        start_date=record.date,
-        end_date=end_date,
-        plan_json=plan_json
+    return StreamingResponse(
+        _stream_meal_plan_events(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return crud.create_meal_plan(db, meal_plan_create)
-
@@ -1,24 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import crud, schemas
 from database import get_db
 from uuid import UUID
-from fastapi import FastAPI
-from routers import auth
-
-app = FastAPI()
 
 router = APIRouter(prefix="/meals", tags=["Meals"])
 
 @router.post("/", response_model=schemas.MealResponse)
-def create_meal(meal: schemas.MealCreate, db: Session = Depends(get_db)):
-    return crud.create_meal(db, meal)
+async def create_meal(meal: schemas.MealCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_meal(db, meal)
 
 @router.get("/{meal_id}", response_model=schemas.MealResponse)
-def get_meal(meal_id: UUID, db: Session = Depends(get_db)):
-    meal = crud.get_meal(db, meal_id)
+async def get_meal(meal_id: UUID, db: AsyncSession = Depends(get_db)):
+    meal = await crud.get_meal(db, meal_id)
     if meal is None:
         raise HTTPException(status_code=404, detail="Meal not found")
     return meal
-
-app.include_router(auth.router)
\ No newline at end of file
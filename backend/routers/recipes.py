@@ -1,50 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from uuid import UUID
 
 import crud, schemas
 from database import get_db
-from routers.meal_plans import generate_meal_plan  # 新APIを内部で使用
+from utils.meal_plan_jobs import enqueue_meal_plan_job  # GPT生成はジョブとして実行
+from utils.pagination import (
+    DEFAULT_LIMIT,
+    LIST_DEFAULT_LIMIT,
+    LIST_MAX_LIMIT,
+    MAX_LIMIT,
+    NEXT_CURSOR_HEADER,
+    paginate,
+    stream_ndjson,
+)
+from utils.conditional import conditional_json_response
+from utils.serialization import RECIPE_LIST
 
 router = APIRouter(prefix="/recipes", tags=["Recipes"])
 
 
 #  レシピ検索（新規追加）
 @router.get("/search", response_model=list[schemas.RecipeResponse])
-def search_recipes(query: str = "", db: Session = Depends(get_db)):
+async def search_recipes(
+    response: Response,
+    query: str = "",
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
     """
-    タイトルに部分一致するレシピを検索します。
-    使用例: /recipes/search?query=スムージー
+    名前・説明に一致するレシピを類似度の高い順に検索します。
+    続きがある場合は X-Next-Cursor ヘッダーの値を cursor に指定すると次のページを取得できます。
+    使用例: /recipes/search?query=スムージー&limit=20
     """
-    return crud.search_recipes(db, query=query)
+    recipes, next_cursor = await crud.search_recipes(db, query=query, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return recipes
 
 
-# 全レシピ取得
+# 全レシピ取得（登録順にキーセットページング、stream=true の場合は NDJSON でストリーミング）
+# If-None-Match が前回の ETag と一致し、レシピが増減していなければ 304 を返す
 @router.get("/", response_model=list[schemas.RecipeResponse])
-def get_recipes(db: Session = Depends(get_db)):
-    return crud.get_recipes(db)
+async def get_recipes(
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    if stream:
+        return stream_ndjson(crud.query_recipes(), crud.RECIPE_KEYS, schemas.RecipeResponse, cursor, descending=False)
+
+    async def load():
+        recipes, next_cursor = await paginate(
+            db, crud.query_recipes(), crud.RECIPE_KEYS, limit, cursor, descending=False
+        )
+        return recipes, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+    version = await crud.get_recipes_version(db)
+    return await conditional_json_response(request, ("recipes", limit, cursor), version, load, RECIPE_LIST)
 
 
 #  週次メニュー生成（GPT + 健診データ）
-@router.post("/weekly-menu2/{user_id}")
-def get_weekly_menu2(user_id: UUID, db: Session = Depends(get_db)):
+@router.post("/weekly-menu2/{user_id}", response_model=schemas.MealPlanJobResponse, status_code=202)
+async def get_weekly_menu2(
+    user_id: UUID,
+    planner: str = Query("auto", pattern="^(auto|gpt|local)$"),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    健診データとGPTを使って1週間の食事プラン（week_plan）を生成し返す。
+    健診データとGPTを使った1週間の食事プラン（week_plan）生成をジョブとして登録する。
+    生成結果は GET /meal_plans/jobs/{job_id} の meal_plan.plan_json.week_plan で取得する。
+    planner=local のときは GPT を使わずレシピ一覧からその場で生成し、完了したジョブを返す。
+    planner=auto（既定）は GPT が失敗したらローカル生成に切り替え、ジョブの fallback_reason に理由を残す。planner=gpt は切り替えない。
     """
-    try:
-        meal_plan = generate_meal_plan(user_id=user_id, db=db)
-        if hasattr(meal_plan, "plan_json") and "week_plan" in meal_plan.plan_json:
-            return {
-                "user_id": str(meal_plan.user_id),
-                "start_date": str(meal_plan.start_date),
-                "end_date": str(meal_plan.end_date),
-                "plan_json": {
-                    "week_plan": meal_plan.plan_json["week_plan"]
-                },
-                "id": str(meal_plan.id),
-                "created_at": str(meal_plan.created_at)
-            }
-        else:
-            raise HTTPException(status_code=500, detail="生成されたデータが不完全です")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"エラーが発生しました: {str(e)}")
+    if not await crud.get_latest_health_record(db, user_id):
+        raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+
+    return await enqueue_meal_plan_job(db, user_id, planner)
@@ -1,37 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import models, schemas, crud
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, crud
 from database import get_db
-from passlib.context import CryptContext
-import uuid
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # 通常のユーザー作成エンドポイント（本番用）
 @router.post("/", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, user.email)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user)
+    return await crud.create_user(db, user)
 
 # テスト用ユーザー作成エンドポイント（POST /users/create）
 @router.post("/create", response_model=schemas.UserResponse)
-def create_test_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = crud.get_user_by_email(db, user.email)
+async def create_test_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await crud.get_user_by_email(db, user.email)
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed_password = pwd_context.hash(user.password)
-    new_user = models.User(
-        id=uuid.uuid4(),
-        email=user.email,
-        name=user.name,
-        password_hash=hashed_password
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    # パスワードのハッシュ化は専用のスレッドで行う（crud.create_user 内）
+    return await crud.create_user(db, user)
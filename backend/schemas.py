@@ -1,5 +1,6 @@
-from pydantic import BaseModel, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, ConfigDict
 from datetime import datetime, date
+import datetime as dt
 from typing import Dict, Optional, List
 from uuid import UUID
 from pydantic import BaseModel, validator, ConfigDict
@@ -45,18 +46,24 @@ class HealthRecordResponse(HealthRecordCreate):
     id: UUID
     user_id: UUID
 
-    @field_validator('id', 'user_id', mode='before')
-    def convert_uuid_to_str(cls, value):
-        if isinstance(value, UUID):
-            return str(value)
-        return value
+    model_config = ConfigDict(from_attributes=True)
 
 
-    model_config = ConfigDict(from_attributes=True)
+# 健診データ一括登録の結果（行番号は CSV のヘッダーを除いたデータ行の通し番号）
+class HealthRecordBulkError(BaseModel):
+    row: int
+    errors: List[dict]
+
+class HealthRecordBulkResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[HealthRecordBulkError]
+    errors_truncated: bool = False
 
 
 class HealthRecordUpdate(BaseModel):
-    date: Optional[date] = None
+    # 列名の date が型の date を隠す（= None の代入後に注釈が評価される）ため、モジュール経由で指定する
+    date: Optional[dt.date] = None
     age: Optional[int] = None
     gender: Optional[str] = None
     height: Optional[float] = None
@@ -75,6 +82,33 @@ class HealthRecordUpdate(BaseModel):
     liver_r_gpt: Optional[float] = None
     anomalies: Optional[dict] = None
 
+# 健診データの時系列（期間ごとの平均・移動平均・前期間との差分を列ごとの配列で返す）
+class HealthMetricSeries(BaseModel):
+    mean: List[Optional[float]]
+    rolling_mean: List[Optional[float]]
+    delta: List[Optional[float]]
+
+class HealthSeriesResponse(BaseModel):
+    user_id: UUID
+    bucket: str
+    window: int
+    dates: List[date]
+    count: List[int]
+    metrics: Dict[str, HealthMetricSeries]
+
+# 同じ年代・性別の健診データの中での位置（パーセンタイル）
+class CohortMetricPercentile(BaseModel):
+    value: float
+    percentile: float
+    cohort_size: int
+
+class CohortResponse(BaseModel):
+    user_id: UUID
+    date: date
+    age_band: int
+    gender: str
+    metrics: Dict[str, CohortMetricPercentile]
+
 # レシピスキーマ
 class RecipeBase(BaseModel):
     name: str
@@ -129,6 +163,24 @@ class MealPlanResponse(MealPlanBase):
 class MealPlanDetailResponse(MealPlanResponse):
     meals: List[MealResponse]
 
+# 食事プランの week_plan を1日・1食ごとに展開した行
+class MealPlanItemResponse(BaseModel):
+    meal_plan_id: UUID
+    user_id: UUID
+    day_index: int
+    day: Optional[str] = None
+    meal_type: str
+    title: Optional[str] = None
+    nutrition_types: List[str]
+    cooking_time: Optional[int] = None
+    is_quick: Optional[bool] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class MealPlanTitleCount(BaseModel):
+    title: str
+    count: int
+
 # 食事プランとレシピの中間テーブル
 class MealPlanRecipeBase(BaseModel):
     meal_plan_id: UUID
@@ -152,8 +204,29 @@ class MealNutritionTagResponse(MealNutritionTagBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# 栄養タイプの一括判定リクエスト（1回の IN 句・応答が大きくなりすぎないよう、ユーザー数に上限を設ける）
+RECOMMENDATION_BATCH_MAX_USERS = 1000
+
+class NutritionRecommendationBatchRequest(BaseModel):
+    user_ids: List[UUID] = Field(max_length=RECOMMENDATION_BATCH_MAX_USERS)
+
 # 🔧 Meal Plan 自動生成用の入力スキーマ
 class MealPlanGenerate(BaseModel):
     user_id: UUID
     start_date: date
     end_date: date
+
+# 食事プラン生成ジョブ（ステータス確認用）
+class MealPlanJobResponse(BaseModel):
+    id: UUID
+    user_id: UUID
+    status: str
+    meal_plan_id: Optional[UUID] = None
+    error: Optional[str] = None
+    planner: Optional[str] = None
+    fallback_reason: Optional[str] = None  # GPT が失敗しローカル生成に切り替えたときの理由
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    meal_plan: Optional[MealPlanResponse] = None  # 完了時のみ生成結果を含める
+
+    model_config = ConfigDict(from_attributes=True)
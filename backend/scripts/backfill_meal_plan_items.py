@@ -0,0 +1,64 @@
+"""
+既存の食事プランの plan_json を meal_plan_items に展開するバックフィルコマンド
+
+使い方（backend ディレクトリで実行）:
+    python scripts/backfill_meal_plan_items.py           # 展開行のないプランのみ
+    python scripts/backfill_meal_plan_items.py --all     # 全プランを展開し直す（展開の仕方を変えたとき）
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, insert, select
+
+from database import SessionLocal
+from logging_config import logger
+from models import MealPlan, MealPlanItem
+from utils.plan_projection import project_plan
+
+
+def backfill(batch_size: int = 500, reproject_all: bool = False) -> int:
+    db = SessionLocal()
+    projected = 0
+    try:
+        query = db.query(MealPlan.id, MealPlan.user_id, MealPlan.plan_json).filter(MealPlan.plan_json.is_not(None))
+        if not reproject_all:
+            query = query.filter(~select(MealPlanItem.meal_plan_id).where(MealPlanItem.meal_plan_id == MealPlan.id).exists())
+
+        # 全件を読み込まないよう、サーバーサイドカーソルで batch_size 件ずつ処理する
+        rows = query.yield_per(batch_size)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                projected += _flush(batch)
+                batch = []
+        if batch:
+            projected += _flush(batch)
+        return projected
+    finally:
+        db.close()
+
+
+def _flush(batch: list) -> int:
+    items = [item for meal_plan_id, user_id, plan_json in batch for item in project_plan(meal_plan_id, user_id, plan_json)]
+    # 読み出し中のカーソルを閉じないよう、書き込みは別セッションで行う
+    with SessionLocal() as writer:
+        writer.execute(delete(MealPlanItem).where(MealPlanItem.meal_plan_id.in_([row[0] for row in batch])))
+        if items:
+            writer.execute(insert(MealPlanItem), items)
+        writer.commit()
+    logger.info(f"meal_plan_items を展開: プラン={len(batch)} 件 行={len(items)}")
+    return len(batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="食事プランの plan_json を meal_plan_items に展開する")
+    parser.add_argument("--all", action="store_true", help="全プランを展開し直す")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    count = backfill(batch_size=args.batch_size, reproject_all=args.all)
+    print(f"完了: {count} 件のプランを展開しました")
@@ -0,0 +1,70 @@
+"""
+既存の健診データに nutrition_flags / rules_version を書き込むバックフィルコマンド
+
+使い方（backend ディレクトリで実行）:
+    python scripts/backfill_nutrition_flags.py           # 未判定・古いルールで判定済みの行のみ
+    python scripts/backfill_nutrition_flags.py --all     # 全行を現在のルールで判定し直す
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_, update
+
+from database import SessionLocal
+from logging_config import logger
+from models import HealthRecord
+from utils.rule_engine import get_rule_set
+
+
+def backfill(batch_size: int = 1000, recompute_all: bool = False) -> int:
+    rule_set = get_rule_set()
+    db = SessionLocal()
+    updated = 0
+    try:
+        query = db.query(HealthRecord.id, *[getattr(HealthRecord, f) for f in rule_set.fields])
+        if not recompute_all:
+            query = query.filter(or_(
+                HealthRecord.nutrition_flags.is_(None),
+                HealthRecord.rules_version.is_(None),
+                HealthRecord.rules_version != rule_set.version,
+            ))
+
+        # 全件を読み込まないよう、サーバーサイドカーソルで batch_size 件ずつ処理する
+        rows = query.yield_per(batch_size)
+        batch = []
+        for row in rows:
+            batch.append({
+                "id": row[0],
+                "nutrition_flags": rule_set.evaluate(tuple(row[1:])),
+                "rules_version": rule_set.version,
+            })
+            if len(batch) >= batch_size:
+                updated += _flush(batch)
+                batch = []
+        if batch:
+            updated += _flush(batch)
+        return updated
+    finally:
+        db.close()
+
+
+def _flush(batch: list) -> int:
+    # 読み出し中のカーソルを閉じないよう、更新は別セッションで行う
+    with SessionLocal() as writer:
+        writer.execute(update(HealthRecord), batch)
+        writer.commit()
+    logger.info(f"nutrition_flags を更新: {len(batch)} 件")
+    return len(batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="健診データの nutrition_flags をバックフィルする")
+    parser.add_argument("--all", action="store_true", help="全行を現在のルールで判定し直す")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    count = backfill(batch_size=args.batch_size, recompute_all=args.all)
+    print(f"完了: {count} 件を更新しました（ルール version={get_rule_set().version}）")
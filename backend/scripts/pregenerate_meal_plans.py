@@ -0,0 +1,51 @@
+"""
+翌週分の GPT 食事プランを夜間にまとめて作っておくコマンド
+プランが LEAD_DAYS 日以内に終わる・プランがない・健診データが更新されたユーザーが対象
+中断しても、もう一度実行すれば未完了のジョブから再開する
+
+使い方（backend ディレクトリで実行）:
+    python scripts/pregenerate_meal_plans.py
+    python scripts/pregenerate_meal_plans.py --concurrency 16 --rpm 500 --tpm 200000
+
+cron の例（毎日 2:00）:
+    0 2 * * * cd /app/backend && python scripts/pregenerate_meal_plans.py >> /var/log/pregenerate.log 2>&1
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import async_engine
+from utils.meal_plan_batch import (
+    BATCH_CONCURRENCY,
+    LEAD_DAYS,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    MealPlanBatch,
+    run_batch,
+)
+from utils.meal_plan_generator import close_openai_client
+
+
+async def main(args) -> dict:
+    batch = MealPlanBatch(concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    try:
+        return await run_batch(batch, lead_days=args.lead_days, limit=args.limit)
+    finally:
+        await close_openai_client()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GPT の食事プランを一括生成する")
+    parser.add_argument("--lead-days", type=int, default=LEAD_DAYS, help="プランが終わるこの日数前に次を作る")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=OPENAI_REQUESTS_PER_MINUTE, help="1分あたりの GPT リクエスト数の上限")
+    parser.add_argument("--tpm", type=int, default=OPENAI_TOKENS_PER_MINUTE, help="1分あたりのトークン数の上限")
+    parser.add_argument("--limit", type=int, default=None, help="今回新しく処理するユーザー数の上限")
+    args = parser.parse_args()
+
+    counts = asyncio.run(main(args))
+    print(f"完了: 成功 {counts.get('succeeded', 0)} 件 / 失敗 {counts.get('failed', 0)} 件 / GPT 呼び出し {counts.get('gpt_requests', 0)} 回")
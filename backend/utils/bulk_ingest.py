@@ -0,0 +1,225 @@
+import csv
+import json
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from schemas import HealthRecordCreate
+from logging_config import logger
+
+# 検証・登録をまとめて行う行数
+CHUNK_SIZE = 5000
+# レポートに含めるエラーの最大件数（件数自体はすべて数える）
+MAX_REPORTED_ERRORS = 1000
+
+
+async def iter_lines(byte_stream):
+    """リクエストボディのバイト列のストリームを1行ずつの文字列に分割する"""
+    buffer = b""
+    first = True
+    async for chunk in byte_stream:
+        buffer += chunk
+        if first and len(buffer) >= 3:
+            # Excel などが付ける BOM を取り除く
+            if buffer.startswith(b"\xef\xbb\xbf"):
+                buffer = buffer[3:]
+            first = False
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+def _ends_in_quotes(line: str, in_quotes: bool) -> bool:
+    """
+    CSV の1行を読み終えた時点で、引用符で囲んだ値の中にいるか（csv.reader の既定の方言と同じ規則）
+    値の先頭の " から引用が始まり、"" は " そのもの。値の途中の " は普通の文字として扱う
+    """
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if in_quotes:
+            if c == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif c == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and c == ","
+        i += 1
+    return in_quotes
+
+
+class _LineFeed:
+    """csv.reader に渡す行の供給元。届いた行を溜めておき、reader が読むたびに1行ずつ返す"""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+class HealthRecordBulkIngester:
+    """
+    CSV / NDJSON の行を受け取り、CHUNK_SIZE 行ごとに HealthRecordCreate で検証して一括登録する
+    CSV はボディ全体を1つの csv.reader で読む（引用符で囲んだ値の中の改行・カンマもそのまま扱える）
+    """
+
+    def __init__(self, format: str):
+        self.format = format
+        self.header = None
+        self.row_number = 0   # データ行の通し番号（1始まり、CSV のヘッダー行は含めない）
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self._pending = []    # (行番号, NDJSON の行の文字列 / CSV の値のリスト)
+        self._feed = _LineFeed()
+        self._reader = csv.reader(self._feed)
+        self._in_quotes = False  # 読みかけの CSV レコードが引用符の中で改行しているか
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add_line(self, line: str):
+        if self.format == "ndjson":
+            if line.strip():
+                self.row_number += 1
+                self._pending.append((self.row_number, line))
+            return
+
+        if not self._feed.lines and not line.strip():
+            return
+        self._feed.lines.append(line + "\n")
+        if '"' in line or self._in_quotes:
+            self._in_quotes = _ends_in_quotes(line, self._in_quotes)
+            if self._in_quotes:
+                # 引用符が閉じるまで続きの行を待つ
+                return
+        try:
+            values = next(self._reader)
+        except csv.Error as e:
+            # 値の途中の改行文字・大きすぎる値など。読みかけの行は捨てて次のレコードから読み直す
+            self._feed.lines.clear()
+            if self.header is None:
+                raise
+            self.row_number += 1
+            self._error(self.row_number, [{"msg": f"CSV として読めません: {e}"}])
+            return
+        self._add_values(values)
+
+    def _add_values(self, values: list):
+        if self.header is None:
+            self.header = values
+            return
+        self.row_number += 1
+        self._pending.append((self.row_number, values))
+
+    def finish(self):
+        """ボディの終わりで呼ぶ。引用符が閉じていない最後のレコードはエラーにする"""
+        if self._feed.lines:
+            self._feed.lines.clear()
+            self._in_quotes = False
+            self.row_number += 1
+            self._error(self.row_number, [{"msg": "引用符が閉じていません"}])
+
+    def _error(self, row: int, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def _parse(self, raw) -> dict:
+        if self.format == "ndjson":
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError("JSON オブジェクトではありません")
+            return data
+
+        if len(raw) != len(self.header):
+            raise ValueError(f"列数がヘッダーと一致しません（{len(raw)} / {len(self.header)}）")
+        # CSV の空欄は未入力として扱う
+        data = {key: (value if value != "" else None) for key, value in zip(self.header, raw)}
+        if data.get("anomalies"):
+            data["anomalies"] = json.loads(data["anomalies"])
+        return data
+
+    def _validate(self, pending: list) -> list:
+        valid = []
+        for row, raw in pending:
+            try:
+                valid.append((row, HealthRecordCreate(**self._parse(raw))))
+            except ValidationError as e:
+                self._error(row, e.errors(include_url=False, include_context=False))
+            except (ValueError, TypeError) as e:
+                self._error(row, [{"msg": str(e)}])
+        return valid
+
+    async def flush(self, db: AsyncSession):
+        """
+        溜まっている行を検証し、正しい行だけをまとめて登録する（チャンクごとにコミット）
+        登録でエラーになったチャンクはロールバックし、その行をすべて失敗としてレポートに残して次へ進む
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        # 解析・検証は CPU を使うため、イベントループを止めないようスレッドプールで行う
+        valid = await run_in_threadpool(self._validate, pending)
+
+        # 存在しないユーザーの行は外部キー違反でチャンク全体が失敗しないよう事前に除く
+        known_users = await crud.get_existing_user_ids(db, {record.user_id for _, record in valid})
+        rows, records = [], []
+        for row, record in valid:
+            if record.user_id in known_users:
+                rows.append(row)
+                records.append(record)
+            else:
+                self._error(row, [{"loc": ["user_id"], "msg": "ユーザーが見つかりません"}])
+
+        if records:
+            try:
+                self.inserted += await crud.bulk_create_health_records(db, records)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"健診データ一括登録: チャンク（{pending[0][0]}〜{pending[-1][0]} 行目）の登録に失敗: {e}")
+                message = f"登録に失敗しました（{pending[0][0]}〜{pending[-1][0]} 行目のチャンク）: {type(e).__name__}"
+                for row in rows:
+                    self._error(row, [{"msg": message}])
+                return
+        logger.info(f"健診データ一括登録: チャンク {len(pending)} 行中 {len(records)} 行を登録")
+
+    def report(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            # 検証・ユーザーの確認・登録の順に見つかるため、行番号の順に並べ直す
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def ingest(db: AsyncSession, format: str, byte_stream, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    リクエストボディ（バイト列のストリーム）を読みながら chunk_size 行ごとに登録し、結果のレポートを返す
+    UTF-8 として読めないときは UnicodeDecodeError（それまでのチャンクは登録済み）、CSV のヘッダー行を読めないときは csv.Error
+    """
+    ingester = HealthRecordBulkIngester(format)
+    async for line in iter_lines(byte_stream):
+        ingester.add_line(line)
+        if ingester.pending >= chunk_size:
+            await ingester.flush(db)
+    ingester.finish()
+    await ingester.flush(db)
+    return ingester.report()
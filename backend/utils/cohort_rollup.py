@@ -0,0 +1,133 @@
+import math
+from collections import Counter
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import HealthCohortHistogram
+
+# 項目ごとの区間（下限, 幅, 区間数）。範囲外の値は両端の区間に入れる
+METRIC_BINS = {
+    "height": (100.0, 1.0, 120),
+    "weight": (20.0, 0.5, 400),
+    "bmi": (10.0, 0.1, 500),
+    "blood_pressure_systolic": (60.0, 1.0, 200),
+    "blood_pressure_diastolic": (30.0, 1.0, 130),
+    "blood_sugar": (40.0, 1.0, 460),
+    "hba1c": (3.0, 0.1, 120),
+    "cholesterol_total": (50.0, 1.0, 450),
+    "cholesterol_hdl": (10.0, 1.0, 140),
+    "cholesterol_ldl": (20.0, 1.0, 380),
+    "triglycerides": (10.0, 5.0, 398),
+    "liver_got": (0.0, 1.0, 500),
+    "liver_gpt": (0.0, 1.0, 500),
+    "liver_r_gpt": (0.0, 1.0, 1000),
+}
+
+# 年代の上限（これ以上はまとめて1つのコホートにする）
+MAX_AGE_BAND = 80
+
+# 1回の UPSERT 文に含める行数（バインド変数の上限を超えないように分割する）
+UPSERT_PAGE_SIZE = 1000
+
+
+def age_band(age) -> int:
+    return min(max(int(age) // 10 * 10, 0), MAX_AGE_BAND)
+
+
+def normalize_gender(gender) -> str:
+    return (gender or "unknown").strip().lower()
+
+
+def bin_of(metric: str, value) -> int:
+    lo, width, size = METRIC_BINS[metric]
+    # 浮動小数点の誤差で 5.0 が 4.999… の区間に入らないよう、わずかに足してから切り捨てる
+    return min(max(math.floor((float(value) - lo) / width + 1e-9), 0), size - 1)
+
+
+def _get(record, name):
+    return record.get(name) if isinstance(record, dict) else getattr(record, name)
+
+
+class HistogramDelta:
+    """
+    ヒストグラムへの増減（+1 / -1）を (年代, 性別, 項目, 区間) ごとにまとめたもの
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, record, sign: int = 1):
+        """健診データ（ORM オブジェクトまたは dict）1件分の各項目を加える（sign=-1 で取り除く）"""
+        age = _get(record, "age")
+        if age is None:
+            return
+        cohort = (age_band(age), normalize_gender(_get(record, "gender")))
+        for metric in METRIC_BINS:
+            value = _get(record, metric)
+            if value is not None:
+                self.counts[(*cohort, metric, bin_of(metric, value))] += sign
+
+    def rows(self) -> list[dict]:
+        return [
+            {"age_band": band, "gender": gender, "metric": metric, "bin": bin, "count": count}
+            for (band, gender, metric, bin), count in self.counts.items()
+            if count != 0
+        ]
+
+
+async def apply_delta(db: AsyncSession, delta: HistogramDelta):
+    """
+    差分を1回の UPSERT（count = count + 差分）で反映する。commit は呼び出し側で行う
+    （健診データの変更と同じトランザクションで反映するため）
+    """
+    # 同時に更新するトランザクション同士がデッドロックしないよう、行ロックを取る順序をそろえる
+    rows = sorted(delta.rows(), key=lambda row: (row["age_band"], row["gender"], row["metric"], row["bin"]))
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    for start in range(0, len(rows), UPSERT_PAGE_SIZE):
+        statement = dialect.insert(HealthCohortHistogram).values(rows[start:start + UPSERT_PAGE_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=["age_band", "gender", "metric", "bin"],
+            set_={"count": HealthCohortHistogram.count + statement.excluded.count},
+        )
+        await db.execute(statement)
+
+
+async def cohort_percentiles(db: AsyncSession, record, metrics: tuple) -> dict:
+    """
+    健診データの各項目が、同じ年代・性別の健診データの中で何パーセンタイルにあたるかを返す
+    ヒストグラムの区間数に比例する1回の集計で求まり、健診データの件数には依存しない
+    """
+    targets = {metric: bin_of(metric, _get(record, metric)) for metric in metrics if _get(record, metric) is not None}
+    if not targets:
+        return {}
+
+    h = HealthCohortHistogram
+    target = case(targets, value=h.metric)
+    result = await db.execute(
+        select(
+            h.metric,
+            func.sum(h.count),
+            func.sum(case((h.bin < target, h.count), else_=0)),
+            func.sum(case((h.bin == target, h.count), else_=0)),
+        )
+        .where(and_(
+            h.age_band == age_band(_get(record, "age")),
+            h.gender == normalize_gender(_get(record, "gender")),
+            h.metric.in_(list(targets)),
+        ))
+        .group_by(h.metric)
+    )
+
+    percentiles = {}
+    for metric, total, below, equal in result.all():
+        if not total:
+            continue
+        # 同じ区間の件数は半分を下側として数える（中間順位）
+        percentiles[metric] = {
+            "value": _get(record, metric),
+            "percentile": round((below + equal / 2) / total * 100, 1),
+            "cohort_size": int(total),
+        }
+    return percentiles
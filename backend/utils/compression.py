@@ -0,0 +1,117 @@
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    # Brotli は任意（pip install brotli）。入っていなければ gzip のみ
+    import brotli
+except ImportError:
+    brotli = None
+
+# この大きさ（バイト）未満のレスポンスは圧縮しない（圧縮にかかる CPU の方が高くつく）
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+
+# 動的なレスポンス向けに、圧縮率より速度を優先した設定
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+# 届いた分をすぐに送る必要があるため圧縮しない
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Accept-Encoding から圧縮方式を選ぶ（br を優先、q=0 のものは使わない）"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding: str):
+    """(compress, finish) を返す。compress は本文の一部を、finish は残りを圧縮したバイト列を返す"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.finish
+    # wbits=31 で gzip 形式（ヘッダー・CRC 付き）
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+class CompressionMiddleware:
+    """
+    COMPRESSION_MIN_BYTES 以上のレスポンスを Brotli / gzip で圧縮する
+    ストリーミング（NDJSON など）は1チャンクずつ圧縮して送るため、全体をメモリに溜めない
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compress = finish = None
+
+        async def send_compressed(message):
+            nonlocal start, compress, finish
+            if message["type"] == "http.response.start":
+                # 本文の最初のチャンクを見て圧縮するか決めるまで、ヘッダーの送信を待つ
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+                    or (len(body) < self.minimum_size and not more_body)
+                ):
+                    compress, finish = _compressor(encoding)
+                    body = compress(body) + (b"" if more_body else finish())
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    # 強い ETag は表現（圧縮方式）ごとに変える（"<hash>" → "<hash>-gzip"）
+                    etag = headers.get("etag")
+                    if etag and etag.startswith('"'):
+                        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    message = {"type": "http.response.body", "body": body, "more_body": more_body}
+                await send(start)
+                start = None
+            elif compress is not None:
+                body = compress(body) + (b"" if more_body else finish())
+                message = {"type": "http.response.body", "body": body, "more_body": more_body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from utils.serialization import serialize
+
+# (リソース, 版) → ETag を覚えておく件数
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "10000"))
+
+# 利用者ごとのデータのため共有キャッシュには置かせず、ブラウザには毎回 ETag で確認させる
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(body: bytes) -> str:
+    """本文の SHA-256 から強い ETag を作る（同じ内容ならワーカーが違っても同じ値）"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match に etag が含まれるか
+    圧縮したレスポンスの ETag（"<hash>-gzip" など、utils/compression.py で付ける）も同じ内容として扱う
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or candidate.startswith(etag[:-1] + "-"):
+            return True
+    return False
+
+
+class ETagCache:
+    """
+    リソースごとに、最後に返した版（DB から安く取れる値）と、そのときの ETag・ヘッダーを持つ LRU
+    版が変わっていなければ、行の取得・シリアライズをせずに 304 を返せる
+    """
+
+    def __init__(self, size: int = ETAG_CACHE_SIZE):
+        self.size = size
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, version) -> Optional[tuple[str, dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: tuple, version, etag: str, headers: dict):
+        with self._lock:
+            self._entries[key] = (version, etag, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_etags = ETagCache()
+
+
+def _not_modified(if_none_match: str, etag: str, headers: dict) -> Response:
+    # 304 にはクライアントが持っている表現の ETag（圧縮の有無を含む）を返す
+    matched = next(
+        (c.strip() for c in if_none_match.split(",") if c.strip() != "*" and etag_matches(c, etag)), etag
+    )
+    return Response(status_code=304, headers={**headers, "ETag": matched, "Cache-Control": CACHE_CONTROL})
+
+
+async def conditional_json_response(
+    request: Request,
+    key: tuple,
+    version,
+    load: Callable[[], Awaitable[tuple]],
+    adapter: TypeAdapter,
+) -> Response:
+    """
+    条件付き GET に対応した JSON レスポンス
+    key はリソース（とページの指定）、version はその内容が変わると変わる値（件数・created_at の最大値など）
+    load は (内容, 追加のヘッダー) を返す。版が前回と同じで If-None-Match が一致すれば load を呼ばずに 304 を返す
+    """
+    if_none_match = request.headers.get("if-none-match")
+    cached = _etags.get(key, version)
+    if cached is not None and etag_matches(if_none_match, cached[0]):
+        return _not_modified(if_none_match, *cached)
+
+    content, headers = await load()
+    body = serialize(adapter, content)
+    etag = make_etag(body)
+    _etags.put(key, version, etag, headers)
+    # 再起動直後など、覚えていなくても内容が同じなら 304
+    if etag_matches(if_none_match, etag):
+        return _not_modified(if_none_match, etag, headers)
+
+    return Response(
+        body,
+        headers={**headers, "ETag": etag, "Cache-Control": CACHE_CONTROL},
+        media_type="application/json",
+    )
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+from fastapi import HTTPException, Query, Request
+
+from logging_config import logger
+
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "firebase_credentials.json")
+
+# Firebase ID トークンの署名に使われる公開鍵（x509 証明書）
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# 検証済みトークンのキャッシュ件数（有効期限 exp まで保持）
+TOKEN_CACHE_SIZE = int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", "10000"))
+
+# 公開鍵の有効期限のこの秒数前から、バックグラウンドで取り直す
+KEY_REFRESH_MARGIN_SECONDS = 300
+# 未知の kid（鍵のローテーション直後）で取り直す間隔の下限
+KEY_REFETCH_INTERVAL_SECONDS = 60
+
+_firebase_lock = threading.Lock()
+_project_id = None
+
+
+def get_firebase_app():
+    """
+    Firebase は初回の利用時に初期化する（import・起動時に資格情報ファイルや firebase_admin を読み込まない）
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS))
+            logger.info("Firebase initialized")
+    return firebase_admin.get_app()
+
+
+def get_project_id() -> str:
+    """トークンの aud・iss の検証に使うプロジェクトID（FIREBASE_PROJECT_ID か資格情報ファイルから）"""
+    global _project_id
+    if _project_id is None:
+        project_id = os.getenv("FIREBASE_PROJECT_ID")
+        if not project_id:
+            with open(FIREBASE_CREDENTIALS, encoding="utf-8") as f:
+                project_id = json.load(f)["project_id"]
+        _project_id = project_id
+    return _project_id
+
+
+class PublicKeyStore:
+    """
+    Google の公開鍵をプロセス内に持ち、Cache-Control の max-age に従って取り直す
+    有効期限が近づいたらバックグラウンドで更新し、リクエストは古い鍵のまま検証を続ける
+    """
+
+    def __init__(self, url: str = CERTS_URL):
+        self.url = url
+        self.keys = {}
+        self.expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def refresh(self):
+        # 同時に期限切れを検知したリクエストでも、取得は1回にまとめる
+        started = time.monotonic()
+        async with self._lock:
+            if self._fetched_at > started:
+                return
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+            self.keys = {
+                kid: load_pem_x509_certificate(pem.encode()).public_key()
+                for kid, pem in response.json().items()
+            }
+            match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+            self._fetched_at = time.monotonic()
+            self.expires_at = self._fetched_at + (int(match.group(1)) if match else 3600)
+            logger.info(f"Firebase の公開鍵を更新: {len(self.keys)} 件")
+
+    async def _try_refresh(self):
+        # 取得に失敗しても、手元の鍵があればそのまま検証を続ける
+        try:
+            await self.refresh()
+        except Exception as e:
+            if not self.keys:
+                raise
+            logger.warning(f"Firebase の公開鍵の更新に失敗（保持中の鍵で検証を継続）: {e}")
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._try_refresh())
+
+    async def get(self, kid: str):
+        now = time.monotonic()
+        if now >= self.expires_at:
+            await self._try_refresh()
+        elif now >= self.expires_at - KEY_REFRESH_MARGIN_SECONDS:
+            self._refresh_in_background()
+
+        if kid not in self.keys and time.monotonic() - self._fetched_at >= KEY_REFETCH_INTERVAL_SECONDS:
+            await self._try_refresh()
+        return self.keys.get(kid)
+
+
+class TokenCache:
+    """
+    検証済みのトークン → claims の LRU（キーはトークンの SHA-256。exp を過ぎたものは返さない）
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE):
+        self.size = size
+        self._entries: "OrderedDict[bytes, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        with self._lock:
+            self._entries[self._key(token)] = claims
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+_keys = PublicKeyStore()
+_cache = TokenCache()
+
+
+def _decode(token: str, key, project_id: str) -> dict:
+    """firebase_admin.auth.verify_id_token と同じ項目を検証する"""
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=["RS256"],
+        audience=project_id,
+        issuer=f"https://securetoken.google.com/{project_id}",
+        options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+    )
+    if not claims["sub"] or len(claims["sub"]) > 128:
+        raise jwt.InvalidTokenError("sub が不正です")
+    if claims.get("auth_time", 0) > time.time():
+        raise jwt.InvalidTokenError("auth_time が未来の時刻です")
+    claims["uid"] = claims["sub"]
+    return claims
+
+
+async def verify_firebase_token(token: str) -> dict:
+    """
+    Firebase の ID トークンを検証して claims を返す（トークンが不正なら 401、公開鍵を取得できなければ 503）
+    同じトークンは exp まで署名の検証を省略する
+    """
+    claims = _cache.get(token)
+    if claims is not None:
+        return dict(claims)
+
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.InvalidTokenError as e:
+        logger.error(f"トークン検証失敗: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # 公開鍵を取得できないのはこちら側（または Google）の障害。401 にするとクライアントがログアウトしてしまう
+    try:
+        key = await _keys.get(kid)
+    except Exception as e:
+        logger.error(f"Firebase の公開鍵を取得できません: {e}")
+        raise HTTPException(
+            status_code=503, detail="認証サーバーに接続できません。しばらくしてから再度お試しください", headers={"Retry-After": "5"}
+        )
+
+    try:
+        if key is None:
+            raise jwt.InvalidTokenError(f"未知の kid です: {kid}")
+        claims = _decode(token, key, get_project_id())
+    except jwt.InvalidTokenError as e:
+        logger.error(f"トークン検証失敗: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    _cache.put(token, claims)
+    return dict(claims)
+
+
+async def get_firebase_claims(request: Request, token: Optional[str] = Query(None)) -> dict:
+    """
+    保護するエンドポイントの依存性（Authorization: Bearer <token>、互換のため ?token= も受け付ける）
+    """
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return await verify_firebase_token(token)
@@ -1,33 +1,41 @@
+import numpy as np
+
+from utils.rule_engine import get_rule_set
+
+
 def analyze_health_data(data: dict) -> list[str]:
     """
     健診データから推奨される栄養タイプを判定する関数
+    判定基準は rules/health_rules.json のルール定義（utils/rule_engine.py でコンパイル済み）に従う
 
     Parameters:
         data (dict): 健診データ（例：血圧、血糖、脂質 など）
 
     Returns:
-        list[str]: 該当する栄養タイプ（low_salt, low_sugar, low_fat など）
+        list[str]: 該当する栄養タイプ（low_salt, low_sugar, low_fat など）。重複はしない
     """
-    nutrition_types = []
+    rule_set = get_rule_set()
+    return rule_set.decode(rule_set.evaluate_dict(data))
 
-    # 高血圧気味 → 減塩食
-    if data.get("blood_pressure_systolic", 0) >= 130 or data.get("blood_pressure_diastolic", 0) >= 85:
-        nutrition_types.append("low_salt")
 
-    # 血糖値が高め → 低糖質食
-    if data.get("blood_sugar", 0) >= 126 or data.get("hba1c", 0) >= 6.5:
-        nutrition_types.append("low_sugar")
+def analysis_fields() -> list[str]:
+    """判定に必要な HealthRecord の列（現在のルール定義から決まる）"""
+    return list(get_rule_set().fields)
 
-    # 脂質が高め → 低脂肪
-    if data.get("cholesterol_total", 0) >= 220 or data.get("cholesterol_ldl", 0) >= 140:
-        nutrition_types.append("low_fat")
 
-    # 中性脂肪が高い → 低脂肪
-    if data.get("triglycerides", 0) >= 150:
-        nutrition_types.append("low_fat")
+def analyze_health_batch(columns: dict) -> np.ndarray:
+    """
+    列ごとの配列（HealthRecord の各項目）をまとめて判定し、レコードごとの栄養タイプのビットフラグを返す
+
+    Parameters:
+        columns (dict): 列名 → 値の配列（list / NumPy 配列）。None は欠損として扱う
+
+    Returns:
+        np.ndarray: ビットフラグ配列（ビット位置はルール定義の nutrition_types の順）
+    """
+    return get_rule_set().evaluate_columns(columns)
 
-    # 肝臓値（GPT）が高い → 肝臓サポート
-    if data.get("liver_gpt", 0) >= 56:
-        nutrition_types.append("liver_support")
 
-    return nutrition_types
+def decode_nutrition_flags(flags: int) -> list[str]:
+    """ビットフラグを栄養タイプ名のリストに戻す"""
+    return get_rule_set().decode(flags)
@@ -0,0 +1,166 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 時系列で返せる健診項目（数値の列）
+SERIES_METRICS = (
+    "height",
+    "weight",
+    "bmi",
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "blood_sugar",
+    "hba1c",
+    "cholesterol_total",
+    "cholesterol_hdl",
+    "cholesterol_ldl",
+    "triglycerides",
+    "liver_got",
+    "liver_gpt",
+    "liver_r_gpt",
+)
+BUCKETS = ("none", "week", "month", "quarter", "year")
+
+# キャッシュするユーザー数の上限と有効期間（秒）。他のワーカーでの更新はこの期間内に反映される
+SERIES_CACHE_SIZE = int(os.getenv("HEALTH_SERIES_CACHE_SIZE", "1024"))
+SERIES_CACHE_TTL_SECONDS = float(os.getenv("HEALTH_SERIES_CACHE_TTL_SECONDS", "300"))
+
+# user_id → (保存時刻, {(metrics, bucket, window): 結果})
+_cache: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+# user_id → 最後に無効化したときの世代（読み込み中に更新された古い結果を保存しないため。_cache と同じく SERIES_CACHE_SIZE 件まで）
+_generations: "OrderedDict[str, int]" = OrderedDict()
+# 世代の通し番号と、件数の上限で捨てた世代の最大値（記録のないユーザーの世代として使う）
+_last_generation = 0
+_evicted_generation = 0
+_lock = threading.Lock()
+
+
+def parse_metrics(metrics: str) -> tuple:
+    """カンマ区切りの項目名を検証してタプルにする（未知の項目は ValueError）"""
+    names = tuple(dict.fromkeys(name.strip() for name in metrics.split(",") if name.strip()))
+    unknown = [name for name in names if name not in SERIES_METRICS]
+    if unknown:
+        raise ValueError(f"未対応の項目です: {', '.join(unknown)}")
+    if not names:
+        raise ValueError("metrics を1つ以上指定してください")
+    return names
+
+
+def _bucket_starts(dates: np.ndarray, bucket: str) -> np.ndarray:
+    """datetime64[D] の配列を、各日付が属する期間の開始日に丸める"""
+    if bucket == "none":
+        return dates
+    if bucket == "week":
+        # 1970-01-01 は木曜日なので、3日ずらして月曜日始まりにそろえる
+        days = dates.astype(np.int64)
+        return ((days + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    if bucket == "month":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if bucket == "quarter":
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        return (months // 3 * 3).astype("datetime64[M]").astype("datetime64[D]")
+    return dates.astype("datetime64[Y]").astype("datetime64[D]")
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """NaN を除いた直近 window 期間の平均（累積和の差分で計算）"""
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    start = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    window_counts = counts[1:] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, (sums[1:] - sums[start]) / window_counts, np.nan)
+
+
+def _to_list(values: np.ndarray) -> list:
+    return [None if np.isnan(v) else round(float(v), 3) for v in values]
+
+
+def compute_series(dates: list, columns: dict, bucket: str = "month", window: int = 3) -> dict:
+    """
+    日付順の健診データを期間ごとに平均し、移動平均と前期間との差分を列ごとの配列で返す
+    columns は項目名 → 値のリスト（dates と同じ並び、欠損は None）
+    """
+    starts = _bucket_starts(np.asarray(dates, dtype="datetime64[D]"), bucket)
+    keys, inverse = np.unique(starts, return_inverse=True)
+    size = len(keys)
+
+    metrics = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=size)
+        counts = np.bincount(inverse, weights=present, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        delta = np.concatenate(([np.nan], np.diff(means))) if size else means
+        metrics[name] = {
+            "mean": _to_list(means),
+            "rolling_mean": _to_list(_rolling_mean(means, window)),
+            "delta": _to_list(delta),
+        }
+
+    return {
+        "bucket": bucket,
+        "window": window,
+        "dates": [str(d) for d in keys],
+        "count": np.bincount(inverse, minlength=size).tolist(),
+        "metrics": metrics,
+    }
+
+
+def series_generation(user_id) -> int:
+    """データを読む前に呼び、store_series に渡す"""
+    with _lock:
+        return _generations.get(str(user_id), _evicted_generation)
+
+
+def get_cached_series(user_id, key: tuple):
+    with _lock:
+        entry = _cache.get(str(user_id))
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > SERIES_CACHE_TTL_SECONDS:
+            del _cache[str(user_id)]
+            return None
+        _cache.move_to_end(str(user_id))
+        result = entry[1].get(key)
+    return copy.deepcopy(result) if result is not None else None
+
+
+def store_series(user_id, key: tuple, result: dict, generation: int):
+    """読み込み開始後にデータが更新されていなければ結果をキャッシュする"""
+    user_id = str(user_id)
+    with _lock:
+        if _generations.get(user_id, _evicted_generation) != generation:
+            return
+        entry = _cache.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > SERIES_CACHE_TTL_SECONDS:
+            entry = (time.monotonic(), {})
+            _cache[user_id] = entry
+        entry[1][key] = copy.deepcopy(result)
+        _cache.move_to_end(user_id)
+        while len(_cache) > SERIES_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate_user_series(*user_ids):
+    """
+    健診データを登録・更新・削除したユーザーのキャッシュを捨てる
+    世代は全ユーザーで通し番号にし、上限で捨てた世代より前に読み始めた結果も保存されないようにする
+    """
+    global _last_generation, _evicted_generation
+    with _lock:
+        for user_id in map(str, user_ids):
+            _cache.pop(user_id, None)
+            _last_generation += 1
+            _generations[user_id] = _last_generation
+            _generations.move_to_end(user_id)
+        while len(_generations) > SERIES_CACHE_SIZE:
+            _, generation = _generations.popitem(last=False)
+            _evicted_generation = max(_evicted_generation, generation)
@@ -0,0 +1,143 @@
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from utils.metrics import Counter, Gauge, Histogram
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP リクエスト数", ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP リクエストの処理時間（秒）", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "処理中の HTTP リクエスト数", ("method",))
+HTTP_DB_QUERIES = Histogram(
+    "http_request_db_queries", "1リクエストあたりの SQL 実行回数", ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+HTTP_DB_SECONDS = Histogram("http_request_db_seconds", "1リクエストあたりの SQL 実行時間の合計（秒）", ("route",))
+
+DB_QUERIES = Counter("db_queries_total", "SQL の実行回数")
+DB_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL 1回あたりの実行時間（秒）",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+OPENAI_REQUESTS = Counter("openai_requests_total", "OpenAI API の呼び出し数", ("model", "status"))
+OPENAI_DURATION = Histogram(
+    "openai_request_duration_seconds", "OpenAI API の応答時間（秒、ストリーミングは最後のチャンクまで）", ("model",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+OPENAI_TOKENS = Counter("openai_tokens_total", "OpenAI API の消費トークン数", ("model", "type"))
+
+# 処理中のリクエストの [SQL 実行回数, SQL 実行時間の合計]（リクエスト外では None）
+_request_db = ContextVar("request_db", default=None)
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのレイテンシ・ステータス・処理中の件数と、リクエスト中の SQL の回数・時間を記録する
+    ルートのラベルはパスではなくテンプレート（/users/{user_id}）にして系列数を抑える
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        db_stats = [0, 0.0]
+        token = _request_db.set(db_stats)
+        HTTP_IN_FLIGHT.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec((method,))
+            _request_db.reset(token)
+
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUESTS.inc((method, path, str(status)))
+            HTTP_DURATION.observe(elapsed, (method, path))
+            HTTP_DB_QUERIES.observe(db_stats[0], (path,))
+            HTTP_DB_SECONDS.observe(db_stats[1], (path,))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    DB_QUERIES.inc()
+    DB_DURATION.observe(elapsed)
+    db_stats = _request_db.get()
+    if db_stats is not None:
+        db_stats[0] += 1
+        db_stats[1] += elapsed
+
+
+def instrument_engine(engine):
+    """
+    同期エンジン（非同期エンジンは .sync_engine）に SQL の計測フックを登録する
+    非同期セッションの処理も greenlet 経由で呼び出し元のコンテキストを引き継ぐため、リクエスト単位で集計できる
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _record_usage(model: str, usage):
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc((model, "prompt"), usage.prompt_tokens or 0)
+    OPENAI_TOKENS.inc((model, "completion"), usage.completion_tokens or 0)
+
+
+async def chat_completion(client, **kwargs):
+    """
+    client.chat.completions.create を呼び、応答時間・トークン数・失敗を記録する
+    stream=True のときはチャンクを流しながら、最後まで読み終えた時点で記録する
+    """
+    model = kwargs.get("model", "unknown")
+    if kwargs.get("stream"):
+        # 最後のチャンクでトークン数を受け取る
+        kwargs.setdefault("stream_options", {"include_usage": True})
+
+    start = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(**kwargs)
+    except Exception:
+        OPENAI_DURATION.observe(time.perf_counter() - start, (model,))
+        OPENAI_REQUESTS.inc((model, "error"))
+        raise
+
+    if kwargs.get("stream"):
+        return _observe_stream(response, model, start)
+
+    OPENAI_DURATION.observe(time.perf_counter() - start, (model,))
+    OPENAI_REQUESTS.inc((model, "ok"))
+    _record_usage(model, response.usage)
+    return response
+
+
+async def _observe_stream(stream, model: str, start: float):
+    status = "error"
+    try:
+        async for chunk in stream:
+            _record_usage(model, getattr(chunk, "usage", None))
+            yield chunk
+        status = "ok"
+    finally:
+        OPENAI_DURATION.observe(time.perf_counter() - start, (model,))
+        OPENAI_REQUESTS.inc((model, status))
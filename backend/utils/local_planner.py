@@ -0,0 +1,146 @@
+import os
+import time
+import zlib
+from collections import defaultdict
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from utils.plan_projection import normalize_nutrition_type
+from utils.rule_engine import get_rule_set
+
+WEEK_DAYS = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+# 食事ごとの調理時間の上限（分）。上限内のレシピが足りないときだけ超えるものを使う
+COOKING_TIME_LIMITS = {"breakfast": 15, "lunch": 30, "dinner": 60}
+# isQuick とみなす調理時間（分）
+QUICK_MINUTES = 15
+# 1食ごとに比べる候補の数（グループ順に並べた上位だけを見る）
+CANDIDATE_WINDOW = 50
+
+# レシピ一覧（タグ付き）をこの秒数だけ使い回す
+CATALOG_TTL_SECONDS = float(os.getenv("LOCAL_PLANNER_CATALOG_TTL", "300"))
+
+_catalog = None  # (期限, RecipeCatalog)
+
+
+class RecipeCatalog:
+    """
+    レシピ一覧（[(id, name, cooking_time, タグの frozenset)]）を、食事の種類ごとに
+    「調理時間が上限内か × タグの組み合わせ」のグループに分けて持つ（読み込み時に1回だけ分ける）
+    プランを作るときはグループ単位で並べるため、レシピ数によらず一定の時間で候補を選べる
+    """
+
+    def __init__(self, recipes: list):
+        self.size = len(recipes)
+        self.groups = {}
+        # グループ内は ID 順（DB から読んだ順によらず同じプランにする）
+        recipes = sorted(recipes, key=lambda recipe: recipe[0])
+        for meal_type, limit in COOKING_TIME_LIMITS.items():
+            groups = defaultdict(list)
+            for recipe in recipes:
+                fits = recipe[2] is not None and recipe[2] <= limit
+                groups[(fits, recipe[3])].append(recipe)
+            self.groups[meal_type] = groups
+
+    def rank(self, meal_type: str, needs: frozenset, seed: int, size: int) -> list:
+        """
+        調理時間が上限内か → 必要な栄養タイプをいくつ満たすか の順に並べた上位 size 件
+        同じグループの中はシードの位置から取る（同じ入力なら同じプラン、ユーザー・週ごとには違うプラン）
+        """
+        groups = sorted(
+            self.groups[meal_type].items(),
+            key=lambda item: (not item[0][0], -len(item[0][1] & needs), sorted(item[0][1])),
+        )
+        ranking = []
+        for _, recipes in groups:
+            offset = seed % len(recipes)
+            count = min(len(recipes), size - len(ranking))
+            ranking.extend(recipes[(offset + i) % len(recipes)] for i in range(count))
+            if len(ranking) >= size:
+                break
+        return ranking
+
+
+def _pick(ranking: list, used: set, today: set, uncovered: frozenset, limit: int):
+    """
+    今週まだ使っていない上位 CANDIDATE_WINDOW 件から、その日にまだ満たしていない栄養タイプを
+    最も多く含むレシピを選ぶ（レシピが足りなければ、その日に使っていないものを使い回す）
+    """
+    for excluded in (used, today, set()):
+        candidates = [recipe for recipe in ranking if recipe[0] not in excluded][:CANDIDATE_WINDOW]
+        if candidates:
+            break
+    else:
+        return None
+
+    # max は同点なら先頭（ランキング上位）を返す
+    return max(
+        candidates,
+        key=lambda recipe: (recipe[2] is not None and recipe[2] <= limit, len(recipe[3] & uncovered)),
+    )
+
+
+def _meal(recipe) -> dict:
+    _, name, cooking_time, tags = recipe
+    return {
+        "title": name,
+        # タグはルール名（low_salt）のため、GPT のプランと同じ日本語の表記にする
+        "nutritionType": sorted(normalize_nutrition_type(tag) for tag in tags),
+        "cookingTime": cooking_time,
+        "isQuick": cooking_time is not None and cooking_time <= QUICK_MINUTES,
+    }
+
+
+def plan_week(catalog: RecipeCatalog, nutrition_types: list[str], seed: int = 0) -> dict:
+    """
+    レシピ一覧から GPT の出力と同じ形式の plan_json（week_plan: 7日 × 朝・昼・夕）を組み立てる
+    同じレシピは1週間で1回まで（レシピが足りない場合を除く）
+    """
+    needs = frozenset(nutrition_types)
+    size = len(MEAL_TYPES) * len(WEEK_DAYS) + CANDIDATE_WINDOW
+    rankings = {meal_type: catalog.rank(meal_type, needs, seed, size) for meal_type in MEAL_TYPES}
+
+    used = set()
+    week_plan = []
+    for day in WEEK_DAYS:
+        today, covered = set(), set()
+        day_plan = {"day": day}
+        for meal_type in MEAL_TYPES:
+            recipe = _pick(rankings[meal_type], used, today, needs - covered, COOKING_TIME_LIMITS[meal_type])
+            if recipe is None:
+                continue
+            used.add(recipe[0])
+            today.add(recipe[0])
+            covered |= recipe[3]
+            day_plan[meal_type] = _meal(recipe)
+        week_plan.append(day_plan)
+    return {"week_plan": week_plan, "generator": "local"}
+
+
+async def get_catalog(db: AsyncSession) -> RecipeCatalog:
+    global _catalog
+    if _catalog is not None and _catalog[0] > time.monotonic():
+        return _catalog[1]
+    rows = await crud.get_recipe_catalog(db)
+    catalog = RecipeCatalog([(recipe_id, name, cooking_time, frozenset(tags)) for recipe_id, name, cooking_time, tags in rows])
+    _catalog = (time.monotonic() + CATALOG_TTL_SECONDS, catalog)
+    return catalog
+
+
+async def build_week_plan(db: AsyncSession, record, start_date: date) -> dict:
+    """
+    健診データの栄養タイプ（analyze_health_data と同じルール）に合わせて、レシピ一覧からプランを作る
+    GPT を呼ばないため、GPT が遅い・使えないときの代わりや、すぐにプランが必要なときに使う
+    """
+    catalog = await get_catalog(db)
+    if not catalog.size:
+        raise HTTPException(status_code=503, detail="ローカル生成に使えるレシピが登録されていません")
+
+    rule_set = get_rule_set()
+    nutrition_types = rule_set.decode(rule_set.evaluate_record(record))
+    seed = zlib.crc32(f"{record.user_id}:{start_date}".encode())
+    return plan_week(catalog, nutrition_types, seed)
@@ -0,0 +1,112 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from models import MealPlan, Recipe
+from logging_config import logger
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+# 1プランあたりの最大日数と、1回の一括生成で受け付ける最大プラン数
+MAX_PLAN_DAYS = 31
+MAX_BATCH_PLANS = 1000
+
+# レシピIDの配列の鮮度（件数・最終登録日時）を確認する間隔（秒）
+ID_CHECK_INTERVAL_SECONDS = 30
+
+
+class RecipeIdPool:
+    """
+    レシピIDの配列をメモリに持ち、ランダムな割り当てに使う。
+    レシピの件数・最終登録日時が変わったときだけ読み直す（確認は ID_CHECK_INTERVAL_SECONDS ごと）
+    """
+
+    def __init__(self):
+        self._ids = []
+        self._signature = None
+        self._checked_at = 0.0
+
+    async def _ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < ID_CHECK_INTERVAL_SECONDS:
+            return
+        result = await db.execute(select(func.count(Recipe.id), func.max(Recipe.created_at)))
+        signature = tuple(result.one())
+        self._checked_at = now
+        if signature == self._signature:
+            return
+
+        self._ids = list((await db.execute(select(Recipe.id))).scalars())
+        self._signature = signature
+        logger.info(f"食事割り当て用のレシピID配列を読み込み: 件数={len(self._ids)}")
+
+    async def sample(self, db: AsyncSession, k: int) -> list:
+        """重複を許して k 件のレシピIDを選ぶ（レシピがなければ空のリスト）"""
+        await self._ensure_fresh(db)
+        if not self._ids:
+            return []
+        return random.choices(self._ids, k=k)
+
+
+_pool = RecipeIdPool()
+
+
+async def materialize_meal_plans(db: AsyncSession, requests: list) -> list[MealPlan]:
+    """
+    MealPlanGenerate のリストから MealPlan と日数 × 朝昼夕の Meal を組み立て、
+    1トランザクション・テーブルごとに1回の一括 INSERT で登録する
+    """
+    if not requests:
+        return []
+    if len(requests) > MAX_BATCH_PLANS:
+        raise HTTPException(status_code=400, detail=f"一度に生成できるプランは {MAX_BATCH_PLANS} 件までです")
+
+    total_days = 0
+    for request in requests:
+        days = (request.end_date - request.start_date).days + 1
+        if days < 1:
+            raise HTTPException(status_code=400, detail="end_date は start_date 以降を指定してください")
+        if days > MAX_PLAN_DAYS:
+            raise HTTPException(status_code=400, detail=f"プランの期間は {MAX_PLAN_DAYS} 日までです")
+        total_days += days
+
+    known_users = await crud.get_existing_user_ids(db, {request.user_id for request in requests})
+    if len(known_users) < len({request.user_id for request in requests}):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    sampled = await _pool.sample(db, total_days * len(MEAL_TYPES))
+    if not sampled:
+        raise HTTPException(status_code=404, detail="No recipes found")
+    recipe_ids = iter(sampled)
+
+    now = datetime.utcnow()
+    plans, meals = [], []
+    for request in requests:
+        plans.append({
+            "id": uuid.uuid4(),
+            "user_id": request.user_id,
+            "start_date": request.start_date,
+            "end_date": request.end_date,
+            "created_at": now,
+        })
+        for i in range((request.end_date - request.start_date).days + 1):
+            day = request.start_date + timedelta(days=i)
+            for meal_type in MEAL_TYPES:
+                meals.append({
+                    "id": uuid.uuid4(),
+                    "user_id": request.user_id,
+                    "date": day,
+                    "meal_type": meal_type,
+                    "recipe_id": next(recipe_ids),
+                    "created_at": now,
+                })
+
+    await crud.create_meal_plans_with_meals(db, plans, meals)
+    logger.info(f"食事プランを一括生成: プラン={len(plans)} 食事={len(meals)}")
+    return [MealPlan(**plan) for plan in plans]
@@ -0,0 +1,153 @@
+import json
+import os
+import uuid
+from collections import Counter
+from datetime import date
+from uuid import UUID
+
+import asyncio
+import openai
+from fastapi import HTTPException
+
+import crud
+from database import AsyncSessionLocal
+from logging_config import logger
+from utils.meal_plan_generator import PLANNER_GPT, generate_week_plan, request_week_plan
+from utils.rate_limit import TokenBucket, retry_with_backoff
+
+# 同時に処理するユーザー数
+BATCH_CONCURRENCY = int(os.getenv("MEAL_PLAN_BATCH_CONCURRENCY", "8"))
+
+# OpenAI のレート制限（アカウントの上限より少し低めに設定する）
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "40000"))
+# 1回の生成で使うトークン数の見積もり（プロンプト + 1週間分の出力）
+ESTIMATED_TOKENS_PER_PLAN = 3000
+
+# GPT 呼び出しの試行回数（一時的なエラー・不正な JSON は待ってから再試行する）
+MAX_REQUEST_ATTEMPTS = 5
+# 実行中にプロセスが落ちたジョブを再開する回数の上限（毎回落ちるジョブで止まり続けないように）
+MAX_JOB_ATTEMPTS = 3
+
+# プランが終わるこの日数前に次のプランを作っておく
+LEAD_DAYS = int(os.getenv("MEAL_PLAN_LEAD_DAYS", "2"))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # タイムアウトを含む
+    openai.InternalServerError,
+    json.JSONDecodeError,
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """request_week_plan は HTTPException に包んで投げるため、元の例外（__cause__）で判定する"""
+    cause = error.__cause__ if isinstance(error, HTTPException) else error
+    return isinstance(cause, RETRYABLE_ERRORS)
+
+
+class MealPlanBatch:
+    """
+    一括生成の実行。concurrency 件ずつ並行に処理し、GPT の呼び出しはリクエスト数・トークン数の
+    トークンバケットを通す。ジョブの状態は1件ごとに meal_plan_jobs にコミットする（中断しても続きから再開できる）
+    """
+
+    def __init__(
+        self,
+        concurrency: int = BATCH_CONCURRENCY,
+        requests_per_minute: int = OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = OPENAI_TOKENS_PER_MINUTE,
+    ):
+        self.concurrency = concurrency
+        self.requests = TokenBucket.per_minute(requests_per_minute)
+        self.tokens = TokenBucket.per_minute(tokens_per_minute)
+        self.counts = Counter()
+
+    async def request(self, record) -> dict:
+        """レート制限・再試行付きの GPT 問い合わせ（get_week_plan に渡す。キャッシュヒット時は呼ばれない）"""
+        async def attempt():
+            await self.requests.acquire()
+            await self.tokens.acquire(ESTIMATED_TOKENS_PER_PLAN)
+            self.counts["gpt_requests"] += 1
+            return await request_week_plan(record)
+
+        return await retry_with_backoff(attempt, is_retryable, MAX_REQUEST_ATTEMPTS)
+
+    async def run_job(self, job_id: UUID):
+        async with AsyncSessionLocal() as db:
+            job = await crud.get_meal_plan_job(db, job_id)
+            if job is None or job.status not in ("pending", "running"):
+                return
+            if job.attempts >= MAX_JOB_ATTEMPTS:
+                job.status = "failed"
+                job.error = f"{MAX_JOB_ATTEMPTS} 回実行しても完了しませんでした"
+                await db.commit()
+                self.counts["failed"] += 1
+                return
+
+            job.status = "running"
+            job.attempts += 1
+            job.error = None
+            await db.commit()
+
+            try:
+                record = await crud.get_latest_health_record(db, job.user_id)
+                if record is None:
+                    raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+                # GPT の応答を待つ間、このセッションのトランザクション（接続）を開いたままにしない
+                await db.commit()
+                # 一括生成は GPT のプランを作るためのもの。失敗してもローカル生成には切り替えず、失敗として残す
+                meal_plan, _ = await generate_week_plan(
+                    job.user_id, record, job.start_date, request=self.request, planner=PLANNER_GPT
+                )
+            except Exception as e:
+                await db.rollback()
+                job.status = "failed"
+                job.error = str(e.detail if isinstance(e, HTTPException) else e)
+                await db.commit()
+                self.counts["failed"] += 1
+                logger.warning(f"一括生成ジョブ失敗: job_id={job_id} user_id={job.user_id} error={job.error}")
+                return
+
+            job.status = "succeeded"
+            job.meal_plan_id = meal_plan.id
+            await db.commit()
+            self.counts["succeeded"] += 1
+
+    async def run_jobs(self, job_ids: list[UUID]):
+        queue = iter(job_ids)
+
+        async def worker():
+            for job_id in queue:
+                await self.run_job(job_id)
+                done = self.counts["succeeded"] + self.counts["failed"]
+                if done and done % 100 == 0:
+                    logger.info(f"一括生成の進捗: {done}/{len(job_ids)} {dict(self.counts)}")
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+
+async def run_batch(batch: MealPlanBatch, today: date = None, lead_days: int = LEAD_DAYS, limit: int = None) -> dict:
+    """
+    中断した一括生成があれば続きから実行し、そのあと新しく対象のユーザーを選んで生成する
+    対象はジョブとして先に登録してから GPT を呼ぶため、途中で落ちても再実行すれば未完了の分だけ処理する
+    """
+    today = today or date.today()
+
+    async with AsyncSessionLocal() as db:
+        unfinished = [job.id for job in await crud.get_unfinished_batch_meal_plan_jobs(db)]
+    if unfinished:
+        logger.info(f"中断した一括生成を再開: {len(unfinished)} 件")
+        await batch.run_jobs(unfinished)
+
+    async with AsyncSessionLocal() as db:
+        targets = await crud.get_pregeneration_targets(db, today, lead_days)
+        if limit is not None:
+            targets = targets[:limit]
+        batch_id = uuid.uuid4()
+        job_ids = await crud.create_batch_meal_plan_jobs(db, batch_id, targets)
+    logger.info(f"一括生成を開始: batch_id={batch_id} 対象={len(job_ids)} 人")
+    await batch.run_jobs(job_ids)
+
+    logger.info(f"一括生成が完了: batch_id={batch_id} {dict(batch.counts)}")
+    return dict(batch.counts)
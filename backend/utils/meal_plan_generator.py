@@ -0,0 +1,338 @@
+import asyncio
+import json
+import os
+from datetime import date, timedelta
+from uuid import UUID
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, schemas
+from database import AsyncSessionLocal
+from logging_config import logger
+from utils import local_planner, plan_cache
+from utils.instrumentation import chat_completion
+from utils.plan_projection import normalize_plan
+from utils.single_flight import SingleFlight, advisory_lock, try_advisory_lock
+from utils.week_plan_stream import WeekPlanStreamParser
+
+load_dotenv()
+
+# OpenAI 1.x 対応のクライアント（import が重いため、初回の呼び出し時に作る）
+client = None
+
+# プロンプトの内容を変えたら上げる（キャッシュキーに含まれる）
+PROMPT_VERSION = "1"
+
+# GPT の応答を待つ上限（秒）。超えたら失敗として扱う（既定ではローカル生成に切り替わる）
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# 生成方法（auto: GPT で生成し、失敗したらローカル生成に切り替える / gpt: GPT のみ / local: レシピ一覧から組み立てる。utils/local_planner.py）
+PLANNER_AUTO = "auto"
+PLANNER_GPT = "gpt"
+PLANNER_LOCAL = "local"
+# auto で GPT での生成に失敗したら（タイムアウト・レート制限・障害・不正な出力）ローカル生成で代わりに作る
+LOCAL_PLANNER_FALLBACK = os.getenv("MEAL_PLAN_LOCAL_FALLBACK", "1") == "1"
+
+# (user_id, 開始日, 生成方法) ごとの生成の重複排除（ダブルクリック・クライアントの再送で GPT を2回呼ばない）
+_generations = SingleFlight()
+
+# 別のワーカー（プロセス）が同じ週を生成中のとき、終わったかを確かめる間隔（秒）
+GENERATION_POLL_SECONDS = float(os.getenv("MEAL_PLAN_GENERATION_POLL_SECONDS", "0.5"))
+
+SYSTEM_PROMPT = "あなたは管理栄養士です。出力はJSONオブジェクトのみで返してください。コメント、補足、空行は禁止です。"
+
+
+def get_openai_client():
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT_SECONDS)
+    return client
+
+
+async def close_openai_client():
+    """終了時にクライアントのコネクションプールを閉じる"""
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+
+# ▼ 曜日順整形のためのユーティリティ関数
+def sort_week_plan(plan_json: dict) -> dict:
+    """GPTが返す曜日順を正しい順（月→日）に整える"""
+    week_order = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+
+    if "week_plan" not in plan_json or not isinstance(plan_json["week_plan"], list):
+        return plan_json
+
+    sorted_plan = sorted(
+        plan_json["week_plan"],
+        key=lambda day: week_order.index(day.get("day", "月曜日")) if day.get("day") in week_order else 999
+    )
+
+    plan_json["week_plan"] = sorted_plan
+    return plan_json
+
+
+def build_meal_plan_prompt(record) -> str:
+    """健診データ（HealthRecord）から GPT へのプロンプトを組み立てる"""
+    return f"""
+あなたは日本語で返答する管理栄養士です。以下の健康診断データに基づき、1週間分の食事メニュー（朝・昼・夕）を構造化JSON形式で提案してください。
+栄養分類名も日本語で記載してください。
+
+必ずJSON形式のみで返してください。説明・補足・コメント・空行は禁止です。
+出力は必ず次のような形式でお願いします：
+
+出力形式の例：
+{{
+  "week_plan": [
+    {{
+      "day": "月曜日",
+      "breakfast": {{
+            "title": "全粒粉トーストとヨーグルト",
+            "nutritionType": [
+                "high-fiber",
+                "high-protein"
+            ],
+            "cookingTime": 5,
+            "isQuick": true
+        }},
+        "lunch": {{
+            "title": "時短！高タンパク豆腐丼",
+            "nutritionType": [
+                "high-protein",
+                "low-fat"
+            ],
+            "cookingTime": 10,
+            "isQuick": true
+        }},
+        "dinner": {{
+            "title": "減塩でも美味しい和風煮物",
+            "nutritionType": [
+                "low-salt",
+                "high-fiber"
+            ],
+            "cookingTime": 40,
+            "isQuick": false
+        }}
+    }}
+  ]
+}}
+
+健康診断データ:
+年齢: {record.age}歳
+性別: {record.gender}
+身長: {record.height}cm
+体重: {record.weight}kg
+BMI: {record.bmi}
+血圧: {record.blood_pressure_systolic}/{record.blood_pressure_diastolic}
+血糖値: {record.blood_sugar}
+HbA1c: {record.hba1c}
+コレステロール（LDL）: {record.cholesterol_ldl}
+HDL: {record.cholesterol_hdl}
+中性脂肪: {record.triglycerides}
+肝機能: GOT {record.liver_got}, GPT {record.liver_gpt}, γ-GTP: {record.liver_r_gpt}
+"""
+
+
+def build_messages(record) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_meal_plan_prompt(record)}
+    ]
+
+
+async def request_week_plan(record) -> dict:
+    """
+    GPT に1週間分のメニューを問い合わせ、曜日順に整えた plan_json を返す
+    """
+    try:
+        response = await chat_completion(
+            get_openai_client(),
+            model="gpt-4",
+            messages=build_messages(record),
+            temperature=0.7
+        )
+        content = response.choices[0].message.content
+        logger.debug(f"GPTの出力:\n{content}")
+
+        try:
+            plan_json = json.loads(content)
+            return sort_week_plan(plan_json)  # 曜日順整形をここで実行
+
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析エラー: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"GPTの出力が不正なJSONです: {str(e)}\n\n出力内容:\n{content}"
+            ) from e
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        # 元の例外は __cause__ に残す（一括生成で再試行するかの判定に使う）
+        raise HTTPException(status_code=500, detail=f"GPT全体の処理中にエラーが発生しました: {str(e)}") from e
+
+
+async def stream_week_plan_days(record):
+    """
+    GPT をストリーミングモードで呼び出し、week_plan の1日分が閉じるたびにその dict を yield する
+    """
+    parser = WeekPlanStreamParser()
+    try:
+        stream = await chat_completion(
+            get_openai_client(),
+            model="gpt-4",
+            messages=build_messages(record),
+            temperature=0.7,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for day in parser.feed(delta):
+                yield day
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON解析エラー: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"GPTの出力が不正なJSONです: {str(e)}\n\n出力内容:\n{parser.text}"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"GPT全体の処理中にエラーが発生しました: {str(e)}")
+
+    logger.debug(f"GPTの出力:\n{parser.text}")
+    if not parser.done:
+        raise HTTPException(
+            status_code=500,
+            detail=f"GPTの出力に week_plan が含まれていません\n\n出力内容:\n{parser.text}"
+        )
+
+
+async def get_week_plan(db: AsyncSession, record, request=request_week_plan) -> dict:
+    """
+    量子化した健診プロファイルでキャッシュを引き、なければ GPT で生成してキャッシュする
+    request は GPT への問い合わせ（一括生成ではレート制限・再試行を付けたものを渡す）
+    """
+    key = plan_cache.profile_cache_key(record, PROMPT_VERSION)
+    plan_json = await plan_cache.get_cached_plan(db, key)
+    if plan_json is not None:
+        logger.info(f"プランキャッシュヒット: key={key}")
+        return sort_week_plan(plan_json)
+
+    # GPT の応答を待つ間、キャッシュを引いたトランザクション（プールの接続）を持ったままにしない
+    await db.commit()
+    plan_json = await request(record)
+    await plan_cache.store_plan(db, key, PROMPT_VERSION, plan_json)
+    return plan_json
+
+
+async def plan_week(db: AsyncSession, record, start_date: date, planner: str = PLANNER_GPT, request=request_week_plan) -> tuple:
+    """
+    planner に応じて plan_json を作り、(plan_json, ローカル生成に切り替えた理由。切り替えていなければ None) を返す
+    auto で GPT が失敗したときは LOCAL_PLANNER_FALLBACK ならローカル生成に切り替える（gpt は切り替えずに失敗させる）
+    """
+    if planner == PLANNER_LOCAL:
+        return await local_planner.build_week_plan(db, record, start_date), None
+
+    try:
+        return await get_week_plan(db, record, request=request), None
+    except HTTPException as e:
+        if planner != PLANNER_AUTO or not LOCAL_PLANNER_FALLBACK:
+            raise
+        # detail には GPT の出力全体が続くことがあるため、1行目だけを残す
+        reason = str(e.detail).splitlines()[0][:200] if e.detail else "GPT での生成に失敗しました"
+        logger.warning(f"GPT での生成に失敗したためローカル生成に切り替え: user_id={record.user_id} detail={reason}")
+        return await local_planner.build_week_plan(db, record, start_date), reason
+
+
+async def generate_meal_plan_for_user(db: AsyncSession, user_id: UUID, planner: str = PLANNER_GPT):
+    """
+    最新の健診データから1週間の食事プランを生成し、MealPlan として保存する
+    (MealPlan, ローカル生成に切り替えた理由) を返す
+    """
+    record = await crud.get_latest_health_record(db, user_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="健康診断データが見つかりません")
+
+    # 生成は別のセッションで行う。GPT の応答を待つ間、呼び出し側のトランザクション（接続）を開いたままにしない
+    await db.commit()
+    return await generate_week_plan(user_id, record, planner=planner)
+
+
+async def generate_week_plan(
+    user_id: UUID, record, start_date: date = None, request=request_week_plan, planner: str = PLANNER_GPT
+):
+    """
+    start_date（省略時は健診日）の週のプランを生成して保存し、(MealPlan, ローカル生成に切り替えた理由) を返す
+    同じ (user_id, 週, 生成方法) の生成が実行中なら、新たに生成せずにその結果を待って返す
+    （同じプロセス内は SingleFlight、ワーカー間は PostgreSQL のアドバイザリロックで待つ）
+    （生成方法が違う呼び出しは相乗りしない。local が実行中の GPT の生成を待つことはない）
+    """
+    start_date = start_date or record.date
+    return await _generations.run(
+        (user_id, start_date, planner), lambda: _generate_week_plan(user_id, record, start_date, request, planner)
+    )
+
+
+async def _generate_week_plan(user_id: UUID, record, start_date: date, request, planner: str):
+    # 待っている呼び出しが途中で切れても続けられるよう、セッションは呼び出し側と別に持つ
+    async with AsyncSessionLocal() as db:
+        before = await crud.get_week_meal_plan_id(db, user_id, start_date)
+        # ロックを待つ間、トランザクションを開いたままにしない
+        await db.commit()
+
+        # 別のワーカーで同じ (user_id, 週, 生成方法) を生成中なら GPT を呼ばずに終わるのを待ち、保存されたプランを返す
+        # （ロックは生成と保存の間だけ持つ。待つ側は接続を持たずに GENERATION_POLL_SECONDS ごとに確かめる）
+        waited = False
+        while True:
+            async with try_advisory_lock(f"meal_plan_generation:{user_id}:{start_date}:{planner}") as acquired:
+                if acquired:
+                    if waited:
+                        latest = await crud.get_week_meal_plan_id(db, user_id, start_date)
+                        if latest is not None and latest != before:
+                            logger.info(f"他のワーカーが生成したプランを返す: user_id={user_id} meal_plan_id={latest}")
+                            meal_plan = await crud.get_meal_plan(db, latest)
+                            await db.commit()
+                            return meal_plan, _shared_fallback_reason(meal_plan, planner)
+                        # 先に生成していたワーカーが失敗した（プランを保存しなかった）ときは、ここで生成する
+
+                    plan_json, fallback_reason = await plan_week(db, record, start_date, planner, request)
+                    return await save_week_plan(db, user_id, record, plan_json, start_date), fallback_reason
+
+            waited = True
+            await asyncio.sleep(GENERATION_POLL_SECONDS)
+
+
+def _shared_fallback_reason(meal_plan, planner: str):
+    """他のワーカーが auto で生成したプランがローカル生成に切り替わっていたときの理由（詳細は生成したワーカーのログにある）"""
+    if planner == PLANNER_AUTO and (meal_plan.plan_json or {}).get("generator") == "local":
+        return "別のワーカーでの GPT による生成に失敗したため、ローカル生成に切り替えました"
+    return None
+
+
+async def save_week_plan(db: AsyncSession, user_id: UUID, record, plan_json: dict, start_date: date = None):
+    """
+    start_date（省略時は健診日）から1週間分の MealPlan として plan_json を保存する
+    """
+    start_date = start_date or record.date
+    end_date = start_date + timedelta(days=6)
+
+    meal_plan_create = schemas.MealPlanCreate(
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        plan_json=normalize_plan(plan_json)
+    )
+    # 生成方法が違う生成が同じ週を同時に保存しても1件だけ残るよう、削除と作成をロックの中で行う
+    async with advisory_lock(f"meal_plan:{user_id}:{start_date}"):
+        # 同一週のMealPlanがあれば削除（重複防止）
+        await crud.delete_meal_plan_in_same_week(db, user_id, start_date, end_date)
+        return await crud.create_meal_plan(db, meal_plan_create)
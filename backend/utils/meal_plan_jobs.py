@@ -0,0 +1,119 @@
+import asyncio
+import os
+import socket
+import uuid
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from database import AsyncSessionLocal
+from logging_config import logger
+from utils.meal_plan_generator import PLANNER_AUTO, PLANNER_LOCAL, generate_meal_plan_for_user
+
+# 同時に走る生成処理（GPT 呼び出し）の上限
+MAX_WORKERS = int(os.getenv("MEAL_PLAN_WORKERS", "4"))
+
+# ジョブを受け持つ期間（秒）。実行中のワーカーはこの間に終わる前提で、過ぎたジョブは他のワーカーが再開する
+# GPT の呼び出し（タイムアウト × 再試行）より十分長くする
+JOB_LEASE_SECONDS = int(os.getenv("MEAL_PLAN_JOB_LEASE_SECONDS", "600"))
+
+# このプロセスの ID（meal_plan_jobs.worker_id に記録する）
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_semaphore = None
+# 実行中のタスク（ガベージコレクションで途中破棄されないよう参照を持っておく）
+_tasks = set()
+
+
+def _submit(job_id: UUID, planner: str):
+    """ジョブをイベントループ上のタスクとして起動する（同時実行数は MAX_WORKERS まで）"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_WORKERS)
+    task = asyncio.create_task(run_meal_plan_job(job_id, planner))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def enqueue_meal_plan_job(db: AsyncSession, user_id: UUID, planner: str = PLANNER_AUTO):
+    """
+    生成ジョブをテーブルに登録し、バックグラウンドで実行する（即座に返る）
+    planner が local のときはミリ秒で終わるため、その場で実行して完了したジョブを返す
+    """
+    job = await crud.create_meal_plan_job(db, user_id, planner, WORKER_ID)
+    logger.info(f"食事プラン生成ジョブ登録: job_id={job.id} user_id={user_id} planner={planner}")
+    if planner == PLANNER_LOCAL:
+        await _run_job(job.id, planner)
+        await db.refresh(job)
+        return job
+
+    _submit(job.id, planner)
+    return job
+
+
+async def run_meal_plan_job(job_id: UUID, planner: str = PLANNER_AUTO):
+    """
+    ジョブを1件実行する（同時実行数は MAX_WORKERS まで）
+    """
+    async with _semaphore:
+        await _run_job(job_id, planner)
+
+
+async def _run_job(job_id: UUID, planner: str):
+    # セッションはジョブごとに作成
+    async with AsyncSessionLocal() as db:
+        # 完了済み・他のワーカーが再開したジョブは実行しない
+        if not await crud.start_meal_plan_job(db, job_id, WORKER_ID, JOB_LEASE_SECONDS):
+            return
+        job = await crud.get_meal_plan_job(db, job_id)
+
+        try:
+            meal_plan, fallback_reason = await generate_meal_plan_for_user(db, job.user_id, planner)
+        except HTTPException as e:
+            await db.rollback()
+            job.status = "failed"
+            job.error = str(e.detail)
+            await db.commit()
+            logger.warning(f"食事プラン生成ジョブ失敗: job_id={job_id} detail={e.detail}")
+            return
+        except Exception as e:
+            await db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            await db.commit()
+            logger.error(f"食事プラン生成ジョブで予期しないエラー: job_id={job_id} error={e}")
+            return
+
+        job.status = "succeeded"
+        job.meal_plan_id = meal_plan.id
+        job.fallback_reason = fallback_reason
+        await db.commit()
+        logger.info(f"食事プラン生成ジョブ完了: job_id={job_id} meal_plan_id={meal_plan.id} fallback={fallback_reason is not None}")
+
+
+async def resume_pending_jobs():
+    """
+    未完了（pending / running）で、どのワーカーも受け持っていない・リースが切れたジョブを引き取って再投入する
+    起動中の他のワーカーが実行しているジョブには触れない
+    """
+    async with AsyncSessionLocal() as db:
+        jobs = await crud.claim_unfinished_meal_plan_jobs(db, WORKER_ID, JOB_LEASE_SECONDS)
+        for job in jobs:
+            _submit(job.id, job.planner)
+        if jobs:
+            logger.info(f"未完了の食事プラン生成ジョブを再投入: 件数={len(jobs)}")
+
+
+async def resume_jobs_periodically():
+    """
+    JOB_LEASE_SECONDS / 2 秒ごとに resume_pending_jobs を実行する（起動時の1回目は lifespan で行う）
+    落ちたワーカーのジョブを、リースが切れたあとに他のワーカーが引き取る
+    """
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 2)
+        try:
+            await resume_pending_jobs()
+        except Exception as e:
+            logger.error(f"食事プラン生成ジョブの再投入に失敗: {e}")
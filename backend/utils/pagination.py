@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+
+from database import AsyncSessionLocal
+
+# 1ページあたりの件数の既定値と上限（検索）
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# 一覧取得の既定値と上限
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+
+# ストリーミング時にサーバーサイドカーソルから一度に取り出す行数
+STREAM_BATCH_SIZE = 500
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    """キーセットページングの位置（最後の行のソートキー）を不透明な文字列にする"""
+    raw = json.dumps(values, separators=(",", ":"), default=str, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """encode_cursor で作った文字列を元の値のリストに戻す（不正な値は 400）"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+    return values
+
+
+def _parse_key(column, value):
+    """cursor に文字列で入っている値を列の型に戻す"""
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return python_type(value)
+
+
+def parse_keyset_cursor(keys: tuple, cursor: str = None):
+    """cursor を keys の各列の型の値のリストに戻す（cursor がなければ None、不正なら 400）"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+    try:
+        return [_parse_key(column, value) for column, value in zip(keys, values)]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+
+
+def apply_keyset(query, keys: tuple, after: list = None, descending: bool = True):
+    """
+    keys（例: (HealthRecord.date, HealthRecord.id)）の順に並べ、after の位置より後ろの行だけに絞る
+    行値の比較 (a, b) < (x, y) にすることで、同じ並びの複合インデックスをそのまま使える
+    """
+    if after is not None:
+        position = tuple_(*keys)
+        query = query.where(position < tuple_(*after) if descending else position > tuple_(*after))
+
+    return query.order_by(*[key.desc() if descending else key for key in keys])
+
+
+async def paginate(db, query, keys: tuple, limit: int, cursor: str = None, descending: bool = True):
+    """
+    キーセットページングで1ページ分を取得する。(行のリスト, 次ページの cursor) を返す
+    query は select() の文
+    """
+    after = parse_keyset_cursor(keys, cursor)
+    result = await db.execute(apply_keyset(query, keys, after, descending).limit(limit + 1))
+    rows = result.scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, key.key) for key in keys])
+
+
+def stream_ndjson(query, keys: tuple, schema, cursor: str = None, descending: bool = True):
+    """
+    一覧を NDJSON（1行1オブジェクト）でストリーミングする。
+    サーバーサイドカーソル（yield_per）で少しずつ読むため、件数に関わらずメモリ使用量は一定
+    レスポンス送信中も使うため、リクエストの依存性とは別に専用のセッションを開く
+    """
+    # cursor の検証はストリーミング開始前に行い、不正なら 400 を返す
+    after = parse_keyset_cursor(keys, cursor)
+    statement = apply_keyset(query, keys, after, descending).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(statement)
+            async for row in result:
+                yield schema.model_validate(row).model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
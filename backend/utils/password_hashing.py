@@ -0,0 +1,60 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+# bcrypt のコスト（2^rounds 回）。変更は以降に登録するパスワードのハッシュから適用する
+BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+# ハッシュ計算専用のスレッド数（bcrypt は計算中に GIL を解放するため、スレッドで並列に動く）
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# 実行中 + 待ちの上限。超えたら 503 を返す（登録集中時に待ち行列を伸ばし続けない）
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+# bcrypt が扱える長さ（これより後ろは従来どおり切り捨てる）
+MAX_PASSWORD_BYTES = 72
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+        return _executor
+
+
+async def _run(func, *args):
+    """ハッシュ用のスレッドで func を実行する（待ちが上限を超えていれば 503）"""
+    global _pending
+    with _lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            raise HTTPException(
+                status_code=503, detail="混み合っています。しばらくしてから再度お試しください", headers={"Retry-After": "1"}
+            )
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
@@ -0,0 +1,176 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import MealPlanCache
+from logging_config import logger
+
+# インメモリ（LRU）層の最大件数
+MEMORY_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+# キャッシュの有効期間（秒）。既定は7日
+CACHE_TTL_SECONDS = int(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+# DB 層に保持する最大件数（超えた分は古い順に削除）
+DB_CACHE_MAX_ROWS = int(os.getenv("PLAN_CACHE_MAX_ROWS", "10000"))
+# 保存のうち、この割合で期限切れ・上限超過の行を削除する（保存のたびに表を走査しない）
+DB_CACHE_EVICT_PROBABILITY = float(os.getenv("PLAN_CACHE_EVICT_PROBABILITY", "0.01"))
+
+_memory_cache: "OrderedDict[str, tuple[datetime, dict]]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+
+
+def _band(value, edges: list, labels: list):
+    """value を edges で区切った帯のラベルに変換する（None は "unknown"）"""
+    if value is None:
+        return "unknown"
+    for edge, label in zip(edges, labels):
+        if value < edge:
+            return label
+    return labels[-1]
+
+
+def quantize_profile(record) -> dict:
+    """
+    健診データを GPT の提案内容が変わらない程度の粒度の帯に丸める
+    """
+    systolic = record.blood_pressure_systolic
+    diastolic = record.blood_pressure_diastolic
+    if systolic is None and diastolic is None:
+        bp_band = "unknown"
+    elif (systolic or 0) >= 140 or (diastolic or 0) >= 90:
+        bp_band = "high"
+    elif (systolic or 0) >= 130 or (diastolic or 0) >= 85:
+        bp_band = "elevated"
+    else:
+        bp_band = "normal"
+
+    return {
+        "age": _band(record.age, [30, 40, 50, 60, 70], ["<30", "30s", "40s", "50s", "60s", "70+"]),
+        "gender": (record.gender or "unknown").strip().lower(),
+        "bmi": _band(record.bmi, [18.5, 25, 30], ["under", "normal", "over", "obese"]),
+        "bp": bp_band,
+        "hba1c": _band(record.hba1c, [5.6, 6.5], ["normal", "borderline", "high"]),
+        "ldl": _band(record.cholesterol_ldl, [120, 140, 160], ["normal", "borderline", "high", "very_high"]),
+        "tg": _band(record.triglycerides, [150, 300], ["normal", "high", "very_high"]),
+        "gpt": _band(record.liver_gpt, [31, 56], ["normal", "borderline", "high"]),
+    }
+
+
+def profile_cache_key(record, prompt_version: str) -> str:
+    """量子化したプロファイルとプロンプトのバージョンから正規化したハッシュキーを作る"""
+    canonical = json.dumps(
+        {"profile": quantize_profile(record), "prompt_version": prompt_version},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, expires_at: datetime, plan_json: dict):
+    with _lock:
+        _memory_cache[key] = (expires_at, plan_json)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+async def get_cached_plan(db: AsyncSession, key: str):
+    """
+    キャッシュ済みのプランを返す（メモリ → DB の順に参照、なければ None）
+    """
+    now = datetime.utcnow()
+
+    with _lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _memory_cache.move_to_end(key)
+                _stats["memory_hits"] += 1
+                return copy.deepcopy(entry[1])
+            del _memory_cache[key]
+
+    result = await db.execute(
+        select(MealPlanCache).where(MealPlanCache.key == key, MealPlanCache.expires_at > now)
+    )
+    row = result.scalars().first()
+    if row is None:
+        _count("misses")
+        return None
+
+    _remember(key, row.expires_at, row.plan_json)
+    _count("db_hits")
+    return copy.deepcopy(row.plan_json)
+
+
+async def store_plan(db: AsyncSession, key: str, prompt_version: str, plan_json: dict):
+    """
+    生成したプランを両方の層に保存する（DB_CACHE_EVICT_PROBABILITY の割合で期限切れ・上限超過の行も削除する）
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=CACHE_TTL_SECONDS)
+    plan_json = copy.deepcopy(plan_json)
+
+    # 同じプロファイルのミスが同時に起きても一意制約違反にならないよう、1文の UPSERT で保存する
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(MealPlanCache).values(
+        key=key,
+        prompt_version=prompt_version,
+        plan_json=plan_json,
+        created_at=now,
+        expires_at=expires_at,
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=["key"],
+        set_={
+            "prompt_version": statement.excluded.prompt_version,
+            "plan_json": statement.excluded.plan_json,
+            "created_at": statement.excluded.created_at,
+            "expires_at": statement.excluded.expires_at,
+        },
+    ))
+    if random.random() < DB_CACHE_EVICT_PROBABILITY:
+        await evict_db_cache(db, now)
+    await db.commit()
+
+    _remember(key, expires_at, plan_json)
+    _count("stores")
+    logger.debug(f"プランキャッシュ保存: key={key}")
+
+
+async def evict_db_cache(db: AsyncSession, now: datetime):
+    """
+    期限切れの行と、有効期限の新しい順に DB_CACHE_MAX_ROWS 件を超えた行を削除する（件数は数えず、expires_at の索引を OFFSET で進める）
+    コミットは呼び出し側で行う
+    """
+    await db.execute(
+        delete(MealPlanCache).where(MealPlanCache.expires_at <= now).execution_options(synchronize_session=False)
+    )
+    overflow = select(MealPlanCache.key).order_by(MealPlanCache.expires_at.desc()).offset(DB_CACHE_MAX_ROWS)
+    await db.execute(
+        delete(MealPlanCache).where(MealPlanCache.key.in_(overflow)).execution_options(synchronize_session=False)
+    )
+
+
+def get_cache_stats() -> dict:
+    """ヒット／ミス数とインメモリ層の件数を返す"""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory_cache)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,123 @@
+import os
+import re
+import time
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import MealPlanItem
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+# メニュー名のランキングは全プランの集計になるため、結果をこの秒数だけ使い回す
+TITLE_RANKING_TTL_SECONDS = float(os.getenv("MEAL_PLAN_TITLE_RANKING_TTL", "300"))
+
+_title_rankings = {}  # (meal_type, limit) → (期限, ランキング)
+
+# 栄養タイプの表記（nutritionType）は日本語にそろえる。GPT は日本語のほか、プロンプトの例にならって
+# "low-salt" 形式で返すことがあり、ローカル生成はルール名（low_salt。rules/health_rules.json）で返すため
+NUTRITION_TYPE_LABELS = {
+    "low_salt": "低塩分",
+    "low_sugar": "低糖質",
+    "low_fat": "低脂肪",
+    "liver_support": "肝機能サポート",
+    "high_fiber": "高繊維",
+    "high_protein": "高タンパク質",
+}
+
+
+def _cooking_time(value) -> Optional[int]:
+    """調理時間（分）。GPT が "15分" のような文字列で返すこともあるため数字を取り出す"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        match = re.search(r"\d+", value)
+        return int(match.group()) if match else None
+    return None
+
+
+def normalize_nutrition_type(value: str) -> str:
+    """low_salt・low-salt・Low Salt などを日本語の表記（低塩分）にする。対応表にないものはそのまま"""
+    value = value.strip()
+    return NUTRITION_TYPE_LABELS.get(re.sub(r"[-\s]+", "_", value.lower()), value)
+
+
+def _nutrition_types(value) -> list[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    # 表記をそろえると重複することがあるため、順序を保って重複を除く
+    return list(dict.fromkeys(normalize_nutrition_type(v) for v in value if isinstance(v, str) and v.strip()))
+
+
+def normalize_plan(plan_json) -> dict:
+    """保存する plan_json の各食事の nutritionType を、展開行（meal_plan_items）と同じ表記にそろえる"""
+    week_plan = plan_json.get("week_plan") if isinstance(plan_json, dict) else None
+    if not isinstance(week_plan, list):
+        return plan_json
+    for day in week_plan:
+        if not isinstance(day, dict):
+            continue
+        for meal_type in MEAL_TYPES:
+            meal = day.get(meal_type)
+            if isinstance(meal, dict) and "nutritionType" in meal:
+                meal["nutritionType"] = _nutrition_types(meal["nutritionType"])
+    return plan_json
+
+
+def project_plan(meal_plan_id, user_id, plan_json) -> list[dict]:
+    """
+    plan_json の week_plan を meal_plan_items の行（dict）のリストにする
+    GPT の出力のため、形式が違う日・食事は読み飛ばし、型が違う値は None にする
+    """
+    week_plan = plan_json.get("week_plan") if isinstance(plan_json, dict) else None
+    if not isinstance(week_plan, list):
+        return []
+
+    rows = []
+    for day_index, day in enumerate(week_plan):
+        if not isinstance(day, dict):
+            continue
+        for meal_type in MEAL_TYPES:
+            meal = day.get(meal_type)
+            if not isinstance(meal, dict):
+                continue
+            title, is_quick = meal.get("title"), meal.get("isQuick")
+            rows.append({
+                "meal_plan_id": meal_plan_id,
+                "day_index": day_index,
+                "meal_type": meal_type,
+                "user_id": user_id,
+                "day": day.get("day") if isinstance(day.get("day"), str) else None,
+                "title": (title.strip() or None) if isinstance(title, str) else None,
+                "nutrition_types": _nutrition_types(meal.get("nutritionType")),
+                "cooking_time": _cooking_time(meal.get("cookingTime")),
+                "is_quick": is_quick if isinstance(is_quick, bool) else None,
+            })
+    return rows
+
+
+async def insert_plan_items(db: AsyncSession, meal_plan) -> int:
+    """
+    保存する MealPlan の展開行を登録する（プランと同じトランザクションで、コミットは呼び出し側）
+    プランを削除すると外部キーの ON DELETE CASCADE で展開行も消える
+    """
+    rows = project_plan(meal_plan.id, meal_plan.user_id, meal_plan.plan_json)
+    if rows:
+        await db.execute(insert(MealPlanItem), rows)
+    return len(rows)
+
+
+def get_cached_title_ranking(key: tuple) -> Optional[list]:
+    cached = _title_rankings.get(key)
+    if cached is None or cached[0] <= time.monotonic():
+        return None
+    return cached[1]
+
+
+def store_title_ranking(key: tuple, ranking: list):
+    _title_rankings[key] = (time.monotonic() + TITLE_RANKING_TTL_SECONDS, ranking)
@@ -0,0 +1,60 @@
+import asyncio
+import random
+import time
+
+from logging_config import logger
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレート制限（rate 個/秒で補充、最大 capacity 個まで溜まる）
+    acquire(n) は n 個取れるまで待つ。同時に待っている呼び出しは順番に取る
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, limit: float) -> "TokenBucket":
+        """1分あたり limit 個（バーストも最大 limit 個）"""
+        return cls(limit / 60, limit)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, n: float = 1):
+        # capacity を超える要求は、満杯まで溜まったところで通す（永久に待たないように）
+        n = min(n, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < n:
+                await asyncio.sleep((n - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= n
+
+
+def backoff_seconds(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """attempt 回目（0 始まり）の再試行までの待ち時間（指数バックオフ + full jitter）"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry_with_backoff(func, retryable, max_attempts: int = 5, base: float = 1.0, cap: float = 60.0):
+    """
+    func() を実行し、retryable(例外) が True の失敗は待ってから再試行する（最大 max_attempts 回）
+    複数の呼び出しが同時に失敗しても、待ち時間がばらけて一斉に再試行しないようにする
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt + 1 >= max_attempts or not retryable(e):
+                raise
+            delay = backoff_seconds(attempt, base, cap)
+            logger.warning(f"再試行 {attempt + 1}/{max_attempts - 1}（{delay:.1f} 秒後）: {e}")
+            await asyncio.sleep(delay)
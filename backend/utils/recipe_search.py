@@ -0,0 +1,172 @@
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Float, and_, cast, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Recipe
+from logging_config import logger
+from utils.pagination import decode_cursor, encode_cursor
+
+# インメモリ索引の鮮度（件数・最終登録日時）を確認する間隔（秒）
+INDEX_CHECK_INTERVAL_SECONDS = 30
+
+# 説明文だけに一致した場合のスコアの重み
+DESCRIPTION_WEIGHT = 0.5
+
+
+def normalize(text: str) -> str:
+    """全角・半角や大文字・小文字の違いを吸収する"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def ngrams(text: str) -> set[str]:
+    """文字 bigram の集合（1文字の場合はその文字）。日本語は分かち書きせずに扱える"""
+    text = "".join(normalize(text).split())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _parse_cursor(cursor):
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    try:
+        return float(values[0]), UUID(values[1])
+    except (IndexError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+
+
+async def search_recipes(db: AsyncSession, query: str, limit: int, cursor: str = None):
+    """
+    レシピを類似度順に検索する。(レシピのリスト, 次ページの cursor) を返す（最後のページなら cursor は None）
+    PostgreSQL では pg_trgm の GIN インデックスを使い、それ以外では文字 bigram の転置索引を使う
+    """
+    after = _parse_cursor(cursor)
+    if not query.strip():
+        return await _list_all(db, limit, after)
+    if db.bind.dialect.name == "postgresql":
+        return await _search_postgres(db, query, limit, after)
+    return await _index.search(db, query, limit, after)
+
+
+def _page(rows: list, limit: int):
+    """limit + 1 件取得した結果から、ページと次の cursor を作る"""
+    if len(rows) <= limit:
+        return [recipe for recipe, _ in rows], None
+    rows = rows[:limit]
+    last_recipe, last_score = rows[-1]
+    return [recipe for recipe, _ in rows], encode_cursor([last_score, str(last_recipe.id)])
+
+
+async def _list_all(db: AsyncSession, limit: int, after):
+    # 検索語が空の場合はスコア 0 として id 順に返す
+    query = select(Recipe)
+    if after is not None:
+        query = query.where(Recipe.id > after[1])
+    recipes = (await db.execute(query.order_by(Recipe.id).limit(limit + 1))).scalars().all()
+    return _page([(recipe, 0.0) for recipe in recipes], limit)
+
+
+async def _search_postgres(db: AsyncSession, query: str, limit: int, after):
+    q = normalize(query).strip()
+    pattern = f"%{q}%"
+    description = func.coalesce(Recipe.description, "")
+    # pg_trgm の類似度は大文字・小文字を区別しない
+    score = cast(
+        func.greatest(
+            func.similarity(Recipe.name, q),
+            func.similarity(description, q) * DESCRIPTION_WEIGHT,
+        ),
+        Float,
+    )
+
+    # ILIKE / % 演算子はどちらも gin_trgm_ops のインデックスで絞り込める
+    sql = (
+        select(Recipe, score.label("score"))
+        .where(or_(
+            Recipe.name.ilike(pattern),
+            Recipe.description.ilike(pattern),
+            Recipe.name.op("%")(q),
+        ))
+    )
+    if after is not None:
+        last_score, last_id = after
+        sql = sql.where(or_(score < last_score, and_(score == last_score, Recipe.id > last_id)))
+
+    rows = (await db.execute(sql.order_by(score.desc(), Recipe.id).limit(limit + 1))).all()
+    return _page([(recipe, float(s)) for recipe, s in rows], limit)
+
+
+class RecipeBigramIndex:
+    """
+    PostgreSQL 以外のバックエンド向けの、文字 bigram によるインメモリ転置索引
+    レシピの件数・最終登録日時が変わっていたら作り直す（確認は INDEX_CHECK_INTERVAL_SECONDS ごと）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)  # bigram → レシピID の集合
+        self._grams = {}                   # レシピID → (名前の bigram, 説明文の bigram)
+        self._signature = None
+        self._checked_at = 0.0
+
+    async def _ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < INDEX_CHECK_INTERVAL_SECONDS:
+            return
+        signature = tuple((await db.execute(select(func.count(Recipe.id), func.max(Recipe.created_at)))).one())
+        self._checked_at = now
+        if signature == self._signature:
+            return
+
+        postings = defaultdict(set)
+        grams = {}
+        result = await db.stream(select(Recipe.id, Recipe.name, Recipe.description).execution_options(yield_per=1000))
+        async for recipe_id, name, description in result:
+            name_grams, description_grams = ngrams(name), ngrams(description)
+            grams[recipe_id] = (name_grams, description_grams)
+            for gram in name_grams | description_grams:
+                postings[gram].add(recipe_id)
+
+        with self._lock:
+            self._postings, self._grams, self._signature = postings, grams, signature
+        logger.info(f"レシピ検索用の bigram 索引を構築: 件数={len(grams)}")
+
+    async def search(self, db: AsyncSession, query: str, limit: int, after):
+        await self._ensure_fresh(db)
+        query_grams = ngrams(query)
+
+        with self._lock:
+            candidates = set()
+            for gram in query_grams:
+                candidates |= self._postings.get(gram, set())
+
+            # Dice 係数（2|A∩B| / (|A|+|B|)）で順位付けする
+            scored = []
+            for recipe_id in candidates:
+                name_grams, description_grams = self._grams[recipe_id]
+                name_score = 2 * len(query_grams & name_grams) / (len(query_grams) + len(name_grams))
+                description_score = (
+                    2 * len(query_grams & description_grams) / (len(query_grams) + len(description_grams))
+                    if description_grams else 0.0
+                )
+                scored.append((max(name_score, description_score * DESCRIPTION_WEIGHT), recipe_id))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        if after is not None:
+            last_score, last_id = after
+            scored = [(s, i) for s, i in scored if s < last_score or (s == last_score and i > last_id)]
+        scored = scored[:limit + 1]
+
+        result = await db.execute(select(Recipe).where(Recipe.id.in_([i for _, i in scored])))
+        recipes = {r.id: r for r in result.scalars()}
+        return _page([(recipes[i], s) for s, i in scored if i in recipes], limit)
+
+
+_index = RecipeBigramIndex()
@@ -0,0 +1,201 @@
+import json
+import operator
+import os
+import threading
+import time
+from operator import attrgetter
+
+import numpy as np
+
+from logging_config import logger
+
+# ルール定義ファイル（既定は backend/rules/health_rules.json）
+RULES_PATH = os.getenv(
+    "HEALTH_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "health_rules.json"),
+)
+# ファイルの更新を確認する間隔（秒）。0 なら毎回確認
+RELOAD_INTERVAL_SECONDS = float(os.getenv("HEALTH_RULES_RELOAD_INTERVAL", "5"))
+# health_records.nutrition_flags（Integer、符号付き32bit）に収まる栄養タイプの数
+MAX_NUTRITION_TYPES = 31
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+
+
+class CompiledRuleSet:
+    """
+    ルール定義を1度だけ解釈し、フラットな評価プログラム（タプルの列）に変換したもの。
+    評価時は値のタプルを先頭から順に見るだけで、辞書の参照は行わない。
+    """
+
+    def __init__(self, definition: dict):
+        self.version = str(definition["version"])
+        self.nutrition_types = list(definition["nutrition_types"])
+        if len(self.nutrition_types) > MAX_NUTRITION_TYPES:
+            raise ValueError(f"栄養タイプは {MAX_NUTRITION_TYPES} 種類までです: {len(self.nutrition_types)}")
+        bits = {name: i for i, name in enumerate(self.nutrition_types)}
+
+        rules = definition["rules"]
+        # 条件に使う列（age / gender）も含めて、評価に必要な列を固定順で持つ
+        fields = []
+        for rule in rules:
+            if rule["field"] not in fields:
+                fields.append(rule["field"])
+        for name in ("age", "gender"):
+            if name not in fields:
+                fields.append(name)
+        self.fields = tuple(fields)
+        self._getter = attrgetter(*self.fields)
+        self._age_index = self.fields.index("age")
+        self._gender_index = self.fields.index("gender")
+        # 栄養タイプが8種類までなら uint8 に収める
+        self.dtype = np.uint8 if len(self.nutrition_types) <= 8 else np.uint32
+
+        program = []
+        for rule in rules:
+            if rule["op"] not in OPERATORS:
+                raise ValueError(f"未対応の演算子です: rule={rule.get('id')} op={rule['op']}")
+            if rule["nutrition_type"] not in bits:
+                raise ValueError(f"未定義の栄養タイプです: rule={rule.get('id')} type={rule['nutrition_type']}")
+            genders = rule.get("gender")
+            if isinstance(genders, str):
+                genders = [genders]
+            program.append((
+                self.fields.index(rule["field"]),
+                OPERATORS[rule["op"]],
+                float(rule["value"]),
+                1 << bits[rule["nutrition_type"]],
+                frozenset(g.strip().lower() for g in genders) if genders else None,
+                rule.get("age_min"),
+                rule.get("age_max"),
+            ))
+        self.program = tuple(program)
+        # 性別・年齢の条件がないルールは条件判定を省いた短い形でも持っておく
+        self._plain = tuple(r[:4] for r in program if r[4] is None and r[5] is None and r[6] is None)
+        self._conditional = tuple(r for r in program if not (r[4] is None and r[5] is None and r[6] is None))
+
+    def evaluate(self, values: tuple) -> int:
+        """self.fields の順に並んだ値のタプルを評価し、栄養タイプのビットフラグを返す"""
+        flags = 0
+        for index, op, threshold, bit in self._plain:
+            value = values[index]
+            if value is not None and op(value, threshold):
+                flags |= bit
+
+        if not self._conditional:
+            return flags
+
+        age = values[self._age_index]
+        gender = values[self._gender_index]
+        gender = gender.strip().lower() if isinstance(gender, str) else None
+        for index, op, threshold, bit, genders, age_min, age_max in self._conditional:
+            value = values[index]
+            if value is None:
+                continue
+            if genders is not None and gender not in genders:
+                continue
+            if age_min is not None and (age is None or age < age_min):
+                continue
+            if age_max is not None and (age is None or age >= age_max):
+                continue
+            if op(value, threshold):
+                flags |= bit
+        return flags
+
+    def evaluate_record(self, record) -> int:
+        """HealthRecord（属性アクセスできるオブジェクト）を評価する"""
+        return self.evaluate(self._getter(record))
+
+    def evaluate_dict(self, data: dict) -> int:
+        """dict 形式の健診データを評価する（キーがない・None の項目は判定しない）"""
+        return self.evaluate(tuple(data.get(name) for name in self.fields))
+
+    def evaluate_columns(self, columns: dict) -> np.ndarray:
+        """
+        列ごとの配列をまとめて評価し、ビットフラグの配列を返す。
+        None は NaN として扱うため、欠損値では判定されない。
+        """
+        size = len(next(iter(columns.values()))) if columns else 0
+        flags = np.zeros(size, dtype=self.dtype)
+
+        age = np.asarray(columns["age"], dtype=np.float64) if "age" in columns else np.full(size, np.nan)
+        gender = (
+            np.array([g.strip().lower() if isinstance(g, str) else "" for g in columns["gender"]])
+            if "gender" in columns else np.full(size, "")
+        )
+
+        arrays = {}
+        for index, op, threshold, bit, genders, age_min, age_max in self.program:
+            name = self.fields[index]
+            if name not in arrays:
+                arrays[name] = np.asarray(columns[name], dtype=np.float64)
+            mask = op(arrays[name], threshold)
+            if genders is not None:
+                mask &= np.isin(gender, list(genders))
+            if age_min is not None:
+                mask &= age >= age_min
+            if age_max is not None:
+                mask &= age < age_max
+            flags |= mask.astype(self.dtype) * self.dtype(bit)
+        return flags
+
+    def decode(self, flags: int) -> list[str]:
+        """ビットフラグを栄養タイプ名のリストに戻す"""
+        flags = int(flags)
+        return [name for bit, name in enumerate(self.nutrition_types) if flags >> bit & 1]
+
+
+def load_rule_set(path: str = RULES_PATH) -> CompiledRuleSet:
+    """ルール定義ファイルを読み込んでコンパイルする"""
+    with open(path, encoding="utf-8") as f:
+        return CompiledRuleSet(json.load(f))
+
+
+_current = None
+_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def reload_rule_set() -> CompiledRuleSet:
+    """
+    ルール定義を読み直す。失敗した場合は現在のルールを使い続ける（起動時のみ例外を送出）
+    """
+    global _current, _mtime
+    with _lock:
+        mtime = os.path.getmtime(RULES_PATH)
+        try:
+            rule_set = load_rule_set(RULES_PATH)
+        except Exception as e:
+            if _current is None:
+                raise
+            logger.error(f"健診ルールの再読み込みに失敗しました（version={_current.version} を継続）: {e}")
+            _mtime = mtime
+            return _current
+        _current, _mtime = rule_set, mtime
+        logger.info(f"健診ルールを読み込みました: version={rule_set.version} rules={len(rule_set.program)}")
+        return rule_set
+
+
+def get_rule_set() -> CompiledRuleSet:
+    """
+    現在のルールを返す。一定間隔でファイルの更新時刻を確認し、変わっていれば読み直す（ホットリロード）
+    """
+    global _checked_at
+    if _current is None:
+        return reload_rule_set()
+
+    now = time.monotonic()
+    if now - _checked_at >= RELOAD_INTERVAL_SECONDS:
+        _checked_at = now
+        try:
+            if os.path.getmtime(RULES_PATH) != _mtime:
+                return reload_rule_set()
+        except OSError as e:
+            logger.error(f"健診ルールファイルを確認できません: {e}")
+    return _current
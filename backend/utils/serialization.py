@@ -0,0 +1,23 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+
+import schemas
+
+# 件数・サイズの大きいレスポンスの型は、import 時に1度だけ検証・シリアライザを組み立てておく
+HEALTH_RECORD_LIST = TypeAdapter(list[schemas.HealthRecordResponse])
+RECIPE_LIST = TypeAdapter(list[schemas.RecipeResponse])
+MEAL_PLAN_LIST = TypeAdapter(list[schemas.MealPlanResponse])
+MEAL_PLAN_DETAIL = TypeAdapter(schemas.MealPlanDetailResponse)
+
+
+def serialize(adapter: TypeAdapter, content) -> bytes:
+    """ORM のオブジェクト（または dict）を adapter の型で検証し、pydantic-core で直接 JSON のバイト列にする"""
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def json_response(adapter: TypeAdapter, content, headers: dict = None) -> Response:
+    """
+    response_model の処理（検証 → dict に変換 → JSON 文字列）を1回の変換で済ませたレスポンス
+    ルートから Response を返すと response_model の検証は行われないため、型は adapter で指定する
+    """
+    return Response(serialize(adapter, content), headers=headers, media_type="application/json")
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+
+from database import async_engine
+
+
+class SingleFlight:
+    """
+    同じキーの処理を同時に1つだけ実行し、実行中に来た呼び出しはその結果（例外も）を共有する
+    呼び出し側がキャンセルされても、実行中の処理は止めない（待っている他の呼び出しのため）
+    """
+
+    def __init__(self):
+        self._inflight = {}  # キー → 実行中のタスク
+
+    async def run(self, key, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+
+def advisory_lock_id(key: str) -> int:
+    """PostgreSQL のアドバイザリロック用の 64bit 整数キー"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+@asynccontextmanager
+async def advisory_lock(key: str):
+    """
+    複数ワーカー（プロセス）間の排他。PostgreSQL のセッションレベルのアドバイザリロックを専用の接続で持つ
+    （AsyncSession の接続は commit のたびにプールへ戻るため、ロックとは別にする）
+    PostgreSQL 以外では何もしない（プロセス内の排他は SingleFlight で行う）
+    """
+    if async_engine.dialect.name != "postgresql":
+        yield
+        return
+
+    lock_id = advisory_lock_id(key)
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+        await conn.commit()
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+            await conn.commit()
+
+
+@asynccontextmanager
+async def try_advisory_lock(key: str):
+    """
+    advisory_lock の待たない版。ロックを取れたら True、他のワーカーが持っていれば False を渡す
+    PostgreSQL 以外では常に True（プロセス内の排他は SingleFlight で行う）
+    """
+    if async_engine.dialect.name != "postgresql":
+        yield True
+        return
+
+    lock_id = advisory_lock_id(key)
+    async with async_engine.connect() as conn:
+        acquired = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id})).scalar_one()
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                await conn.commit()
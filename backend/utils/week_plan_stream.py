@@ -0,0 +1,72 @@
+import json
+
+
+class WeekPlanStreamParser:
+    """
+    GPT のストリーミング出力を少しずつ受け取り、"week_plan" 配列の要素（1日分のオブジェクト）が
+    閉じた時点で順に取り出すインクリメンタルパーサー
+    """
+
+    def __init__(self):
+        self.text = ""          # これまでに受け取った全文（最終的な json.loads 用）
+        self._pos = 0           # 次に走査する位置
+        self._in_array = False  # week_plan の "[" を見つけたか
+        self._done = False      # week_plan の "]" まで読み終えたか
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None      # 走査中の日オブジェクトの開始位置
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> list[dict]:
+        """チャンクを追加し、新たに完成した日オブジェクトのリストを返す"""
+        self.text += chunk
+        days = []
+
+        if not self._in_array and not self._locate_array():
+            return days
+
+        text = self.text
+        i = self._pos
+        while i < len(text) and not self._done:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if self._depth == 0 and c == "{":
+                    self._start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0 and c == "]":
+                    self._done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and c == "}" and self._start is not None:
+                        days.append(json.loads(text[self._start:i + 1]))
+                        self._start = None
+            i += 1
+
+        self._pos = i
+        return days
+
+    def _locate_array(self) -> bool:
+        """"week_plan" キーに続く "[" を探し、見つかれば走査位置をその直後に置く"""
+        key = self.text.find('"week_plan"')
+        if key < 0:
+            return False
+        bracket = self.text.find("[", key + len('"week_plan"'))
+        if bracket < 0:
+            return False
+        self._in_array = True
+        self._pos = bracket + 1
+        return True
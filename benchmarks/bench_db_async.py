@@ -0,0 +1,114 @@
+"""
+DB アクセスのスループット比較（同期セッション + スレッドプールの従来経路 と 非同期セッションの経路）
+
+健診データの一覧（GET /health-records/{user_id}?limit=20）を、同時接続数を変えながら
+ASGI 経由で呼び出し、1ワーカーあたりの req/s とレイテンシを比べる。
+
+使い方（.env の DATABASE_URL に健診データが入っている前提）:
+    python benchmarks/bench_db_async.py [リクエスト数] [同時接続数 ...]
+    例: python benchmarks/bench_db_async.py 2000 1 10 50 200
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import POOL_SIZE, MAX_OVERFLOW, SessionLocal, async_engine, engine
+from models import HealthRecord
+from routers import health_records
+from schemas import HealthRecordResponse
+
+
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def build_sync_app() -> FastAPI:
+    """移行前と同じ、def エンドポイント + 同期セッションの経路"""
+    app = FastAPI()
+
+    @app.get("/health-records/{user_id}", response_model=list[HealthRecordResponse])
+    def read_records(user_id: str, limit: int = 20, db: Session = Depends(get_sync_db)):
+        return (
+            db.query(HealthRecord)
+            .filter(HealthRecord.user_id == user_id)
+            .order_by(HealthRecord.date.desc(), HealthRecord.id.desc())
+            .limit(limit + 1)
+            .all()[:limit]
+        )
+
+    return app
+
+
+def build_async_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(health_records.router)
+    return app
+
+
+async def run(app: FastAPI, path: str, requests: int, concurrency: int) -> tuple[float, list[float]]:
+    latencies = []
+    queue = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in queue:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def percentile(values: list[float], p: float) -> float:
+    return statistics.quantiles(values, n=100)[int(p) - 1] if len(values) > 1 else values[0]
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    levels = [int(v) for v in sys.argv[2:]] or [1, 10, 50, 200]
+
+    with engine.connect() as conn:
+        user_id = conn.execute(text("SELECT user_id FROM health_records LIMIT 1")).scalar()
+    if user_id is None:
+        sys.exit("health_records にデータがありません。先にデータを投入してください。")
+    path = f"/health-records/{user_id}?limit=20"
+
+    apps = {"sync (threadpool)": build_sync_app(), "async": build_async_app()}
+    print(f"requests: {requests}  pool: size={POOL_SIZE} overflow={MAX_OVERFLOW}")
+    print(f"{'path':<18} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for concurrency in levels:
+        for name, app in apps.items():
+            # 接続の確立を計測に含めないよう、少しだけ事前に流しておく
+            await run(app, path, min(requests, concurrency * 2), concurrency)
+            elapsed, latencies = await run(app, path, requests, concurrency)
+            print(
+                f"{name:<18} {concurrency:>5} {requests / elapsed:>9.1f} "
+                f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 95) * 1000:>8.2f} "
+                f"{percentile(latencies, 99) * 1000:>8.2f}"
+            )
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
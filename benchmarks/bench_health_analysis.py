@@ -0,0 +1,69 @@
+"""
+栄養タイプ判定のベンチマーク（1件ずつの analyze_health_data と一括の analyze_health_batch の比較）
+
+使い方:
+    python benchmarks/bench_health_analysis.py [件数]
+"""
+import os
+import random
+import sys
+import time
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.health_analysis import analysis_fields, analyze_health_batch, analyze_health_data, decode_nutrition_flags
+
+RANGES = {
+    "blood_pressure_systolic": (100, 160),
+    "blood_pressure_diastolic": (60, 100),
+    "blood_sugar": (70, 160),
+    "hba1c": (4.5, 8.0),
+    "cholesterol_total": (150, 260),
+    "cholesterol_ldl": (70, 180),
+    "triglycerides": (50, 300),
+    "liver_gpt": (10, 90),
+}
+
+
+def make_records(n: int) -> list[dict]:
+    rng = random.Random(0)
+    records = []
+    for _ in range(n):
+        record = {name: rng.uniform(*bounds) for name, bounds in RANGES.items()}
+        record["age"] = rng.randint(20, 80)
+        record["gender"] = rng.choice(["male", "female"])
+        records.append(record)
+    return records
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    records = make_records(n)
+    columns = {name: [r[name] for r in records] for name in analysis_fields()}
+
+    # 結果が一致することを確認してから計測する
+    expected = [analyze_health_data(r) for r in records]
+    actual = [decode_nutrition_flags(f) for f in analyze_health_batch(columns)]
+    assert expected == actual, "一括判定の結果が1件ずつの判定と一致しません"
+
+    loop = best_of(lambda: [analyze_health_data(r) for r in records])
+    batch = best_of(lambda: analyze_health_batch(columns))
+
+    print(f"records: {n}")
+    print(f"per-dict loop : {loop * 1000:8.2f} ms")
+    print(f"batch (numpy) : {batch * 1000:8.2f} ms")
+    print(f"speedup       : {loop / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+ローカルの食事プラン生成（utils/local_planner.py）のベンチマーク
+レシピ一覧の読み込み時の前処理（RecipeCatalog）と、1週間分のプランの組み立て（plan_week）を計測する
+
+使い方:
+    python benchmarks/bench_local_planner.py [レシピ数]
+"""
+import os
+import random
+import sys
+import time
+import uuid
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.local_planner import RecipeCatalog, plan_week
+
+TAGS = ["low_salt", "low_sugar", "low_fat", "liver_support"]
+
+
+def make_recipes(n: int) -> list:
+    rng = random.Random(0)
+    return [
+        (uuid.UUID(int=rng.getrandbits(128)), f"レシピ{i}", rng.randint(5, 60), frozenset(t for t in TAGS if rng.random() < 0.3))
+        for i in range(n)
+    ]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    recipes = make_recipes(n)
+
+    start = time.perf_counter()
+    catalog = RecipeCatalog(recipes)
+    build = time.perf_counter() - start
+
+    rng = random.Random(1)
+    users = [(frozenset(t for t in TAGS if rng.random() < 0.4), rng.getrandbits(32)) for _ in range(1000)]
+    start = time.perf_counter()
+    for needs, seed in users:
+        plan_week(catalog, needs, seed)
+    per_plan = (time.perf_counter() - start) / len(users)
+
+    print(f"recipes: {n}")
+    print(f"catalog build : {build * 1000:8.2f} ms（TTL ごとに1回）")
+    print(f"plan_week     : {per_plan * 1000:8.3f} ms / プラン")
+
+
+if __name__ == "__main__":
+    main()
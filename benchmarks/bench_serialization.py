@@ -0,0 +1,136 @@
+"""
+レスポンスの JSON 化・圧縮にかかる CPU 時間のベンチマーク（1レスポンスあたり）
+
+before: response_model による検証（UUID を str にする field_validator 付き）→ dict に変換 → json.dumps
+after : 事前に組み立てた TypeAdapter で検証し、pydantic-core で直接 JSON のバイト列にする
+圧縮は after の本文に対して gzip（と、入っていれば Brotli）の CPU 時間と圧縮後のサイズを表示する
+
+使い方:
+    python benchmarks/bench_serialization.py [件数]
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from uuid import UUID
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from pydantic import field_validator
+
+import models
+import schemas
+from utils.compression import _compressor, brotli
+from utils.serialization import HEALTH_RECORD_LIST, MEAL_PLAN_LIST, serialize
+
+
+class LegacyHealthRecordResponse(schemas.HealthRecordResponse):
+    """変更前の HealthRecordResponse（行ごとに UUID を str にしてから UUID に戻していた）"""
+
+    @field_validator("id", "user_id", mode="before")
+    def convert_uuid_to_str(cls, value):
+        if isinstance(value, UUID):
+            return str(value)
+        return value
+
+
+def make_health_records(n: int) -> list:
+    rng = random.Random(0)
+    user_id = uuid.uuid4()
+    return [
+        models.HealthRecord(
+            id=uuid.uuid4(), user_id=user_id, date=date(2024, 1, 1) + timedelta(days=i), age=rng.randint(20, 80),
+            gender=rng.choice(["male", "female"]), height=rng.uniform(150, 185), weight=rng.uniform(45, 95),
+            bmi=rng.uniform(17, 32), blood_pressure_systolic=rng.randint(100, 160),
+            blood_pressure_diastolic=rng.randint(60, 100), blood_sugar=rng.uniform(70, 160),
+            hba1c=rng.uniform(4.5, 8.0), cholesterol_total=rng.uniform(150, 260), cholesterol_hdl=rng.uniform(35, 90),
+            cholesterol_ldl=rng.uniform(70, 180), triglycerides=rng.uniform(50, 300), liver_got=rng.uniform(10, 60),
+            liver_gpt=rng.uniform(10, 90), liver_r_gpt=rng.uniform(10, 120), anomalies=None,
+        )
+        for i in range(n)
+    ]
+
+
+def make_meal_plans(n: int) -> list:
+    user_id = uuid.uuid4()
+    days = ["月", "火", "水", "木", "金", "土", "日"]
+    plan_json = {
+        "week_plan": [
+            {
+                "day": day,
+                "meals": {
+                    meal: {"menu": f"{day}曜日の{meal}", "ingredients": ["玄米", "鮭", "ほうれん草", "豆腐"], "kcal": 550}
+                    for meal in ("breakfast", "lunch", "dinner")
+                },
+            }
+            for day in days
+        ]
+    }
+    return [
+        models.MealPlan(
+            id=uuid.uuid4(), user_id=user_id, start_date=date(2024, 1, 1) + timedelta(weeks=i),
+            end_date=date(2024, 1, 7) + timedelta(weeks=i), plan_json=plan_json, created_at=datetime(2024, 1, 1),
+        )
+        for i in range(n)
+    ]
+
+
+def cpu_per_call(func, repeat: int) -> float:
+    """1回あたりの CPU 時間（秒）"""
+    func()
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = max(3, 20000 // n)
+    cases = [
+        ("health-records", LegacyHealthRecordResponse, HEALTH_RECORD_LIST, make_health_records(n)),
+        ("meal_plans", schemas.MealPlanResponse, MEAL_PLAN_LIST, make_meal_plans(n)),
+    ]
+
+    print(f"rows per response: {n}")
+    for name, legacy_schema, adapter, rows in cases:
+        field = APIRoute("/", lambda: None, response_model=list[legacy_schema]).response_field
+        loop = asyncio.new_event_loop()
+
+        def legacy():
+            content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+            return JSONResponse(content).body
+
+        # 結果が一致することを確認してから計測する
+        body = serialize(adapter, rows)
+        assert json.loads(legacy()) == json.loads(body), f"{name}: 変更前後で JSON が一致しません"
+
+        slow = cpu_per_call(legacy, repeat)
+        fast = cpu_per_call(lambda: serialize(adapter, rows), repeat)
+        loop.close()
+
+        print(f"\n[{name}] {len(body) / 1024:.0f} KiB")
+        print(f"  before (response_model + json) : {slow * 1000:8.2f} ms CPU")
+        print(f"  after  (TypeAdapter.dump_json) : {fast * 1000:8.2f} ms CPU  ({slow / fast:.1f}x)")
+
+        encodings = ["gzip"] + (["br"] if brotli is not None else [])
+        for encoding in encodings:
+            def compress():
+                process, finish = _compressor(encoding)
+                return process(body) + finish()
+            size = len(compress())
+            print(
+                f"  {encoding:<4} : {cpu_per_call(compress, repeat) * 1000:8.2f} ms CPU"
+                f"  {size / 1024:.0f} KiB ({size / len(body):.0%})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+ベンチマーク用の OpenAI API のスタブ（POST /v1/chat/completions のみ）
+
+決まった1週間分のプランを、指定した遅延のあとに返す（stream=true なら遅延を分けながら少しずつチャンクで返す）。
+bench_endpoints.py からは ASGI で直接呼び出す。単体で起動して OPENAI_BASE_URL に指定することもできる:
+    python benchmarks/fake_openai.py --port 8100 --latency-ms 800
+    OPENAI_BASE_URL=http://localhost:8100/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DAYS = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+
+WEEK_PLAN = {
+    "week_plan": [
+        {
+            "day": day,
+            "breakfast": {"title": "全粒粉トーストとヨーグルト", "nutritionType": ["high-fiber"], "cookingTime": 5, "isQuick": True},
+            "lunch": {"title": "高タンパク豆腐丼", "nutritionType": ["high-protein"], "cookingTime": 10, "isQuick": True},
+            "dinner": {"title": "減塩の和風煮物", "nutritionType": ["low-salt"], "cookingTime": 40, "isQuick": False},
+        }
+        for day in DAYS
+    ]
+}
+
+# 実際の応答に近い規模のトークン数
+PROMPT_TOKENS = 900
+COMPLETION_TOKENS = 1400
+
+# ストリーミング時のチャンク数
+STREAM_CHUNKS = 28
+
+
+def _chunks(text: str, count: int) -> list[str]:
+    """text を count 個のほぼ同じ長さの断片に分ける（連結すると text に戻る）"""
+    size = -(-len(text) // count)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def build_app(latency_ms: float = 800.0) -> FastAPI:
+    """latency_ms: 応答全体の遅延。ストリーミングではこれを STREAM_CHUNKS 回に分けて送る"""
+    app = FastAPI()
+    content = json.dumps(WEEK_PLAN, ensure_ascii=False)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": PROMPT_TOKENS,
+            "completion_tokens": COMPLETION_TOKENS,
+            "total_tokens": PROMPT_TOKENS + COMPLETION_TOKENS,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        parts = _chunks(content, STREAM_CHUNKS)
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(choices, **extra) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": choices, **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def events():
+            for part in parts:
+                await asyncio.sleep(latency_ms / 1000 / len(parts))
+                yield event([{"index": 0, "delta": {"content": part}, "finish_reason": None}])
+            yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield event([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI API のスタブを起動する")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    args = parser.parse_args()
+    uvicorn.run(build_app(args.latency_ms), host="127.0.0.1", port=args.port)
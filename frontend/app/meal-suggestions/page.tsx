@@ -301,7 +301,21 @@ export default function MealSuggestionsPage() {
         throw new Error("Failed to fetch weekly menu")
       }
   
-      const data = await response.json()
+      // 生成はジョブとして実行されるため、完了するまでステータスをポーリングする
+      let job = await response.json()
+      while (job.status === "pending" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 2000))
+        const jobResponse = await fetch(`http://localhost:8000/meal_plans/jobs/${job.id}`)
+        if (!jobResponse.ok) {
+          throw new Error("Failed to fetch weekly menu job")
+        }
+        job = await jobResponse.json()
+      }
+      if (job.status !== "succeeded") {
+        throw new Error(job.error || "Weekly menu generation failed")
+      }
+
+      const data = job.meal_plan
       console.log("取得した週間メニュー:", data)
   
       const weekPlan = data?.plan_json?.week_plan
@@ -0,0 +1,161 @@
+import sys
+import os
+import asyncio
+import csv
+import io
+import json
+import uuid
+
+import pytest
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+# 一括登録を SQLite（メモリ）で確かめる
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import crud
+from models import HealthCohortHistogram, HealthRecord, User
+from utils import bulk_ingest
+
+# 16進が数字だけの ID は SQLite で数値として保存されるため、先頭を英字にする
+USER_ID = uuid.UUID(int=0xA << 124)
+
+
+def record(**values) -> dict:
+    return {
+        "user_id": str(USER_ID),
+        "date": "2025-04-01",
+        "age": 45,
+        "gender": "female",
+        "height": 160.0,
+        "weight": 55.0,
+        "bmi": 21.5,
+        "blood_pressure_systolic": 118,
+        "blood_pressure_diastolic": 76,
+        "blood_sugar": 92.0,
+        "hba1c": 5.4,
+        "cholesterol_total": 190.0,
+        "cholesterol_hdl": 60.0,
+        "cholesterol_ldl": 105.0,
+        "triglycerides": 90.0,
+        "liver_got": 20.0,
+        "liver_gpt": 18.0,
+        "liver_r_gpt": 22.0,
+        **values,
+    }
+
+
+def to_csv(rows: list) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(record()) + ["anomalies"], lineterminator="\r\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    return ("﻿" + out.getvalue()).encode("utf-8")
+
+
+async def body(data: bytes, size: int = 7):
+    # 行・文字の途中で切れたチャンクで届いても読めることを確かめる
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def run_ingest(format: str, data: bytes, chunk_size: int = bulk_ingest.CHUNK_SIZE):
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                for model in (User, HealthRecord, HealthCohortHistogram):
+                    await conn.run_sync(model.__table__.create)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                db.add(User(id=USER_ID, email="bulk@example.com", name="一括", password_hash="x"))
+                await db.commit()
+                report = await bulk_ingest.ingest(db, format, body(data), chunk_size)
+                count = (await db.execute(select(func.count(HealthRecord.id)))).scalar_one()
+                return report, count
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_csv_reports_row_errors_and_inserts_the_rest():
+    rows = [
+        record(),
+        record(age="四十五"),                              # 2: 数値でない
+        record(user_id=str(uuid.uuid4())),                 # 3: 存在しないユーザー
+        record(anomalies=json.dumps({"ldl": "高め,要再検査"}, ensure_ascii=False)),
+        record(anomalies=json.dumps({"memo": "再検査"}, ensure_ascii=False, indent=1)),  # 引用符の中の改行
+    ]
+    report, count = run_ingest("csv", to_csv(rows))
+
+    assert (report["inserted"], report["failed"], count) == (3, 2, 3)
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert list(report["errors"][0]["errors"][0]["loc"]) == ["age"]
+    assert list(report["errors"][1]["errors"][0]["loc"]) == ["user_id"]
+    assert report["errors_truncated"] is False
+
+
+def test_csv_column_count_and_unterminated_quote():
+    data = to_csv([record()]) + b"1,2,3\r\n" + 'x,"閉じていない\r\n続き'.encode("utf-8")
+    report, count = run_ingest("csv", data)
+
+    assert count == 1
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert "列数" in report["errors"][0]["errors"][0]["msg"]
+    assert report["errors"][1]["errors"][0]["msg"] == "引用符が閉じていません"
+
+
+
+def test_malformed_csv_line_is_a_row_error():
+    data = (
+        to_csv([record()])
+        + b"x,a\rb,c\r\n"                                         # 2: 値の途中の改行文字
+        + b'"' + b"a" * (csv.field_size_limit() + 1) + b'"\r\n'    # 3: 大きすぎる値
+        + to_csv([record(age=50)]).split(b"\r\n", 1)[1]
+    )
+    report, count = run_ingest("csv", data)
+
+    # 読めない行だけをエラーにし、続きの行は登録する
+    assert (report["inserted"], report["failed"], count) == (2, 2, 2)
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert all("CSV として読めません" in error["errors"][0]["msg"] for error in report["errors"])
+
+
+def test_malformed_csv_header_is_rejected():
+    with pytest.raises(csv.Error):
+        run_ingest("csv", b"user_id,da\rte\r\n")
+
+
+def test_ndjson_reports_row_errors():
+    lines = [json.dumps(record()), "[1, 2]", "{", "", json.dumps(record(bmi=None))]
+    report, count = run_ingest("ndjson", "\n".join(lines).encode("utf-8"))
+
+    assert (report["inserted"], report["failed"], count) == (1, 3, 1)
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4]
+
+
+def test_each_chunk_commits_and_a_failed_chunk_is_reported(monkeypatch):
+    calls = []
+    create = crud.bulk_create_health_records
+
+    async def fail_second_chunk(db, records):
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise RuntimeError("value out of range")
+        return await create(db, records)
+
+    monkeypatch.setattr(crud, "bulk_create_health_records", fail_second_chunk)
+    lines = [json.dumps(record(age=40 + i)) for i in range(5)]
+    report, count = run_ingest("ndjson", "\n".join(lines).encode("utf-8"), chunk_size=2)
+
+    # 2行ずつ登録し、失敗したチャンク（3〜4行目）だけが登録されない
+    assert calls == [2, 2, 1]
+    assert (report["inserted"], report["failed"], count) == (3, 2, 3)
+    assert [error["row"] for error in report["errors"]] == [3, 4]
+    assert "3〜4 行目" in report["errors"][0]["errors"][0]["msg"]
@@ -0,0 +1,37 @@
+import sys
+import os
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.cohort_rollup import HistogramDelta, age_band, bin_of
+
+
+def test_bins_clamp_to_both_ends():
+    assert bin_of("hba1c", 5.0) == 20
+    assert bin_of("hba1c", 1.0) == 0
+    assert bin_of("hba1c", 99.0) == 119
+    assert age_band(37) == 30
+    assert age_band(95) == 80
+
+
+def test_update_delta_moves_one_count_between_bins():
+    before = {"age": 42, "gender": "Male", "bmi": 22.0, "hba1c": None}
+    after = {"age": 42, "gender": "male", "bmi": 25.0, "hba1c": None}
+    delta = HistogramDelta()
+    delta.add(before, -1)
+    delta.add(after)
+
+    rows = sorted(delta.rows(), key=lambda row: row["count"])
+    assert rows == [
+        {"age_band": 40, "gender": "male", "metric": "bmi", "bin": 120, "count": -1},
+        {"age_band": 40, "gender": "male", "metric": "bmi", "bin": 150, "count": 1},
+    ]
+
+
+def test_unchanged_values_cancel_out():
+    record = {"age": 30, "gender": "female", "bmi": 20.0, "hba1c": 5.4}
+    delta = HistogramDelta()
+    delta.add(record, -1)
+    delta.add(record)
+    assert delta.rows() == []
@@ -0,0 +1,72 @@
+import sys
+import os
+import uuid
+from datetime import datetime
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.compression import CompressionMiddleware
+from utils.conditional import conditional_json_response, etag_matches
+from utils.serialization import RECIPE_LIST
+
+RECIPES = [{"id": uuid.uuid4(), "name": f"レシピ{i}", "created_at": datetime(2024, 1, 1)} for i in range(50)]
+
+
+def _client(state):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/recipes")
+    async def recipes(request: Request):
+        async def load():
+            state["loads"] += 1
+            return RECIPES[: state["count"]], {"X-Next-Cursor": "next"}
+
+        return await conditional_json_response(request, ("recipes",), state["count"], load, RECIPE_LIST)
+
+    return TestClient(app)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches('"abc-gzip"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_not_modified_skips_loading_until_version_changes():
+    state = {"count": 10, "loads": 0}
+    client = _client(state)
+
+    first = client.get("/recipes", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and len(first.json()) == 10
+
+    second = client.get("/recipes", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert second.status_code == 304 and second.content == b""
+    assert second.headers["etag"] == etag and second.headers["x-next-cursor"] == "next"
+    assert state["loads"] == 1
+
+    state["count"] = 11
+    third = client.get("/recipes", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert third.status_code == 200 and third.headers["etag"] != etag
+    assert state["loads"] == 2
+
+
+def test_compressed_representation_has_its_own_etag():
+    state = {"count": 50, "loads": 0}
+    client = _client(state)
+
+    plain = client.get("/recipes", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    compressed = client.get("/recipes", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == plain[:-1] + '-gzip"'
+
+    revalidated = client.get("/recipes", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == compressed.headers["etag"]
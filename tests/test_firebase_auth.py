@@ -0,0 +1,94 @@
+import sys
+import os
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils import firebase_auth
+
+PROJECT_ID = "healthybloom-test"
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture(autouse=True)
+def local_keys(monkeypatch):
+    # 公開鍵を取得済みの状態にする（ネットワークには接続しない）
+    keys = firebase_auth.PublicKeyStore()
+    keys.keys = {"test-kid": PRIVATE_KEY.public_key()}
+    keys._fetched_at = time.monotonic()
+    keys.expires_at = keys._fetched_at + 3600
+    monkeypatch.setattr(firebase_auth, "_keys", keys)
+    monkeypatch.setattr(firebase_auth, "_cache", firebase_auth.TokenCache(size=2))
+    monkeypatch.setattr(firebase_auth, "_project_id", PROJECT_ID)
+
+
+def make_token(sub: str = "user-1", audience: str = PROJECT_ID, ttl: int = 3600) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": audience, "sub": sub,
+        "iat": now, "exp": now + ttl, "auth_time": now, "email": f"{sub}@example.com",
+    }
+    return jwt.encode(claims, PRIVATE_KEY, algorithm="RS256", headers={"kid": "test-kid"})
+
+
+def test_signature_is_verified_once_per_token(monkeypatch):
+    calls = []
+    decode = firebase_auth._decode
+    monkeypatch.setattr(firebase_auth, "_decode", lambda *args: calls.append(1) or decode(*args))
+
+    token = make_token()
+    first = asyncio.run(firebase_auth.verify_firebase_token(token))
+    second = asyncio.run(firebase_auth.verify_firebase_token(token))
+
+    assert first == second
+    assert first["uid"] == "user-1"
+    assert len(calls) == 1
+
+
+def test_cached_claims_expire_and_lru_is_bounded():
+    cache = firebase_auth.TokenCache(size=2)
+    cache.put("a", {"exp": time.time() + 60})
+    cache.put("b", {"exp": time.time() - 1})
+    cache.put("c", {"exp": time.time() + 60})
+
+    assert cache.get("a") is None  # 件数の上限で追い出される
+    assert cache.get("b") is None  # exp を過ぎている
+    assert cache.get("c") is not None
+
+
+def test_wrong_audience_is_rejected_and_not_cached():
+    token = make_token(audience="other-project")
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(firebase_auth.verify_firebase_token(token))
+    assert e.value.status_code == 401
+    assert firebase_auth._cache.get(token) is None
+
+
+def test_malformed_token_is_401():
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(firebase_auth.verify_firebase_token("not-a-jwt"))
+    assert e.value.status_code == 401
+
+
+def test_key_fetch_failure_is_503_not_401(monkeypatch):
+    # 公開鍵を持っていない状態で、取得がネットワーク障害で失敗する
+    keys = firebase_auth.PublicKeyStore()
+
+    async def unreachable():
+        raise httpx.ConnectError("network is unreachable")
+
+    monkeypatch.setattr(keys, "refresh", unreachable)
+    monkeypatch.setattr(firebase_auth, "_keys", keys)
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(firebase_auth.verify_firebase_token(make_token()))
+    assert e.value.status_code == 503
+    assert "Retry-After" in e.value.headers
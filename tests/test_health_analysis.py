@@ -0,0 +1,27 @@
+import sys
+import os
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.health_analysis import analysis_fields, analyze_health_batch, analyze_health_data, decode_nutrition_flags
+
+RECORDS = [
+    {"age": 35, "gender": "male", "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_sugar": 90.0, "hba1c": 5.5,
+     "cholesterol_total": 180.0, "cholesterol_ldl": 110.0, "triglycerides": 100.0, "liver_gpt": 28.0},
+    {"age": 52, "gender": "female", "blood_pressure_systolic": 135, "blood_pressure_diastolic": 80, "blood_sugar": 90.0, "hba1c": 6.8,
+     "cholesterol_total": 230.0, "cholesterol_ldl": 110.0, "triglycerides": 180.0, "liver_gpt": 60.0},
+]
+
+
+def test_batch_matches_per_record_analysis():
+    columns = {name: [r[name] for r in RECORDS] for name in analysis_fields()}
+    flags = analyze_health_batch(columns)
+    for record, flag in zip(RECORDS, flags):
+        assert decode_nutrition_flags(flag) == analyze_health_data(record)
+
+
+def test_batch_treats_none_as_missing():
+    columns = {name: [None] for name in analysis_fields()}
+    columns["hba1c"] = [7.0]
+    assert decode_nutrition_flags(analyze_health_batch(columns)[0]) == ["low_sugar"]
@@ -3,16 +3,26 @@ import os
 import uuid
 from datetime import date
 
+import pytest
+
 # backend ディレクトリをモジュールパスに追加
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
 
 from fastapi.testclient import TestClient
+from database import SessionLocal
 from main import app
+from models import HealthRecord
+from utils.rule_engine import get_rule_set
+
+@pytest.fixture(scope="module")
+def client():
+    # lifespan を動かし、起動時のテーブル作成（DB_CREATE_ALL）を済ませてから使う
+    with TestClient(app) as client:
+        yield client
 
-client = TestClient(app)
 
-def test_create_health_record():
-    # 先にテスト用ユーザーを作成
+def create_user(client) -> str:
+    # テスト用ユーザーを作成
     user_payload = {
         "email": f"test_{uuid.uuid4().hex[:8]}@example.com",
         "name": "テストユーザー",
@@ -20,9 +30,11 @@ def test_create_health_record():
     }
     user_response = client.post("/users/create", json=user_payload)
     assert user_response.status_code == 200
-    user_id = user_response.json()["id"]
+    return user_response.json()["id"]
+
 
-    payload = {
+def health_record_payload(user_id: str, **values) -> dict:
+    return {
         "user_id": user_id,
         "date": date.today().isoformat(),
         "age": 35,
@@ -41,9 +53,35 @@ def test_create_health_record():
         "liver_got": 25.0,
         "liver_gpt": 28.0,
         "liver_r_gpt": 30.0,
-        "anomalies": {}
+        "anomalies": {},
+        **values,
     }
 
-    response = client.post("/health-records", json=payload)
+
+def test_create_health_record(client):
+    user_id = create_user(client)
+
+    response = client.post("/health-records", json=health_record_payload(user_id))
     assert response.status_code == 200
     assert response.json()["user_id"] == user_id
+
+
+def test_nutrition_flags_are_written_on_insert_and_update(client):
+    user_id = create_user(client)
+
+    response = client.post("/health-records", json=health_record_payload(user_id, blood_pressure_systolic=150))
+    assert response.status_code == 200
+    record_id = response.json()["id"]
+
+    rule_set = get_rule_set()
+    with SessionLocal() as db:
+        record = db.get(HealthRecord, uuid.UUID(record_id))
+        assert rule_set.decode(record.nutrition_flags) == ["low_salt"]
+        assert record.rules_version == rule_set.version
+
+    # 更新後の値で判定し直す
+    response = client.put(f"/health-records/{record_id}", json={"blood_pressure_systolic": 110})
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        record = db.get(HealthRecord, uuid.UUID(record_id))
+        assert record.nutrition_flags == 0
@@ -0,0 +1,60 @@
+import sys
+import os
+from datetime import date
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils import health_series
+from utils.health_series import compute_series, get_cached_series, invalidate_user_series, series_generation, store_series
+
+
+def test_monthly_means_rolling_and_delta():
+    dates = [date(2025, 1, 5), date(2025, 1, 20), date(2025, 2, 10), date(2025, 4, 1)]
+    result = compute_series(dates, {"bmi": [22.0, 24.0, 25.0, None], "hba1c": [5.5, None, 6.0, 6.5]}, "month", 2)
+
+    assert result["dates"] == ["2025-01-01", "2025-02-01", "2025-04-01"]
+    assert result["count"] == [2, 1, 1]
+    assert result["metrics"]["bmi"]["mean"] == [23.0, 25.0, None]
+    assert result["metrics"]["bmi"]["rolling_mean"] == [23.0, 24.0, 25.0]
+    assert result["metrics"]["bmi"]["delta"] == [None, 2.0, None]
+    assert result["metrics"]["hba1c"]["mean"] == [5.5, 6.0, 6.5]
+
+
+def test_week_and_quarter_buckets():
+    # 2025-01-06 は月曜日
+    dates = [date(2025, 1, 6), date(2025, 1, 12), date(2025, 1, 13), date(2025, 5, 31)]
+    weekly = compute_series(dates, {"bmi": [1, 2, 3, 4]}, "week", 1)
+    assert weekly["dates"][:2] == ["2025-01-06", "2025-01-13"]
+    assert weekly["metrics"]["bmi"]["mean"][:2] == [1.5, 3.0]
+
+    quarterly = compute_series(dates, {"bmi": [1, 2, 3, 4]}, "quarter", 1)
+    assert quarterly["dates"] == ["2025-01-01", "2025-04-01"]
+
+
+def test_store_is_skipped_after_invalidation():
+    key = (("bmi",), "month", 3)
+    generation = series_generation("user-a")
+    invalidate_user_series("user-a")
+    store_series("user-a", key, {"dates": []}, generation)
+    assert get_cached_series("user-a", key) is None
+
+    store_series("user-a", key, {"dates": []}, series_generation("user-a"))
+    assert get_cached_series("user-a", key) == {"dates": []}
+    invalidate_user_series("user-a")
+    assert get_cached_series("user-a", key) is None
+
+
+def test_generations_are_bounded_and_evicted_users_stay_stale(monkeypatch):
+    monkeypatch.setattr(health_series, "SERIES_CACHE_SIZE", 2)
+    key = (("bmi",), "month", 3)
+    generation = series_generation("user-b")
+    invalidate_user_series("user-b")
+    # 他のユーザーの更新で user-b の世代が上限から押し出されても、古い読み込みの結果は保存しない
+    invalidate_user_series("user-c", "user-d", "user-e")
+    assert len(health_series._generations) == 2
+    store_series("user-b", key, {"dates": []}, generation)
+    assert get_cached_series("user-b", key) is None
+
+    store_series("user-b", key, {"dates": []}, series_generation("user-b"))
+    assert get_cached_series("user-b", key) == {"dates": []}
@@ -0,0 +1,62 @@
+import sys
+import os
+import time
+import uuid
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.local_planner import COOKING_TIME_LIMITS, MEAL_TYPES, WEEK_DAYS, RecipeCatalog, plan_week
+from utils.plan_projection import project_plan
+
+TAGS = ["low_salt", "low_sugar", "low_fat", "liver_support"]
+
+
+def make_catalog(n: int) -> RecipeCatalog:
+    return RecipeCatalog([
+        (uuid.UUID(int=i + 1), f"レシピ{i}", 5 + i * 7 % 80, frozenset(TAGS[j] for j in range(4) if i >> j & 1))
+        for i in range(n)
+    ])
+
+
+def test_week_plan_has_gpt_shape_and_no_repeats():
+    plan = plan_week(make_catalog(200), ["low_salt"], seed=1)
+    assert [day["day"] for day in plan["week_plan"]] == WEEK_DAYS
+
+    titles = [day[meal_type]["title"] for day in plan["week_plan"] for meal_type in MEAL_TYPES]
+    assert len(titles) == 21 and len(set(titles)) == 21
+    # 保存時の展開（meal_plan_items）でもすべての食事が読める
+    assert len(project_plan(uuid.uuid4(), uuid.uuid4(), plan)) == 21
+
+
+def test_respects_cooking_time_and_nutrition_needs():
+    plan = plan_week(make_catalog(500), ["low_salt", "low_fat"], seed=2)
+    for day in plan["week_plan"]:
+        day_types = set()
+        for meal_type in MEAL_TYPES:
+            meal = day[meal_type]
+            assert meal["cookingTime"] <= COOKING_TIME_LIMITS[meal_type]
+            day_types |= set(meal["nutritionType"])
+        # nutritionType は GPT のプランと同じ日本語の表記
+        assert {"低塩分", "低脂肪"} <= day_types
+
+
+def test_deterministic_per_seed():
+    catalog = make_catalog(300)
+    assert plan_week(catalog, ["low_sugar"], seed=3) == plan_week(catalog, ["low_sugar"], seed=3)
+    assert plan_week(catalog, ["low_sugar"], seed=3) != plan_week(catalog, ["low_sugar"], seed=4)
+
+
+def test_small_catalog_reuses_recipes_but_fills_every_meal():
+    plan = plan_week(make_catalog(5), [], seed=0)
+    for day in plan["week_plan"]:
+        titles = [day[meal_type]["title"] for meal_type in MEAL_TYPES]
+        assert len(set(titles)) == 3
+
+
+def test_large_catalog_plans_in_milliseconds():
+    catalog = make_catalog(10000)
+    started = time.perf_counter()
+    plan_week(catalog, ["low_salt", "low_sugar"], seed=5)
+    # 目安は 10,000 件で1ミリ秒程度（CI の遅いマシンでも通るよう余裕を持たせる）
+    assert time.perf_counter() - started < 0.05
@@ -0,0 +1,53 @@
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.instrumentation import OPENAI_REQUESTS, OPENAI_TOKENS, chat_completion
+from utils.metrics import Counter, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("/users/{user_id}",))
+
+    assert histogram.render()[2:] == [
+        'test_latency_seconds_bucket{route="/users/{user_id}",le="0.1"} 2',
+        'test_latency_seconds_bucket{route="/users/{user_id}",le="1.0"} 3',
+        'test_latency_seconds_bucket{route="/users/{user_id}",le="+Inf"} 4',
+        'test_latency_seconds_sum{route="/users/{user_id}"} 3.65',
+        'test_latency_seconds_count{route="/users/{user_id}"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_total", "test", ("path",))
+    counter.inc(('a"b\\c\nd',), 2)
+    assert counter.render()[2] == 'test_total{path="a\\"b\\\\c\\nd"} 2'
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        assert kwargs["stream_options"] == {"include_usage": True}
+
+        async def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="{}"))], usage=None)
+            yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        return chunks()
+
+
+def test_stream_records_tokens_after_last_chunk():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+    async def consume():
+        stream = await chat_completion(client, model="test-model", messages=[], stream=True)
+        return [chunk async for chunk in stream]
+
+    assert len(asyncio.run(consume())) == 2
+    assert OPENAI_TOKENS._values[("test-model", "prompt")] == 120
+    assert OPENAI_TOKENS._values[("test-model", "completion")] == 30
+    assert OPENAI_REQUESTS._values[("test-model", "ok")] == 1
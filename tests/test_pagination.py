@@ -0,0 +1,98 @@
+import sys
+import os
+import asyncio
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from models import HealthRecord, Recipe
+from utils.pagination import decode_cursor, encode_cursor, paginate, parse_keyset_cursor
+
+KEYS = (HealthRecord.date, HealthRecord.id)
+
+
+def test_cursor_round_trip_restores_column_types():
+    record_id = uuid.uuid4()
+    cursor = encode_cursor([date(2025, 1, 6), record_id])
+
+    assert decode_cursor(cursor) == ["2025-01-06", str(record_id)]
+    assert parse_keyset_cursor(KEYS, cursor) == [date(2025, 1, 6), record_id]
+    # URL にそのまま載せられる（パディングなし）
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+def test_cursor_round_trip_keeps_non_ascii_and_timestamps():
+    created_at = datetime(2025, 1, 6, 12, 30, 15, 123456)
+    cursor = encode_cursor(["鮭の塩焼き", created_at, 0.75])
+    assert decode_cursor(cursor) == ["鮭の塩焼き", str(created_at), 0.75]
+    assert parse_keyset_cursor((Recipe.name, Recipe.created_at), encode_cursor(["鮭", created_at])) == ["鮭", created_at]
+
+
+def test_no_cursor_means_first_page():
+    assert parse_keyset_cursor(KEYS, None) is None
+    assert parse_keyset_cursor(KEYS, "") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor!",                                  # base64 でない
+    "e30",                                            # {}（リストでない）
+    encode_cursor(["2025-01-06"]),                    # キーの数が違う
+    encode_cursor(["2025-13-40", str(uuid.uuid4())]),  # 日付として読めない
+    encode_cursor(["2025-01-06", "not-a-uuid"]),      # UUID として読めない
+    encode_cursor([None, str(uuid.uuid4())]),         # 型が違う
+])
+def test_malformed_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_keyset_cursor(KEYS, cursor)
+    assert excinfo.value.status_code == 400
+
+
+def _pages(limit: int, descending: bool):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import StaticPool
+
+    keys = (Recipe.created_at, Recipe.id)
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Recipe.__table__.create)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                # 登録日時が同じ行を含め、(created_at, id) の順で続きから取れることを確かめる
+                # （16進が数字だけの ID は SQLite で数値として保存されるため、先頭を英字にする）
+                db.add_all(
+                    Recipe(id=uuid.UUID(int=(0xA << 124) + i), name=f"レシピ{i}", created_at=datetime(2025, 1, 1 + i // 2))
+                    for i in range(5)
+                )
+                await db.commit()
+
+                pages, cursor = [], None
+                while True:
+                    rows, cursor = await paginate(db, select(Recipe), keys, limit, cursor, descending)
+                    pages.append([row.name for row in rows])
+                    if cursor is None:
+                        return pages
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_paginate_walks_every_row_once():
+    assert _pages(2, descending=True) == [["レシピ4", "レシピ3"], ["レシピ2", "レシピ1"], ["レシピ0"]]
+    assert _pages(2, descending=False) == [["レシピ0", "レシピ1"], ["レシピ2", "レシピ3"], ["レシピ4"]]
+
+
+def test_last_page_has_no_cursor():
+    # ちょうど limit 件で終わる場合も、次のページの cursor は返さない
+    assert _pages(5, descending=True) == [["レシピ4", "レシピ3", "レシピ2", "レシピ1", "レシピ0"]]
+    assert _pages(10, descending=False) == [["レシピ0", "レシピ1", "レシピ2", "レシピ3", "レシピ4"]]
@@ -0,0 +1,43 @@
+import sys
+import os
+import asyncio
+
+import bcrypt
+import pytest
+from fastapi import HTTPException
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils import password_hashing
+
+
+@pytest.fixture(autouse=True)
+def low_cost(monkeypatch):
+    monkeypatch.setattr(password_hashing, "BCRYPT_ROUNDS", 4)
+
+
+def test_hash_uses_configured_cost():
+    password_hash = asyncio.run(password_hashing.hash_password("correct horse"))
+    assert password_hash.startswith("$2b$04$")
+    assert bcrypt.checkpw(b"correct horse", password_hash.encode())
+    assert not bcrypt.checkpw(b"wrong", password_hash.encode())
+
+
+def test_long_password_is_truncated_to_72_bytes():
+    password_hash = asyncio.run(password_hashing.hash_password("あ" * 30))
+    assert bcrypt.checkpw(("あ" * 30).encode()[:72], password_hash.encode())
+
+
+def test_queue_limit_rejects_with_503(monkeypatch):
+    monkeypatch.setattr(password_hashing, "HASH_QUEUE_LIMIT", 2)
+
+    async def burst():
+        return await asyncio.gather(
+            *[password_hashing.hash_password("pw") for _ in range(5)], return_exceptions=True
+        )
+
+    results = asyncio.run(burst())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 3 and all(r.status_code == 503 for r in rejected)
+    assert password_hashing._pending == 0
@@ -0,0 +1,42 @@
+import sys
+import os
+from types import SimpleNamespace
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.plan_cache import profile_cache_key, quantize_profile
+
+
+def make_record(**overrides):
+    values = {
+        "age": 35,
+        "gender": "male",
+        "bmi": 23.0,
+        "blood_pressure_systolic": 120,
+        "blood_pressure_diastolic": 80,
+        "hba1c": 5.5,
+        "cholesterol_ldl": 110.0,
+        "triglycerides": 100.0,
+        "liver_gpt": 28.0,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_similar_profiles_share_cache_key():
+    a = make_record(age=34, bmi=22.1, blood_pressure_systolic=118)
+    b = make_record(age=38, bmi=24.0, blood_pressure_systolic=125)
+    assert profile_cache_key(a, "1") == profile_cache_key(b, "1")
+
+
+def test_band_change_or_prompt_version_changes_key():
+    base = make_record()
+    assert profile_cache_key(base, "1") != profile_cache_key(make_record(hba1c=6.8), "1")
+    assert profile_cache_key(base, "1") != profile_cache_key(base, "2")
+
+
+def test_missing_values_are_unknown():
+    profile = quantize_profile(make_record(hba1c=None, blood_pressure_systolic=None, blood_pressure_diastolic=None))
+    assert profile["hba1c"] == "unknown"
+    assert profile["bp"] == "unknown"
@@ -0,0 +1,65 @@
+import sys
+import os
+import uuid
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.plan_projection import normalize_plan, project_plan
+
+
+def test_expands_each_day_and_meal():
+    meal_plan_id, user_id = uuid.uuid4(), uuid.uuid4()
+    plan_json = {
+        "week_plan": [
+            {
+                "day": "月曜日",
+                "breakfast": {"title": "全粒粉パンとオレンジ", "nutritionType": ["高繊維"], "cookingTime": 5, "isQuick": True},
+                "dinner": {"title": "鮭の塩焼き", "nutritionType": ["低塩分", "高オメガ3脂肪酸"], "cookingTime": 30, "isQuick": False},
+            },
+            {"day": "火曜日", "lunch": {"title": "豆腐の味噌汁", "nutritionType": "低脂肪", "cookingTime": "10分"}},
+        ]
+    }
+
+    rows = project_plan(meal_plan_id, user_id, plan_json)
+
+    assert [(r["day_index"], r["meal_type"]) for r in rows] == [(0, "breakfast"), (0, "dinner"), (1, "lunch")]
+    assert rows[1] == {
+        "meal_plan_id": meal_plan_id, "day_index": 0, "meal_type": "dinner", "user_id": user_id, "day": "月曜日",
+        "title": "鮭の塩焼き", "nutrition_types": ["低塩分", "高オメガ3脂肪酸"], "cooking_time": 30, "is_quick": False,
+    }
+    assert rows[2]["nutrition_types"] == ["低脂肪"]
+    assert rows[2]["cooking_time"] == 10 and rows[2]["is_quick"] is None
+
+
+def test_skips_malformed_output():
+    meal_plan_id, user_id = uuid.uuid4(), uuid.uuid4()
+    assert project_plan(meal_plan_id, user_id, None) == []
+    assert project_plan(meal_plan_id, user_id, {"week_plan": "なし"}) == []
+
+    rows = project_plan(meal_plan_id, user_id, {"week_plan": ["月曜日", {"dinner": "焼き魚", "lunch": {"cookingTime": True}}]})
+    assert rows == [{
+        "meal_plan_id": meal_plan_id, "day_index": 1, "meal_type": "lunch", "user_id": user_id, "day": None,
+        "title": None, "nutrition_types": [], "cooking_time": None, "is_quick": None,
+    }]
+
+
+def test_normalizes_nutrition_type_spellings():
+    meal_plan_id, user_id = uuid.uuid4(), uuid.uuid4()
+    plan_json = {
+        "week_plan": [
+            {
+                "day": "月曜日",
+                "breakfast": {"title": "納豆ご飯", "nutritionType": ["high-fiber", "High Protein", "高繊維"]},
+                "dinner": {"title": "鶏むね肉の蒸し焼き", "nutritionType": ["low_salt", "低塩分", "高ビタミンC"]},
+            },
+        ]
+    }
+
+    rows = project_plan(meal_plan_id, user_id, plan_json)
+    assert rows[0]["nutrition_types"] == ["高繊維", "高タンパク質"]
+    assert rows[1]["nutrition_types"] == ["低塩分", "高ビタミンC"]
+
+    # 保存する plan_json も同じ表記になる
+    normalize_plan(plan_json)
+    assert plan_json["week_plan"][0]["dinner"]["nutritionType"] == ["低塩分", "高ビタミンC"]
@@ -0,0 +1,63 @@
+import sys
+import os
+import asyncio
+import json
+import time
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import pytest
+from fastapi import HTTPException
+
+from utils.meal_plan_batch import is_retryable
+from utils.rate_limit import TokenBucket, retry_with_backoff
+
+
+def test_token_bucket_waits_when_empty():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 最初の2個はすぐ取れ、残り2個は 1/20 秒ずつ待つ
+    assert 0.08 <= asyncio.run(run()) < 1
+
+
+def test_retry_with_backoff_retries_retryable_errors():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("一時的なエラー")
+        return "ok"
+
+    result = asyncio.run(retry_with_backoff(flaky, lambda e: isinstance(e, ValueError), base=0.001))
+    assert result == "ok" and len(calls) == 3
+
+
+def test_retry_with_backoff_raises_non_retryable_immediately():
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise KeyError("x")
+
+    with pytest.raises(KeyError):
+        asyncio.run(retry_with_backoff(broken, lambda e: isinstance(e, ValueError), base=0.001))
+    assert len(calls) == 1
+
+
+def test_is_retryable_looks_at_wrapped_cause():
+    def wrapped(cause):
+        try:
+            raise HTTPException(status_code=500, detail="失敗") from cause
+        except HTTPException as e:
+            return e
+
+    assert is_retryable(wrapped(json.JSONDecodeError("x", "", 0)))
+    assert not is_retryable(wrapped(ValueError("x")))
+    assert not is_retryable(HTTPException(status_code=404, detail="なし"))
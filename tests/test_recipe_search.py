@@ -0,0 +1,126 @@
+import sys
+import os
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+# PostgreSQL 以外で使う bigram 索引を SQLite（メモリ）で確かめる
+pytest.importorskip("aiosqlite")
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from models import Recipe
+from utils.recipe_search import RecipeBigramIndex, ngrams, search_recipes
+
+RECIPES = [
+    ("鮭の塩焼き", "減塩でも美味しい焼き魚"),
+    ("鮭のムニエル", "バターで焼く"),
+    ("豆腐の味噌汁", "鮭フレークをのせる"),
+    ("鶏むね肉の蒸し焼き", None),
+    ("ＳＡＬＭＯＮ Salad", "鮭とレタス"),
+    ("鮭のホイル焼き", None),
+    ("鮭の南蛮漬け", None),
+]
+
+
+def recipe_id(i: int) -> uuid.UUID:
+    # 16進が数字だけの ID は SQLite で数値として保存されるため、先頭を英字にする
+    return uuid.UUID(int=(0xA << 124) + i + 1)
+
+
+async def _with_recipes(run):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Recipe.__table__.create)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            db.add_all(
+                Recipe(id=recipe_id(i), name=name, description=description, created_at=datetime(2025, 1, 1))
+                for i, (name, description) in enumerate(RECIPES)
+            )
+            await db.commit()
+            return await run(db)
+    finally:
+        await engine.dispose()
+
+
+def test_ngrams_normalize_width_and_case():
+    assert ngrams("ＳＡＬＭＯＮ") == ngrams("salmon")
+    assert ngrams("鮭") == {"鮭"}
+    assert ngrams("  ") == set()
+
+
+def test_bigram_index_ranks_name_matches_first():
+    async def run(db):
+        index = RecipeBigramIndex()
+        by_name, _ = await index.search(db, "塩焼き", 10, None)
+        by_description, cursor = await index.search(db, "レタス", 10, None)
+        return [r.name for r in by_name], [r.name for r in by_description], cursor
+
+    by_name, by_description, cursor = asyncio.run(_with_recipes(run))
+    # 名前の bigram が多く重なるものが先（「焼き」だけが重なる名前は後）
+    assert by_name[0] == "鮭の塩焼き"
+    assert set(by_name) == {"鮭の塩焼き", "鮭のホイル焼き", "鶏むね肉の蒸し焼き"}
+    # 説明文だけに一致したものも返す
+    assert by_description == ["ＳＡＬＭＯＮ Salad"]
+    assert cursor is None
+
+
+def test_bigram_index_picks_up_new_recipes():
+    async def run(db):
+        index = RecipeBigramIndex()
+        before, _ = await index.search(db, "ぶり大根", 10, None)
+        db.add(Recipe(id=recipe_id(100), name="ぶり大根", created_at=datetime(2025, 2, 1)))
+        await db.commit()
+        # 確認の間隔を待たずに鮮度を確かめる
+        index._checked_at = 0.0
+        after, _ = await index.search(db, "ぶり大根", 10, None)
+        return before, [recipe.name for recipe in after]
+
+    before, after = asyncio.run(_with_recipes(run))
+    assert before == [] and after == ["ぶり大根"]
+
+
+def test_cursor_pages_through_all_results_without_duplicates():
+    async def run(db):
+        everything, _ = await search_recipes(db, "鮭の", 100)
+        pages, cursor = [], None
+        while True:
+            page, cursor = await search_recipes(db, "鮭の", 2, cursor)
+            pages.append([recipe.id for recipe in page])
+            if cursor is None:
+                return [recipe.id for recipe in everything], pages
+
+    everything, pages = asyncio.run(_with_recipes(run))
+    # 同じスコア（鮭のムニエル・鮭の南蛮漬け）のページ境界も ID 順で続きから返す
+    assert len(everything) == 4
+    assert [recipe_id for page in pages for recipe_id in page] == everything
+    assert all(len(page) == 2 for page in pages[:-1]) and 1 <= len(pages[-1]) <= 2
+
+
+def test_empty_query_lists_by_id():
+    async def run(db):
+        ids, cursor = [], None
+        while True:
+            page, cursor = await search_recipes(db, " ", 3, cursor)
+            ids.extend(r.id for r in page)
+            if cursor is None:
+                return ids
+
+    assert asyncio.run(_with_recipes(run)) == [recipe_id(i) for i in range(len(RECIPES))]
+
+
+def test_malformed_cursor_is_rejected():
+    async def run(db):
+        with pytest.raises(HTTPException) as excinfo:
+            await search_recipes(db, "鮭", 2, "not-a-cursor")
+        return excinfo.value.status_code
+
+    assert asyncio.run(_with_recipes(run)) == 400
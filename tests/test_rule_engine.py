@@ -0,0 +1,58 @@
+import sys
+import os
+from types import SimpleNamespace
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import pytest
+
+from utils.rule_engine import MAX_NUTRITION_TYPES, CompiledRuleSet, load_rule_set
+
+DEFINITION = {
+    "version": "test-1",
+    "nutrition_types": ["low_fat", "iron_rich"],
+    "rules": [
+        {"id": "ldl", "field": "cholesterol_ldl", "op": ">=", "value": 140, "nutrition_type": "low_fat"},
+        {"id": "tg", "field": "triglycerides", "op": ">=", "value": 150, "nutrition_type": "low_fat"},
+        {"id": "hb_female", "field": "hemoglobin", "op": "<", "value": 12, "nutrition_type": "iron_rich",
+         "gender": ["female", "女性"], "age_min": 18, "age_max": 50},
+    ],
+}
+
+
+def test_same_nutrition_type_is_reported_once():
+    rule_set = load_rule_set()
+    flags = rule_set.evaluate_dict({"cholesterol_ldl": 150, "triglycerides": 200})
+    assert rule_set.decode(flags) == ["low_fat"]
+
+
+def test_gender_and_age_conditions():
+    rule_set = CompiledRuleSet(DEFINITION)
+    record = {"hemoglobin": 11.0, "gender": "Female", "age": 30}
+    assert rule_set.decode(rule_set.evaluate_dict(record)) == ["iron_rich"]
+    assert rule_set.evaluate_dict({**record, "gender": "male"}) == 0
+    assert rule_set.evaluate_dict({**record, "age": 55}) == 0
+
+
+def test_record_and_column_evaluation_agree():
+    rule_set = CompiledRuleSet(DEFINITION)
+    rows = [
+        {"cholesterol_ldl": 150.0, "triglycerides": None, "hemoglobin": 13.0, "age": 40, "gender": "female"},
+        {"cholesterol_ldl": None, "triglycerides": 100.0, "hemoglobin": 11.5, "age": 25, "gender": "女性"},
+    ]
+    columns = {name: [row[name] for row in rows] for name in rule_set.fields}
+    by_column = rule_set.evaluate_columns(columns)
+    by_record = [rule_set.evaluate_record(SimpleNamespace(**row)) for row in rows]
+    assert list(by_column) == by_record == [1, 2]
+
+
+def test_flags_fit_in_nutrition_flags_column():
+    # nutrition_flags は符号付き32bit。最後の栄養タイプのビットも正の値に収まる
+    types = [f"type_{i}" for i in range(MAX_NUTRITION_TYPES)]
+    rules = [{"id": "bmi", "field": "bmi", "op": ">=", "value": 25, "nutrition_type": types[-1]}]
+    rule_set = CompiledRuleSet({"version": "wide", "nutrition_types": types, "rules": rules})
+    assert 0 < rule_set.evaluate_dict({"bmi": 30}) <= 2**31 - 1
+
+    with pytest.raises(ValueError):
+        CompiledRuleSet({"version": "too-wide", "nutrition_types": types + ["extra"], "rules": rules})
@@ -0,0 +1,89 @@
+import sys
+import os
+import gzip
+import json
+import uuid
+from datetime import date, datetime
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import models
+import schemas
+from utils.compression import CompressionMiddleware, choose_encoding
+from utils.serialization import HEALTH_RECORD_LIST, serialize
+
+
+def _health_record():
+    return models.HealthRecord(
+        id=uuid.uuid4(), user_id=uuid.uuid4(), date=date(2024, 4, 1), age=45, gender="female",
+        height=158.0, weight=52.5, bmi=21.0, blood_pressure_systolic=118, blood_pressure_diastolic=76,
+        blood_sugar=92.0, hba1c=5.4, cholesterol_total=198.0, cholesterol_hdl=62.0, cholesterol_ldl=110.0,
+        triglycerides=88.0, liver_got=21.0, liver_gpt=18.0, liver_r_gpt=20.0, anomalies={"bmi": "正常"},
+    )
+
+
+def test_serialize_matches_response_model_output():
+    records = [_health_record(), _health_record()]
+    expected = jsonable_encoder([schemas.HealthRecordResponse.model_validate(r) for r in records])
+    assert json.loads(serialize(HEALTH_RECORD_LIST, records)) == expected
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("identity") is None
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("x" * 50)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/ndjson")
+    def ndjson():
+        return StreamingResponse((f'{{"n":{i}}}\n' for i in range(1000)), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: x\n\n"] * 100), media_type="text/event-stream")
+
+    return app
+
+
+def test_compresses_only_large_responses():
+    client = TestClient(_app())
+    headers = {"Accept-Encoding": "gzip"}
+
+    response = client.get("/large", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < 5000
+    assert response.text == "x" * 5000
+
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" not in client.get("/events", headers=headers).headers
+
+
+def test_compresses_streaming_responses_incrementally():
+    client = TestClient(_app())
+    with client.stream("GET", "/ndjson", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert len(lines) == 1000 and json.loads(lines[-1]) == {"n": 999}
@@ -0,0 +1,156 @@
+import sys
+import os
+import asyncio
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import pytest
+
+from utils.single_flight import SingleFlight, advisory_lock_id
+
+
+def test_concurrent_calls_share_one_run():
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return object()
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run(("user", "week"), generate) for _ in range(5)))
+        other = await flight.run(("user", "next-week"), generate)
+        return results, other
+
+    results, other = asyncio.run(run())
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results) and other is not results[0]
+
+
+def test_errors_are_shared_and_key_is_released():
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("失敗")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.run("k", broken), flight.run("k", broken), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results) and len(calls) == 1
+        # 終わったキーは次の呼び出しで実行し直す
+        with pytest.raises(ValueError):
+            await flight.run("k", broken)
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_shared_run():
+    async def generate():
+        await asyncio.sleep(0.05)
+        return "plan"
+
+    async def run():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.run("k", generate))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.run("k", generate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "plan"
+
+
+def test_advisory_lock_id_is_stable_signed_bigint():
+    lock_id = advisory_lock_id("meal_plan:u:2025-01-13")
+    assert lock_id == advisory_lock_id("meal_plan:u:2025-01-13")
+    assert lock_id != advisory_lock_id("meal_plan:u:2025-01-20")
+    assert -2 ** 63 <= lock_id < 2 ** 63
+
+
+
+def _generate_across_workers(monkeypatch, other_worker_saves: bool):
+    """
+    別のワーカーが同じ週を生成中（ロックを取れない）の状態を作り、_generate_week_plan の結果・生成の回数・ロックのキーを返す
+    """
+    from contextlib import asynccontextmanager
+    from datetime import date
+    from types import SimpleNamespace
+
+    from utils import meal_plan_generator
+
+    record = SimpleNamespace(user_id="user", date=date(2025, 1, 13))
+    plans = {"before": SimpleNamespace(id="before", plan_json={"week_plan": []})}
+    week = ["before"]  # 同じ週に保存されたプランの ID（最後が最新）
+    generated, attempts = [], []
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def commit(self):
+            pass
+
+    async def get_week_meal_plan_id(db, user_id, start_date):
+        return week[-1]
+
+    async def get_meal_plan(db, meal_plan_id):
+        return plans[meal_plan_id]
+
+    async def save_week_plan(db, user_id, record, plan_json, start_date=None):
+        meal_plan = SimpleNamespace(id=f"plan{len(plans)}", plan_json=plan_json)
+        plans[meal_plan.id] = meal_plan
+        week.append(meal_plan.id)
+        return meal_plan
+
+    async def plan_week(db, record, start_date, planner, request):
+        generated.append(planner)
+        return {"week_plan": [], "generator": "local"}, "timeout"
+
+    @asynccontextmanager
+    async def try_advisory_lock(key):
+        attempts.append(key)
+        if len(attempts) == 1 and other_worker_saves:
+            # ロックを持っている別のワーカーが、その間に同じ週のプランを保存する
+            await save_week_plan(None, record.user_id, record, {"week_plan": [], "generator": "local"})
+        yield len(attempts) > 1
+
+    monkeypatch.setattr(meal_plan_generator, "AsyncSessionLocal", Session)
+    monkeypatch.setattr(meal_plan_generator.crud, "get_week_meal_plan_id", get_week_meal_plan_id)
+    monkeypatch.setattr(meal_plan_generator.crud, "get_meal_plan", get_meal_plan)
+    monkeypatch.setattr(meal_plan_generator, "save_week_plan", save_week_plan)
+    monkeypatch.setattr(meal_plan_generator, "plan_week", plan_week)
+    monkeypatch.setattr(meal_plan_generator, "try_advisory_lock", try_advisory_lock)
+    monkeypatch.setattr(meal_plan_generator, "GENERATION_POLL_SECONDS", 0)
+
+    meal_plan, reason = asyncio.run(meal_plan_generator._generate_week_plan(
+        record.user_id, record, record.date, None, meal_plan_generator.PLANNER_AUTO
+    ))
+    return meal_plan, reason, week[-1], generated, attempts
+
+
+def test_waits_for_plan_generated_by_another_worker(monkeypatch):
+    meal_plan, reason, latest, generated, attempts = _generate_across_workers(monkeypatch, other_worker_saves=True)
+
+    # GPT（生成）を呼ばずに、別のワーカーが保存したプランを返す
+    assert generated == []
+    assert meal_plan.id == latest != "before"
+    assert reason is not None  # auto でローカル生成に切り替わっていたプラン
+    assert len(attempts) == 2 and attempts[0] == "meal_plan_generation:user:2025-01-13:auto"
+
+
+def test_generates_when_other_worker_saved_nothing(monkeypatch):
+    meal_plan, reason, latest, generated, attempts = _generate_across_workers(monkeypatch, other_worker_saves=False)
+
+    # 先のワーカーが失敗していた（プランが変わっていない）ときは、ロックを取ってから自分で生成する
+    assert generated == ["auto"]
+    assert meal_plan.id == latest != "before" and reason == "timeout"
+    assert len(attempts) == 2
@@ -0,0 +1,35 @@
+import sys
+import os
+import json
+
+# backend ディレクトリをモジュールパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from utils.week_plan_stream import WeekPlanStreamParser
+
+PLAN = {
+    "week_plan": [
+        {"day": "月曜日", "breakfast": {"title": "豆腐と{野菜}の\"スープ\"", "nutritionType": ["低脂肪"], "cookingTime": 10, "isQuick": True}},
+        {"day": "火曜日", "lunch": {"title": "鶏胸肉]のサラダ", "nutritionType": [], "cookingTime": 15, "isQuick": True}},
+    ]
+}
+
+
+def test_days_are_emitted_as_soon_as_they_close():
+    text = json.dumps(PLAN, ensure_ascii=False, indent=2)
+    parser = WeekPlanStreamParser()
+    days = []
+    # 3文字ずつ流し込んでも途中で壊れないこと
+    for i in range(0, len(text), 3):
+        days.extend(parser.feed(text[i:i + 3]))
+
+    assert days == PLAN["week_plan"]
+    assert parser.done
+    assert json.loads(parser.text) == PLAN
+
+
+def test_nothing_is_emitted_before_week_plan_key():
+    parser = WeekPlanStreamParser()
+    assert parser.feed('{"note": {"day": "月曜日"}, ') == []
+    assert parser.feed('"week_plan": [{"day": "月曜日"}') == [{"day": "月曜日"}]
+    assert not parser.done